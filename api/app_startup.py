@@ -0,0 +1,191 @@
+"""
+API 지연 시작 (백그라운드 DB 대기 + 스키마 생성 + WireGuard 피어 동기화)
+uvicorn은 즉시 연결을 받고, 시작 작업은 추적되는 백그라운드 태스크로 진행됩니다.
+DB가 준비되기 전 DB 요청은 503(Retry-After)으로 응답하며, /health/ready 는 모든 단계가 끝나면 200을 반환합니다.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+
+import database
+from background_health_monitor import health_monitor
+from database import AsyncSessionLocal, Base, async_engine
+from wireguard_manager import async_wg_manager
+from wireguard_reconciler import desired_peer_query, peer_nodes, peer_reconciler
+from wireguard_keys import keypair_pool
+
+logger = logging.getLogger(__name__)
+
+# DB 연결 재시도 간격 (초, 실패할 때마다 두 배로 늘려 최대값까지)
+DB_RETRY_INITIAL = 1.0
+DB_RETRY_MAX = 10.0
+
+# create_all은 기존 테이블에 컬럼/인덱스를 추가하지 않으므로 시작 시 멱등 DDL로 보충
+# (PostgreSQL 전용, migrate_db.py와 같은 변경)
+SCHEMA_UPGRADES = (
+    "ALTER TABLE nodes ADD COLUMN IF NOT EXISTS last_handshake TIMESTAMP WITH TIME ZONE",
+    "ALTER TABLE nodes ADD COLUMN IF NOT EXISTS rx_bytes BIGINT",
+    "ALTER TABLE nodes ADD COLUMN IF NOT EXISTS tx_bytes BIGINT",
+    "ALTER TABLE ip_pool_state ADD COLUMN IF NOT EXISTS version BIGINT",
+    "CREATE INDEX IF NOT EXISTS ix_nodes_list_order ON nodes ((COALESCE(vpn_ip, '')), node_id)",
+    "DROP INDEX IF EXISTS ix_nodes_updated_at",
+    "CREATE INDEX IF NOT EXISTS ix_nodes_changed_at ON nodes ((COALESCE(updated_at, created_at)))",
+)
+
+# 준비 완료 후 백그라운드 헬스 모니터(HealthScheduler) 시작 여부 (기본 꺼짐, 1/true로 켬)
+HEALTH_MONITOR_ENABLED = os.getenv("HEALTH_MONITOR_ENABLED", "false").lower() in ("1", "true", "yes")
+
+PHASES = ("waiting_for_db", "creating_schema", "checking_server", "syncing_peers", "ready")
+
+
+class AppStartup:
+    """
+    시작 작업 진행 상태 (프로세스 전역)
+    DB 연결은 성공할 때까지 재시도하고, WireGuard 확인/동기화 실패는 기록만 하고 다음 단계로 진행합니다
+    (이후 주기적 reconcile이 드리프트를 수정).
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.phase = "starting"
+        self.db_attempts = 0
+        self.last_error: Optional[str] = None
+        self.errors: List[str] = []
+        self.nodes_total: Optional[int] = None
+        self.nodes_synced: Optional[int] = None
+        self.nodes_failed: Optional[int] = None
+        self.durations: Dict[str, float] = {}
+        self.ready_at: Optional[float] = None
+        self._phase_started = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+        self._monitor_task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.phase == "ready"
+
+    def start(self):
+        """백그라운드 시작 태스크 생성 (startup 이벤트에서 호출, 기다리지 않음)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+
+    def _enter(self, phase: str):
+        self.durations[self.phase] = round(time.monotonic() - self._phase_started, 3)
+        self.phase = phase
+        self._phase_started = time.monotonic()
+        logger.info(f"Startup phase: {phase}")
+
+    def _record_error(self, message: str):
+        logger.error(message)
+        self.errors.append(message)
+
+    async def _run(self):
+        try:
+            self._enter("waiting_for_db")
+            await self._wait_for_db()
+
+            self._enter("creating_schema")
+            async with async_engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+                if conn.dialect.name == "postgresql":
+                    for statement in SCHEMA_UPGRADES:
+                        await conn.execute(text(statement))
+            # 컬럼이 모두 갖춰진 뒤에만 DB 요청을 받음
+            database.mark_ready()
+
+            # 등록 요청에 대비해 키 풀 미리 채우기
+            keypair_pool.warm()
+
+            self._enter("checking_server")
+            try:
+                await async_wg_manager.ensure_server_subnet()
+            except Exception as e:
+                self._record_error(f"Failed to check WireGuard config: {e}")
+
+            self._enter("syncing_peers")
+            await self._sync_peers()
+
+            self._enter("ready")
+            self.ready_at = time.time()
+            logger.info(f"API ready in {self.ready_at - self.started_at:.2f}s")
+
+            # 노드 상태 검사는 DB 준비 후에 시작 (stop은 shutdown 이벤트에서 health_monitor.stop())
+            if HEALTH_MONITOR_ENABLED:
+                self._monitor_task = asyncio.create_task(health_monitor.start())
+            else:
+                logger.info("Background health monitor disabled (HEALTH_MONITOR_ENABLED)")
+
+            # 주기적 드리프트 수정 시작
+            await peer_reconciler.start()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._record_error(f"Startup failed in phase {self.phase}: {e}")
+            self.phase = "failed"
+
+    async def _wait_for_db(self):
+        delay = DB_RETRY_INITIAL
+        while True:
+            self.db_attempts += 1
+            try:
+                async with async_engine.connect() as conn:
+                    await conn.execute(text("SELECT 1"))
+                logger.info("Database connected successfully!")
+                self.last_error = None
+                return
+            except Exception as e:
+                self.last_error = str(e).splitlines()[0] if str(e) else type(e).__name__
+                logger.warning(f"Waiting for database... (attempt {self.db_attempts}): {self.last_error}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, DB_RETRY_MAX)
+
+    async def _sync_peers(self):
+        """서버 재시작 시 모든 노드 자동 동기화 (일괄 적용)"""
+        try:
+            async with AsyncSessionLocal() as db:
+                rows = (await db.execute(desired_peer_query())).all()
+            self.nodes_total = len(rows)
+            result = await async_wg_manager.apply_peers(peer_nodes(rows), prune=False)
+            for r in result["results"]:
+                if r["status"] == "failed":
+                    logger.warning(f"Failed to sync node {r['node_id']}: {r.get('error')}")
+            self.nodes_synced = result["synced"]
+            self.nodes_failed = result["failed"]
+            logger.info(
+                f"Auto-sync completed: {result['synced']}/{len(rows)} nodes synced "
+                f"in {result['elapsed_seconds']}s"
+            )
+        except Exception as e:
+            self._record_error(f"Failed to auto-sync nodes: {e}")
+
+    def status(self) -> Dict:
+        now = time.time()
+        return {
+            "ready": self.ready,
+            "phase": self.phase,
+            "phases": list(PHASES),
+            "uptime_seconds": round(now - self.started_at, 3),
+            "phase_seconds": round(time.monotonic() - self._phase_started, 3),
+            "phase_durations": self.durations,
+            "database_ready": database.is_ready(),
+            "db_attempts": self.db_attempts,
+            "last_db_error": self.last_error,
+            "nodes_total": self.nodes_total,
+            "nodes_synced": self.nodes_synced,
+            "nodes_failed": self.nodes_failed,
+            "errors": self.errors[-10:],
+            "ready_in_seconds": round(self.ready_at - self.started_at, 3) if self.ready_at else None
+        }
+
+
+# 전역 시작 상태
+app_startup = AppStartup()
@@ -4,18 +4,180 @@ Continuously monitors node health and maintains stable connections
 """
 
 import asyncio
+import heapq
 import logging
+import os
+import random
+import time
 from datetime import datetime, timezone
-from typing import Optional
-from sqlalchemy.orm import Session
-from database import SessionLocal
+from typing import Dict, List, Optional
+from sqlalchemy import select
+from database import AsyncSessionLocal
 from models import Node
-from connection_manager import connection_manager
+from connection_manager import HEALTH_NODE_COLUMNS, connection_manager
+from health_writer import HealthWriteBatch, flush_health_batch
+from fleet_revision import fleet_revision
+from metrics import HEALTH_CHECK_SECONDS, HEALTH_OVERDUE_NODES, TaskTimer
 import signal
 import sys
 
 logger = logging.getLogger(__name__)
 
+# Global cap on node checks per second (handshake verdicts or ICMP probes)
+HEALTH_CHECK_BUDGET = float(os.getenv("HEALTH_CHECK_BUDGET", "50"))
+# Longest interval a long-stable node backs off to (seconds)
+HEALTH_CHECK_MAX_INTERVAL = float(os.getenv("HEALTH_CHECK_MAX_INTERVAL", "300"))
+
+MONITORED_STATUSES = ("registered", "connected", "disconnected")
+
+
+class NodeSchedule:
+    """Per-node check cadence"""
+    
+    __slots__ = ("node_id", "interval", "next_due", "stable_checks", "last_change")
+    
+    def __init__(self, node_id: str, interval: float, next_due: float):
+        self.node_id = node_id
+        self.interval = interval
+        self.next_due = next_due
+        self.stable_checks = 0
+        self.last_change: Optional[float] = None
+
+
+class HealthScheduler:
+    """
+    Min-heap of next-check deadlines per node
+    
+    - A node whose status just changed, or whose latest observation disagrees
+      with its status (transition pending), is rechecked at the critical interval and
+      stays there for a few checks; every unchanged check after that stretches
+      the interval by `backoff`, up to `max_interval`
+    - Every deadline gets +/-`jitter` so nodes registered together drift apart
+    - At most `budget` checks per second leave the heap (token bucket holding a
+      quarter second's worth); the rest stay due and are taken oldest-first
+      once the bucket refills
+    Heap entries are invalidated lazily: an entry whose deadline no longer
+    matches the node's schedule (rescheduled or removed) is skipped on pop.
+    """
+    
+    def __init__(self, base_interval: float, critical_interval: float,
+                 max_interval: float = HEALTH_CHECK_MAX_INTERVAL, budget: float = HEALTH_CHECK_BUDGET,
+                 backoff: float = 1.5, jitter: float = 0.1, settle_checks: int = 3,
+                 burst_window: float = 0.25):
+        self.base_interval = base_interval
+        self.critical_interval = critical_interval
+        self.max_interval = max(max_interval, base_interval)
+        self.budget = budget
+        self.backoff = backoff
+        self.jitter = jitter
+        self.settle_checks = settle_checks
+        self.nodes: Dict[str, NodeSchedule] = {}
+        self._heap: List[tuple] = []
+        self.capacity = max(1.0, budget * burst_window)
+        self._tokens = self.capacity
+        self._refilled_at = time.monotonic()
+    
+    def _jittered(self, interval: float) -> float:
+        return interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+    
+    def _push(self, entry: NodeSchedule, due: float):
+        entry.next_due = due
+        heapq.heappush(self._heap, (due, entry.node_id))
+    
+    def sync(self, node_ids):
+        """Track exactly these nodes; new ones are spread over one base interval"""
+        now = time.monotonic()
+        node_ids = set(node_ids)
+        for node_id in self.nodes.keys() - node_ids:
+            del self.nodes[node_id]
+        for node_id in node_ids - self.nodes.keys():
+            entry = self.nodes[node_id] = NodeSchedule(node_id, self.base_interval, now)
+            self._push(entry, now + random.uniform(0, self.base_interval))
+        # Drop dead heap entries once they dominate the heap
+        if len(self._heap) > 2 * len(self.nodes) + 64:
+            self._heap = [(e.next_due, e.node_id) for e in self.nodes.values()]
+            heapq.heapify(self._heap)
+    
+    def overdue(self, now: Optional[float] = None) -> int:
+        now = time.monotonic() if now is None else now
+        return sum(1 for entry in self.nodes.values() if entry.next_due <= now)
+    
+    def next_deadline(self) -> Optional[float]:
+        while self._heap:
+            due, node_id = self._heap[0]
+            entry = self.nodes.get(node_id)
+            if entry is not None and entry.next_due == due:
+                return due
+            heapq.heappop(self._heap)
+        return None
+    
+    def wait_time(self, longest: float) -> float:
+        """Seconds until the next useful wakeup: next deadline, or bucket refill when nodes are overdue"""
+        deadline = self.next_deadline()
+        if deadline is None:
+            return longest
+        now = time.monotonic()
+        if deadline > now:
+            return min(longest, max(0.05, deadline - now))
+        return min(longest, max(0.05, (self.capacity - self._tokens) / self.budget))
+    
+    def take_due(self) -> List[str]:
+        """Pop due nodes (oldest deadline first) within the per-second budget"""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._refilled_at) * self.budget)
+        self._refilled_at = now
+        
+        due = []
+        while self._heap and self._tokens >= 1:
+            deadline, node_id = self._heap[0]
+            if deadline > now:
+                break
+            heapq.heappop(self._heap)
+            entry = self.nodes.get(node_id)
+            if entry is None or entry.next_due != deadline:
+                continue
+            # Out of the heap until record() reschedules it
+            entry.next_due = float("inf")
+            due.append(node_id)
+            self._tokens -= 1
+        return due
+    
+    def record(self, node_id: str, changed: bool):
+        """Reschedule a checked node from its outcome"""
+        entry = self.nodes.get(node_id)
+        if entry is None:
+            return
+        now = time.monotonic()
+        if changed:
+            entry.last_change = now
+            entry.stable_checks = 0
+            entry.interval = self.critical_interval
+        else:
+            entry.stable_checks += 1
+            if entry.stable_checks > self.settle_checks:
+                entry.interval = min(self.max_interval, max(self.base_interval, entry.interval * self.backoff))
+        self._push(entry, now + self._jittered(entry.interval))
+    
+    def release(self, node_ids: List[str]):
+        """Put nodes back after a failed check without changing their cadence"""
+        now = time.monotonic()
+        for node_id in node_ids:
+            entry = self.nodes.get(node_id)
+            if entry is not None:
+                self._push(entry, now + self._jittered(self.critical_interval))
+    
+    def status(self) -> Dict:
+        intervals = [entry.interval for entry in self.nodes.values()]
+        return {
+            "nodes": len(self.nodes),
+            "overdue": self.overdue(),
+            "budget_per_second": self.budget,
+            "critical": sum(1 for i in intervals if i <= self.critical_interval),
+            "mean_interval": round(sum(intervals) / len(intervals), 1) if intervals else None,
+            "max_interval": self.max_interval
+        }
+
+
 class HealthMonitorService:
     """
     Background service for continuous health monitoring
@@ -25,6 +187,9 @@ class HealthMonitorService:
         self.running = False
         self.check_interval = 30  # seconds
         self.critical_check_interval = 10  # seconds for critical nodes
+        self.tick = 1.0  # longest sleep between scheduler wakeups
+        self.scheduler = HealthScheduler(self.check_interval, self.critical_check_interval)
+        self._nodes_revision: Optional[int] = None
         self.tasks = []
         
     async def start(self):
@@ -64,53 +229,98 @@ class HealthMonitorService:
     # Removed: monitor_critical_nodes - central servers don't use VPN anymore
     
     async def monitor_worker_nodes(self):
-        """Monitor worker nodes with standard frequency"""
+        """Check worker nodes as their deadlines come due"""
+        timer = TaskTimer("health_monitor")
         while self.running:
             try:
-                db = SessionLocal()
-                try:
-                    # Get all worker nodes
-                    worker_nodes = db.query(Node).filter(
-                        Node.node_type == "worker",
-                        Node.status.in_(["registered", "connected", "disconnected"])
-                    ).all()
-                    
-                    # Batch health check
-                    for node in worker_nodes:
-                        if not self.running:
-                            break
-                        
-                        await connection_manager.health_check_node(node, db)
-                    
-                    db.commit()
-                    
-                    # Log summary
-                    connected = sum(1 for n in worker_nodes if n.status == "connected")
-                    total = len(worker_nodes)
-                    logger.info(f"Worker node health check: {connected}/{total} connected")
-                    
-                finally:
-                    db.close()
-                
-                # Wait before next check
-                await asyncio.sleep(self.check_interval)
-                
+                await self.load_worker_nodes()
+                due = self.scheduler.take_due()
+                HEALTH_OVERDUE_NODES.set(self.scheduler.overdue())
+                if due:
+                    with timer.run():
+                        await self.check_nodes(due)
             except Exception as e:
                 logger.error(f"Error in worker node monitoring: {e}")
-                await asyncio.sleep(self.check_interval)
+            
+            # Sleep until the next deadline (bounded so membership changes are noticed)
+            delay = self.scheduler.wait_time(self.tick)
+            timer.schedule(delay)
+            await asyncio.sleep(delay)
+    
+    async def load_worker_nodes(self):
+        """Sync the schedule with the worker fleet when it has changed"""
+        revision = fleet_revision.revision
+        if revision == self._nodes_revision:
+            return
+        async with AsyncSessionLocal() as db:
+            node_ids = (await db.scalars(select(Node.node_id).where(
+                Node.node_type == "worker",
+                Node.status.in_(MONITORED_STATUSES)
+            ))).all()
+        self.scheduler.sync(node_ids)
+        self._nodes_revision = revision
+    
+    async def check_nodes(self, node_ids: List[str]):
+        """Check one batch of due nodes (one WireGuard dump or one concurrent ICMP round, one bulk write)"""
+        started = time.perf_counter()
+        result = "error"
+        checked = False
+        try:
+            async with AsyncSessionLocal() as db:
+                nodes = (await db.execute(select(*HEALTH_NODE_COLUMNS).where(
+                    Node.node_id.in_(node_ids),
+                    Node.status.in_(MONITORED_STATUSES)
+                ))).all()
+                batch = HealthWriteBatch()
+                
+                if connection_manager.health_check_mode == "handshake":
+                    # Snapshot shared for half the critical interval, so dumps stay bounded
+                    liveness = await connection_manager.liveness_check(
+                        nodes, batch, max_age=self.critical_check_interval / 2
+                    )
+                    results = liveness["results"]
+                else:
+                    # Bypass the per-node "recently checked" skip; the schedule decides
+                    for node in nodes:
+                        connection_manager.last_health_check.pop(node.node_id, None)
+                    results = await asyncio.gather(
+                        *(connection_manager.health_check_node(node, db, batch) for node in nodes)
+                    )
+                
+                await flush_health_batch(db, batch)
+                checked = True
+                result = "ok"
+            
+            changed = 0
+            for r in results:
+                if r["old_status"] != r["new_status"]:
+                    changed += 1
+                    logger.info(f"Worker node {r['node_id']}: {r['old_status']} -> {r['new_status']}")
+                # A pending transition (observation disagrees with the status) keeps the node on the fast cadence
+                self.scheduler.record(r["node_id"], r["old_status"] != r["new_status"] or r["pending"])
+            # Nodes that left the monitored set since they were scheduled
+            for node_id in set(node_ids) - {r["node_id"] for r in results}:
+                self.scheduler.record(node_id, False)
+            logger.debug(f"Checked {len(results)} worker nodes ({changed} changed)")
+        finally:
+            if not checked:
+                self.scheduler.release(node_ids)
+            HEALTH_CHECK_SECONDS.labels("cycle", result).observe(time.perf_counter() - started)
+    
+    def status(self) -> Dict:
+        return {"running": self.running, **self.scheduler.status()}
     
     async def cleanup_stale_connections(self):
         """Clean up stale connections and update states"""
         while self.running:
             try:
-                db = SessionLocal()
-                try:
+                async with AsyncSessionLocal() as db:
                     # Find nodes with stale states
                     stale_time = datetime.now(timezone.utc)
-                    stale_nodes = db.query(Node).filter(
+                    stale_nodes = (await db.scalars(select(Node).where(
                         Node.status == "connecting",
                         Node.updated_at < stale_time
-                    ).all()
+                    ))).all()
                     
                     for node in stale_nodes:
                         logger.warning(f"Found stale node {node.node_id} in connecting state")
@@ -118,11 +328,8 @@ class HealthMonitorService:
                         connection_manager.connection_states[node.node_id] = "error"
                     
                     if stale_nodes:
-                        db.commit()
+                        await db.commit()
                         logger.info(f"Cleaned up {len(stale_nodes)} stale connections")
-                    
-                finally:
-                    db.close()
                 
                 # Wait longer for cleanup task
                 await asyncio.sleep(self.check_interval * 2)
@@ -0,0 +1,140 @@
+"""
+WireGuard 제어 호출용 서킷 브레이커
+wireguard-server 컨테이너가 재시작 중이거나 응답하지 않을 때 호출이 제한 시간까지 쌓이지 않도록,
+연속 실패가 임계값에 도달하면 cooldown 동안 즉시 실패(CircuitOpenError)시키고
+이후 호출 하나만 통과시켜(half-open) 성공하면 다시 닫습니다.
+"""
+
+import os
+import time
+import threading
+import logging
+from typing import Dict, Optional
+
+from prometheus_client import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+BREAKER_STATE = Gauge(
+    "vpn_circuit_breaker_state",
+    "서킷 브레이커 상태 (0=closed, 1=half_open, 2=open)",
+    ["name"]
+)
+BREAKER_REJECTIONS = Counter(
+    "vpn_circuit_breaker_rejections_total",
+    "열린 브레이커 때문에 즉시 실패한 호출 수",
+    ["name"]
+)
+BREAKER_TRANSITIONS = Counter(
+    "vpn_circuit_breaker_transitions_total",
+    "브레이커 상태 전환 수",
+    ["name", "state"]
+)
+
+
+class CircuitOpenError(Exception):
+    """브레이커가 열려 있어 호출하지 않음 (retry_after 초 후 재시도)"""
+
+    def __init__(self, name: str, retry_after: float):
+        self.name = name
+        self.retry_after = retry_after
+        super().__init__(f"{name} 일시적으로 사용할 수 없음 (서킷 열림, {retry_after:.0f}초 후 재시도)")
+
+
+class CircuitBreaker:
+    """
+    연속 실패 카운트 기반 브레이커 (스레드 풀에서도 호출되므로 threading.Lock 사용)
+    호출자는 before_call() 후 결과에 따라 record_success()/record_failure()를 호출하고,
+    결과 없이 끝난 호출(취소 등)은 release()로 시험 호출 자리만 반환합니다.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, cooldown: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.last_failure: Optional[str] = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        BREAKER_STATE.labels(name).set(0)
+
+    def _set_state(self, state: str):
+        if state == self.state:
+            return
+        logger.warning(f"Circuit breaker {self.name}: {self.state} -> {state}")
+        self.state = state
+        BREAKER_STATE.labels(self.name).set(_STATE_VALUES[state])
+        BREAKER_TRANSITIONS.labels(self.name, state).inc()
+
+    def _retry_after(self) -> float:
+        return max(0.0, self.cooldown - (time.monotonic() - (self.opened_at or 0.0)))
+
+    def _reject(self):
+        BREAKER_REJECTIONS.labels(self.name).inc()
+        raise CircuitOpenError(self.name, self._retry_after() or 1.0)
+
+    def check(self):
+        """호출 가능 여부만 확인 (half-open 시험 호출 자리를 차지하지 않음, 큐에 넣기 전 빠른 거부용)"""
+        if self.state == OPEN and self._retry_after() > 0:
+            self._reject()
+        if self.state == HALF_OPEN and self._probe_in_flight:
+            self._reject()
+
+    def before_call(self):
+        """실제 호출 직전: 열려 있으면 CircuitOpenError, cooldown이 지났으면 시험 호출 하나만 통과"""
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            if self.state == OPEN:
+                if self._retry_after() > 0:
+                    self._reject()
+                self._set_state(HALF_OPEN)
+            if self._probe_in_flight:
+                self._reject()
+            self._probe_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._probe_in_flight = False
+            self._set_state(CLOSED)
+
+    def record_failure(self, reason: str):
+        with self._lock:
+            self.failures += 1
+            self.last_failure = reason[:200]
+            self._probe_in_flight = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self._set_state(OPEN)
+
+    def release(self):
+        """성공/실패로 세지 않고 half-open 시험 호출 자리만 반환 (호출이 취소된 경우)"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def status(self) -> Dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "failure_threshold": self.failure_threshold,
+            "cooldown_seconds": self.cooldown,
+            "retry_after_seconds": round(self._retry_after(), 1) if self.state == OPEN else 0,
+            "last_failure": self.last_failure
+        }
+
+
+# wireguard-server 컨테이너/인터페이스 제어 호출이 공유하는 브레이커
+wireguard_breaker = CircuitBreaker(
+    "wireguard",
+    failure_threshold=int(os.getenv("WG_BREAKER_FAILURES", "5")),
+    cooldown=float(os.getenv("WG_BREAKER_COOLDOWN", "30"))
+)
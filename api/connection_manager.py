@@ -5,17 +5,35 @@ Provides retry logic, health checks, and automatic reconnection
 
 import asyncio
 import logging
-import subprocess
 import os
+import time
 from datetime import datetime, timedelta, timezone
 from typing import Dict, Optional, List, Any
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from models import Node
-from wireguard_manager import WireGuardManager
+from metrics import HEALTH_CHECK_SECONDS
+from wireguard_manager import async_wg_manager
+from circuit_breaker import CircuitOpenError
+from icmp_prober import icmp_prober, probe_summary
+from peer_liveness import CONNECTED, IDLE, peer_liveness
+from health_history import health_history
+from health_writer import HealthWriteBatch, flush_health_batch, handshake_advanced
 import json
 
 logger = logging.getLogger(__name__)
 
+# Batch/monitor health mode: "handshake" classifies every node from one
+# `wg show dump`; "icmp" pings each node (single-node checks always ping)
+HEALTH_CHECK_MODE = os.getenv("HEALTH_CHECK_MODE", "handshake")
+
+# Statuses a node is promoted to "connected" from once the up threshold is
+# crossed (same for ICMP probes and handshake liveness)
+UP_FROM_STATUSES = ("registered", "connected", "disconnected")
+
+# Columns a health pass needs (full rows are not loaded or tracked by the session)
+HEALTH_NODE_COLUMNS = (Node.node_id, Node.vpn_ip, Node.public_key, Node.status, Node.last_handshake)
+
 class ConnectionState:
     """Connection state tracking for nodes"""
     PENDING = "pending"
@@ -32,14 +50,15 @@ class ConnectionManager:
     """
     
     def __init__(self):
-        self.wg_manager = WireGuardManager()
+        self.wg_manager = async_wg_manager
         self.retry_attempts = 3
         self.retry_delay = 5  # seconds
         self.health_check_interval = 30  # seconds
+        self.health_check_mode = HEALTH_CHECK_MODE
         self.connection_states: Dict[str, str] = {}
         self.last_health_check: Dict[str, datetime] = {}
         
-    async def activate_node_with_retry(self, node: Node, db: Session) -> Dict[str, Any]:
+    async def activate_node_with_retry(self, node: Node, db: AsyncSession) -> Dict[str, Any]:
         """
         Activate a node with automatic retry on failure
         """
@@ -56,13 +75,13 @@ class ConnectionManager:
             try:
                 # Step 1: Ensure clean state by removing existing peer
                 try:
-                    self.wg_manager.remove_peer_from_server(node.public_key)
+                    await self.wg_manager.remove_peer_from_server(node.public_key)
                     await asyncio.sleep(1)  # Brief pause for cleanup
                 except Exception as e:
                     logger.debug(f"Cleanup before activation: {e}")
                 
                 # Step 2: Add peer to WireGuard
-                self.wg_manager.add_peer_to_server(
+                await self.wg_manager.add_peer_to_server(
                     public_key=node.public_key,
                     vpn_ip=node.vpn_ip,
                     node_id=node.node_id
@@ -78,7 +97,7 @@ class ConnectionManager:
                     # Update node status
                     node.status = "registered"
                     node.updated_at = datetime.now(timezone.utc)
-                    db.commit()
+                    await db.commit()
                     
                     # Update connection state
                     self.connection_states[node.node_id] = ConnectionState.CONNECTED
@@ -107,7 +126,7 @@ class ConnectionManager:
         # All attempts failed
         self.connection_states[node.node_id] = ConnectionState.ERROR
         node.status = "error"
-        db.commit()
+        await db.commit()
         
         return {
             "success": False,
@@ -118,7 +137,7 @@ class ConnectionManager:
             "message": f"Failed to activate node {node.node_id} after {attempt} attempts"
         }
     
-    async def deactivate_node_safely(self, node: Node, db: Session) -> Dict[str, Any]:
+    async def deactivate_node_safely(self, node: Node, db: AsyncSession) -> Dict[str, Any]:
         """
         Safely deactivate a node with proper cleanup
         """
@@ -128,7 +147,7 @@ class ConnectionManager:
             
             # Step 1: Remove from WireGuard
             try:
-                self.wg_manager.remove_peer_from_server(node.public_key)
+                await self.wg_manager.remove_peer_from_server(node.public_key)
                 logger.info(f"Removed peer {node.public_key} from WireGuard")
             except Exception as e:
                 logger.warning(f"Failed to remove peer from WireGuard: {e}")
@@ -143,7 +162,7 @@ class ConnectionManager:
             metadata['last_vpn_ip'] = node.vpn_ip
             node.docker_env_vars = json.dumps(metadata)
             
-            db.commit()
+            await db.commit()
             
             # Clean up tracking
             if node.node_id in self.last_health_check:
@@ -160,7 +179,7 @@ class ConnectionManager:
             
         except Exception as e:
             logger.error(f"Failed to deactivate node {node.node_id}: {e}")
-            db.rollback()
+            await db.rollback()
             
             return {
                 "success": False,
@@ -169,37 +188,44 @@ class ConnectionManager:
                 "message": f"Failed to deactivate node {node.node_id}"
             }
     
-    async def test_node_connectivity(self, vpn_ip: str, timeout: int = 2) -> bool:
+    async def probe_node(self, vpn_ip: str, count: int = 1, timeout: int = 2) -> Dict[str, Any]:
         """
-        Test if a node is reachable via ping
+        Active ICMP probe (shared in-process socket; ping subprocess fallback)
+        Returns loss and RTT; CircuitOpenError propagates so a container outage
+        is not recorded as a node disconnect
         """
         try:
-            # Docker 환경에서는 WireGuard 컨테이너를 통해 ping
-            if os.path.exists("/var/run/docker.sock"):
-                process = await asyncio.create_subprocess_exec(
-                    'docker', 'exec', 'wireguard-server',
-                    'ping', '-c', '1', '-W', str(timeout), vpn_ip,
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE
-                )
-            else:
-                # 로컬 환경에서는 직접 ping
-                process = await asyncio.create_subprocess_exec(
-                    'ping', '-c', '1', '-W', str(timeout), vpn_ip,
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE
-                )
-            
-            stdout, stderr = await process.communicate()
-            return process.returncode == 0
-            
+            return await icmp_prober.probe(vpn_ip, count=count, timeout=timeout)
+        except CircuitOpenError:
+            raise
         except Exception as e:
             logger.error(f"Connectivity test failed for {vpn_ip}: {e}")
-            return False
+            return probe_summary(vpn_ip, [None] * count, icmp_prober.method, error=str(e))
+    
+    async def test_node_connectivity(self, vpn_ip: str, timeout: int = 2) -> bool:
+        """
+        Test if a node is reachable via ping
+        """
+        return (await self.probe_node(vpn_ip, timeout=timeout))["reachable"]
+    
+    def _next_status(self, node_id: str, status: str, verdict: Optional[str]) -> str:
+        """Status after a threshold crossing (in-memory state updated here, the row by the caller's batch)"""
+        if verdict == "up" and status in UP_FROM_STATUSES:
+            self.connection_states[node_id] = ConnectionState.CONNECTED
+            return "connected"
+        if verdict == "down" and status == "connected":
+            # Auto-reconnection disabled for worker nodes
+            # Workers should reconnect manually or via their own health checks
+            self.connection_states[node_id] = ConnectionState.DISCONNECTED
+            return "disconnected"
+        return status
     
-    async def health_check_node(self, node: Node, db: Session) -> Dict[str, Any]:
+    async def health_check_node(self, node: Node, db: AsyncSession,
+                                batch: Optional[HealthWriteBatch] = None) -> Dict[str, Any]:
         """
         Perform health check on a single node
+        (with a batch, the status change is collected for the caller's single flush;
+        without one it is written immediately, and only if the status changed)
         """
         # Skip if recently checked
         if node.node_id in self.last_health_check:
@@ -212,38 +238,52 @@ class ConnectionManager:
                 }
         
         # Test connectivity
-        is_reachable = await self.test_node_connectivity(node.vpn_ip)
+        started = time.perf_counter()
+        probe = await self.probe_node(node.vpn_ip)
+        is_reachable = probe["reachable"]
+        HEALTH_CHECK_SECONDS.labels("node", "reachable" if is_reachable else "unreachable").observe(
+            time.perf_counter() - started
+        )
         
         # Update tracking
         self.last_health_check[node.node_id] = datetime.now(timezone.utc)
         
-        # Update node status based on result
+        # Update node status only once the up/down threshold is crossed
         old_status = node.status
-        if is_reachable:
-            if node.status == "registered" or node.status == "connected":
-                node.status = "connected"
-                self.connection_states[node.node_id] = ConnectionState.CONNECTED
+        if batch is not None:
+            observation = self.apply_probe(node.node_id, old_status, is_reachable, batch)
         else:
-            if node.status == "connected":
-                node.status = "disconnected"
-                self.connection_states[node.node_id] = ConnectionState.DISCONNECTED
-                
-                # Auto-reconnection disabled for worker nodes
-                # Workers should reconnect manually or via their own health checks
-        
-        node.updated_at = datetime.now(timezone.utc)
-        db.commit()
+            single = HealthWriteBatch()
+            observation = self.apply_probe(node.node_id, old_status, is_reachable, single)
+            await flush_health_batch(db, single)
+        new_status = observation["new_status"]
         
         return {
             "node_id": node.node_id,
             "vpn_ip": node.vpn_ip,
             "reachable": is_reachable,
+            "rtt_ms": probe["rtt_avg_ms"],
+            "probe_error": probe["error"],
             "old_status": old_status,
-            "new_status": node.status,
+            "new_status": new_status,
+            "pending": is_reachable != (new_status == "connected"),
+            "flap_score": observation["flap_score"],
+            "flapping": observation["flapping"],
             "checked_at": datetime.now(timezone.utc).isoformat()
         }
     
-    async def auto_reconnect_node(self, node: Node, db: Session) -> bool:
+    def apply_probe(self, node_id: str, old_status: str, reachable: bool,
+                    batch: HealthWriteBatch) -> Dict[str, Any]:
+        """
+        Record one ICMP observation and collect the resulting status change in
+        the batch (the status only moves once the up/down threshold is crossed)
+        """
+        observation = health_history.record(node_id, reachable)
+        new_status = self._next_status(node_id, old_status, observation["verdict"])
+        batch.add(node_id, old_status, new_status)
+        return {**observation, "new_status": new_status}
+    
+    async def auto_reconnect_node(self, node: Node, db: AsyncSession) -> bool:
         """
         Attempt to automatically reconnect a disconnected node
         """
@@ -263,20 +303,102 @@ class ConnectionManager:
             logger.error(f"Failed to auto-reconnect node {node.node_id}")
             return False
     
-    async def batch_health_check(self, db: Session, node_type: Optional[str] = None) -> Dict[str, Any]:
+    def apply_liveness(self, node: Node, liveness: Dict[str, Any], batch: HealthWriteBatch) -> Dict[str, Any]:
+        """
+        Status from a handshake liveness verdict once the up/down threshold is
+        crossed (idle counts as neither, so a quiet node is not flapped); the
+        change and, when the handshake moved forward, rx/tx go into the batch
+        """
+        old_status = node.status
+        state = liveness["liveness"]
+        observation = health_history.record(node.node_id, None if state == IDLE else state == CONNECTED)
+        new_status = self._next_status(node.node_id, old_status, observation["verdict"])
+        
+        runtime = liveness if handshake_advanced(node.last_handshake, liveness["latest_handshake"]) else None
+        batch.add(node.node_id, old_status, new_status, runtime)
+        
+        now = datetime.now(timezone.utc)
+        self.last_health_check[node.node_id] = now
+        
+        return {
+            "node_id": node.node_id,
+            "vpn_ip": node.vpn_ip,
+            "reachable": state == CONNECTED,
+            **liveness,
+            "old_status": old_status,
+            "new_status": new_status,
+            "pending": state != IDLE and (state == CONNECTED) != (new_status == "connected"),
+            "flap_score": observation["flap_score"],
+            "flapping": observation["flapping"],
+            "checked_at": now.isoformat()
+        }
+    
+    async def liveness_check(self, nodes: List[Any], batch: HealthWriteBatch,
+                             max_age: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Classify nodes (rows with HEALTH_NODE_COLUMNS) as connected/idle/stale
+        from a single WireGuard dump; writes are collected in the batch
+        """
+        started = time.perf_counter()
+        snapshot = await peer_liveness.sample(max_age)
+        if not snapshot.ok:
+            # A failed dump says nothing about the nodes, so leave them untouched
+            HEALTH_CHECK_SECONDS.labels("liveness", "error").observe(time.perf_counter() - started)
+            raise RuntimeError(f"WireGuard dump failed: {snapshot.error}")
+        
+        verdicts = peer_liveness.classify(snapshot, [(node.node_id, node.public_key) for node in nodes])
+        results = [self.apply_liveness(node, verdicts[node.node_id], batch) for node in nodes]
+        HEALTH_CHECK_SECONDS.labels("liveness", "ok").observe(time.perf_counter() - started)
+        
+        return {
+            "mode": "handshake",
+            "results": results,
+            "counts": dict(peer_liveness.last_counts),
+            "snapshot_age": round(snapshot.age(), 3)
+        }
+    
+    async def batch_health_check(self, db: AsyncSession, node_type: Optional[str] = None,
+                                 mode: Optional[str] = None) -> Dict[str, Any]:
         """
         Perform health checks on multiple nodes
+        (handshake mode costs one WireGuard dump; either mode writes once, changed rows only)
         """
-        query = db.query(Node).filter(Node.status != "deactivated")
+        started = time.perf_counter()
+        mode = mode or self.health_check_mode
+        query = select(*HEALTH_NODE_COLUMNS).where(Node.status != "deactivated")
         if node_type:
-            query = query.filter(Node.node_type == node_type)
+            query = query.where(Node.node_type == node_type)
+        
+        nodes = (await db.execute(query)).all()
+        batch = HealthWriteBatch()
         
-        nodes = query.all()
-        results = []
+        if mode == "handshake":
+            try:
+                liveness = await self.liveness_check(nodes, batch)
+                written = await flush_health_batch(db, batch)
+            except Exception:
+                HEALTH_CHECK_SECONDS.labels("batch", "error").observe(time.perf_counter() - started)
+                raise
+            HEALTH_CHECK_SECONDS.labels("batch", "ok").observe(time.perf_counter() - started)
+            counts = liveness["counts"]
+            return {
+                "mode": "handshake",
+                "total_nodes": len(nodes),
+                "checks_performed": len(nodes),
+                "connected": counts["connected"],
+                "idle": counts["idle"],
+                "disconnected": counts["stale"],
+                "failed_checks": 0,
+                "rows_written": written,
+                "snapshot_age": liveness["snapshot_age"],
+                "results": liveness["results"],
+                "timestamp": datetime.now(timezone.utc).isoformat()
+            }
         
-        # Run health checks concurrently
-        tasks = [self.health_check_node(node, db) for node in nodes]
+        # Run probes concurrently; status changes are collected and written once at the end
+        tasks = [self.health_check_node(node, db, batch) for node in nodes]
         results = await asyncio.gather(*tasks, return_exceptions=True)
+        written = await flush_health_batch(db, batch)
         
         # Process results
         successful_checks = [r for r in results if isinstance(r, dict) and not isinstance(r, Exception)]
@@ -284,13 +406,18 @@ class ConnectionManager:
         
         connected_count = sum(1 for r in successful_checks if r.get("reachable", False))
         disconnected_count = sum(1 for r in successful_checks if not r.get("reachable", False))
+        HEALTH_CHECK_SECONDS.labels("batch", "error" if failed_checks else "ok").observe(
+            time.perf_counter() - started
+        )
         
         return {
+            "mode": "icmp",
             "total_nodes": len(nodes),
             "checks_performed": len(successful_checks),
             "connected": connected_count,
             "disconnected": disconnected_count,
             "failed_checks": len(failed_checks),
+            "rows_written": written,
             "results": successful_checks,
             "timestamp": datetime.now(timezone.utc).isoformat()
         }
@@ -0,0 +1,126 @@
+"""
+노드 변경 리비전과 조건부 GET(ETag) 도우미
+세션 커밋 이벤트에서 변경된 노드를 기록하여 프로세스 내 리비전 카운터를 올립니다.
+목록/설정 엔드포인트는 리비전(+ 런타임 스냅샷 generation)으로 ETag를 만들고,
+If-None-Match가 일치하면 DB 조회와 dump 없이 304를 반환합니다 (단일 워커 기준, FleetRevision 참고).
+"""
+
+import hashlib
+import secrets
+import threading
+from typing import Dict, Iterable, Optional
+
+from fastapi import Request, Response
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import Node
+
+
+class FleetRevision:
+    """
+    노드 테이블 리비전 (프로세스 전역)
+    revision은 노드가 바뀐 커밋마다 1씩 증가하고, 노드별 리비전은 그 노드가 마지막으로 바뀐 값입니다.
+    epoch는 프로세스 시작마다 새로 정해지므로 재시작 전 ETag는 일치하지 않습니다.
+    리비전은 프로세스 안의 커밋만 반영하므로 ETag는 uvicorn 워커가 하나일 때만 유효합니다
+    (여러 워커에서는 다른 워커의 변경 후에도 304가 나갈 수 있음).
+    """
+
+    def __init__(self):
+        self.epoch = secrets.token_hex(4)
+        self._lock = threading.Lock()
+        self.revision = 0
+        # 노드별 기록이 없는 노드의 리비전 (일괄 변경 시 전체를 이 값으로 올림)
+        self._floor = 0
+        self._nodes: Dict[str, int] = {}
+
+    def node_revision(self, node_id: str) -> int:
+        return self._nodes.get(node_id, self._floor)
+
+    def mark_nodes(self, node_ids: Iterable[str]):
+        """특정 노드들이 변경됨"""
+        with self._lock:
+            self.revision += 1
+            for node_id in node_ids:
+                self._nodes[node_id] = self.revision
+
+    def bump(self):
+        """어떤 노드가 바뀌었는지 모르는 변경 (일괄 UPDATE 등) - 모든 노드 ETag 무효화"""
+        with self._lock:
+            self.revision += 1
+            self._floor = self.revision
+            self._nodes.clear()
+
+
+# 전역 리비전
+fleet_revision = FleetRevision()
+
+_PENDING_KEY = "fleet_revision_nodes"
+_BULK_KEY = "fleet_revision_bulk"
+
+
+@event.listens_for(Session, "after_flush")
+def _record_flushed_nodes(session, flush_context):
+    changed = session.info.setdefault(_PENDING_KEY, set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Node) and obj.node_id:
+            changed.add(obj.node_id)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _record_bulk_statements(orm_execute_state):
+    # ORM update(Node)/delete(Node) 문은 flush를 거치지 않으므로 전체 무효화
+    if (orm_execute_state.is_update or orm_execute_state.is_delete) and \
+            orm_execute_state.bind_mapper is not None and orm_execute_state.bind_mapper.class_ is Node:
+        orm_execute_state.session.info[_BULK_KEY] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_on_commit(session):
+    changed = session.info.pop(_PENDING_KEY, None)
+    if session.info.pop(_BULK_KEY, False):
+        fleet_revision.bump()
+    elif changed:
+        fleet_revision.mark_nodes(changed)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_on_rollback(session):
+    session.info.pop(_PENDING_KEY, None)
+    session.info.pop(_BULK_KEY, None)
+
+
+# --- ETag ---
+def make_etag(*parts) -> str:
+    """강한 ETag (프로세스 epoch + 리비전 등 구성 요소)"""
+    return '"' + ".".join(str(part) for part in (fleet_revision.epoch, *parts)) + '"'
+
+
+def query_digest(request: Request) -> str:
+    """쿼리 파라미터별로 응답이 다르므로 ETag에 포함 (순서 무관)"""
+    items = sorted(request.query_params.multi_items())
+    return hashlib.blake2b(repr(items).encode(), digest_size=6).hexdigest()
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match 비교 (목록, *, W/ 접두사 허용)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def cache_headers(etag: str) -> Dict[str, str]:
+    # 브라우저가 응답을 저장하되 매번 재검증하도록 (폴링 시 If-None-Match 자동 전송)
+    return {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """If-None-Match가 일치하면 304 응답, 아니면 None"""
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=cache_headers(etag))
+    return None
@@ -0,0 +1,194 @@
+"""
+노드 헬스체크 이력과 상태 전환 히스테리시스
+노드마다 최근 HEALTH_HISTORY_WINDOW 개 관측(up/down/idle)을 고정 크기 링 버퍼에 보관하고,
+같은 결과가 연속 임계값(up/down)만큼 이어질 때만 상태 전환 판정을 냅니다.
+짧은 패킷 손실(예: NCCL all-reduce 버스트)로 connected <-> disconnected 가 반복되지 않도록 하며,
+창 안에서 up/down 이 자주 바뀐 노드(flap score가 높음)는 임계값을 두 배로 적용합니다.
+"""
+
+import os
+import time
+from array import array
+from typing import Dict, List, Optional
+
+from prometheus_client import Counter, Gauge
+
+DOWN = 0
+UP = 1
+IDLE = 2
+RESULT_NAMES = {DOWN: "down", UP: "up", IDLE: "idle"}
+
+# 노드별 보관 관측 수
+HISTORY_WINDOW = int(os.getenv("HEALTH_HISTORY_WINDOW", "32"))
+# connected 로 올리기 / disconnected 로 내리기 위해 필요한 연속 관측 수
+UP_THRESHOLD = int(os.getenv("HEALTH_UP_THRESHOLD", "2"))
+DOWN_THRESHOLD = int(os.getenv("HEALTH_DOWN_THRESHOLD", "3"))
+# 이 flap score(창 안 up/down 변화 비율, 0~1) 이상이면 flapping
+FLAP_THRESHOLD = float(os.getenv("HEALTH_FLAP_THRESHOLD", "0.3"))
+# flap score 계산에 필요한 최소 관측 수
+FLAP_MIN_SAMPLES = 8
+
+FLAPPING_NODES = Gauge(
+    "vpn_health_flapping_nodes",
+    "flap score가 임계값 이상인 노드 수"
+)
+HEALTH_OBSERVATIONS = Counter(
+    "vpn_health_observations_total",
+    "헬스체크 관측 수 (result: up, down, idle / held: 임계값 미달로 상태 유지)",
+    ["result", "held"]
+)
+
+
+class NodeHealthHistory:
+    """노드 하나의 관측 링 버퍼 (결과 1바이트 + 시각 8바이트 x window)"""
+
+    __slots__ = ("results", "times", "head", "size", "run_result", "run_length", "last_verdict", "last_verdict_at")
+
+    def __init__(self, window: int):
+        self.results = bytearray(window)
+        self.times = array("d", bytes(8 * window))
+        self.head = 0
+        self.size = 0
+        self.run_result: Optional[int] = None
+        self.run_length = 0
+        self.last_verdict: Optional[str] = None
+        self.last_verdict_at: Optional[float] = None
+
+    def add(self, result: int, at: float):
+        window = len(self.results)
+        self.results[self.head] = result
+        self.times[self.head] = at
+        self.head = (self.head + 1) % window
+        self.size = min(self.size + 1, window)
+        if result == IDLE:
+            # idle은 근거가 되지 않으므로 연속 구간을 끊지도 늘리지도 않음
+            return
+        if result == self.run_result:
+            self.run_length += 1
+        else:
+            self.run_result = result
+            self.run_length = 1
+
+    def ordered(self) -> List[int]:
+        """오래된 것부터 인덱스 순서"""
+        window = len(self.results)
+        start = (self.head - self.size) % window
+        return [(start + i) % window for i in range(self.size)]
+
+    def flap_score(self) -> float:
+        """창 안 up/down 관측 사이의 변화 비율 (idle 제외, 관측이 적으면 0)"""
+        decisive = [self.results[i] for i in self.ordered() if self.results[i] != IDLE]
+        if len(decisive) < FLAP_MIN_SAMPLES:
+            return 0.0
+        changes = sum(1 for a, b in zip(decisive, decisive[1:]) if a != b)
+        return round(changes / (len(decisive) - 1), 3)
+
+
+class HealthHistory:
+    """
+    노드별 관측 이력 (프로세스 전역)
+    record()는 관측을 추가하고 상태 전환 판정(verdict: "up" / "down" / None=유지)을 반환합니다.
+    """
+
+    def __init__(self, window: int = HISTORY_WINDOW, up_threshold: int = UP_THRESHOLD,
+                 down_threshold: int = DOWN_THRESHOLD, flap_threshold: float = FLAP_THRESHOLD):
+        self.window = window
+        self.up_threshold = up_threshold
+        self.down_threshold = down_threshold
+        self.flap_threshold = flap_threshold
+        self.nodes: Dict[str, NodeHealthHistory] = {}
+        self._flapping = set()
+
+    def record(self, node_id: str, up: Optional[bool], at: Optional[float] = None) -> Dict:
+        """관측 추가 (up=None은 idle) -> verdict, flap score, flapping, 연속 관측 수"""
+        history = self.nodes.get(node_id)
+        if history is None:
+            history = self.nodes[node_id] = NodeHealthHistory(self.window)
+        result = IDLE if up is None else (UP if up else DOWN)
+        history.add(result, at or time.time())
+
+        flap_score = history.flap_score()
+        flapping = flap_score >= self.flap_threshold
+        if flapping:
+            self._flapping.add(node_id)
+        else:
+            self._flapping.discard(node_id)
+        FLAPPING_NODES.set(len(self._flapping))
+
+        # flapping 중에는 두 배 연속 관측이 있어야 전환
+        factor = 2 if flapping else 1
+        verdict = None
+        if result == UP and history.run_length >= self.up_threshold * factor:
+            verdict = "up"
+        elif result == DOWN and history.run_length >= self.down_threshold * factor:
+            verdict = "down"
+        if verdict:
+            history.last_verdict = verdict
+            history.last_verdict_at = time.time()
+        HEALTH_OBSERVATIONS.labels(RESULT_NAMES[result], "no" if verdict or result == IDLE else "yes").inc()
+
+        return {
+            "verdict": verdict,
+            "flap_score": flap_score,
+            "flapping": flapping,
+            "consecutive": history.run_length if result != IDLE else 0
+        }
+
+    def forget(self, node_id: str):
+        self.nodes.pop(node_id, None)
+        self._flapping.discard(node_id)
+        FLAPPING_NODES.set(len(self._flapping))
+
+    def node_history(self, node_id: str, limit: Optional[int] = None) -> Optional[Dict]:
+        """노드 하나의 관측 이력 (최근 것부터)"""
+        history = self.nodes.get(node_id)
+        if history is None:
+            return None
+        indexes = history.ordered()[::-1][:limit]
+        flap_score = history.flap_score()
+        return {
+            "node_id": node_id,
+            "samples": [
+                {"at": history.times[i], "result": RESULT_NAMES[history.results[i]]}
+                for i in indexes
+            ],
+            "observed": history.size,
+            "streak": {
+                "result": RESULT_NAMES.get(history.run_result),
+                "length": history.run_length
+            },
+            "flap_score": flap_score,
+            "flapping": flap_score >= self.flap_threshold,
+            "last_verdict": history.last_verdict,
+            "last_verdict_at": history.last_verdict_at
+        }
+
+    def summary(self, flapping_only: bool = False, limit: int = 100) -> List[Dict]:
+        """노드별 요약 (flap score 높은 순)"""
+        rows = []
+        for node_id in (self._flapping if flapping_only else self.nodes):
+            history = self.nodes[node_id]
+            last = history.ordered()[-1] if history.size else None
+            rows.append({
+                "node_id": node_id,
+                "flap_score": history.flap_score(),
+                "last_result": RESULT_NAMES[history.results[last]] if last is not None else None,
+                "last_at": history.times[last] if last is not None else None,
+                "streak": history.run_length,
+                "observed": history.size
+            })
+        rows.sort(key=lambda row: row["flap_score"], reverse=True)
+        return rows[:limit]
+
+    def config(self) -> Dict:
+        return {
+            "window": self.window,
+            "up_threshold": self.up_threshold,
+            "down_threshold": self.down_threshold,
+            "flap_threshold": self.flap_threshold,
+            "flap_min_samples": FLAP_MIN_SAMPLES
+        }
+
+
+# 전역 헬스 이력
+health_history = HealthHistory()
@@ -0,0 +1,136 @@
+"""
+헬스체크 결과 일괄 저장
+한 주기의 판정 결과를 메모리에 모았다가 한 번에 저장합니다 (노드마다 commit 하지 않음).
+- 저장 대상: 상태가 바뀐 노드 + 마지막 핸드셰이크가 저장된 값보다 새로워진 노드(런타임 통계 갱신)
+- PostgreSQL: UPDATE nodes ... FROM (VALUES ...) 한 문장, 그 외 DB: 같은 UPDATE의 executemany 한 번
+- updated_at은 상태가 바뀐 행만 갱신하고, 커밋 후 상태가 바뀐 노드만 fleet_revision에 기록합니다
+  (테이블 UPDATE는 ORM flush를 거치지 않으므로 전체 ETag 무효화가 일어나지 않음)
+"""
+
+import time
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Optional, Set
+
+from sqlalchemy import BigInteger, Boolean, DateTime, String, Update, bindparam, case, cast, column, func, update, values
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Node
+from fleet_revision import fleet_revision
+from metrics import HEALTH_CHECK_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# 한 문장에 넣는 최대 행 수 (PostgreSQL 바인드 파라미터 32767개 제한, 행당 6개)
+MAX_ROWS_PER_STATEMENT = 5000
+
+_nodes = Node.__table__
+
+
+def handshake_time(latest_handshake: int) -> Optional[datetime]:
+    """wg dump의 latest-handshake(epoch 초, 0=없음) -> timestamptz"""
+    return datetime.fromtimestamp(latest_handshake, timezone.utc) if latest_handshake else None
+
+
+def handshake_advanced(stored: Optional[datetime], latest_handshake: int) -> bool:
+    """저장된 마지막 핸드셰이크보다 새로운 핸드셰이크가 있는지 (WireGuard 재시작으로 0이 되면 기존 값 유지)"""
+    if not latest_handshake:
+        return False
+    if stored is None:
+        return True
+    if stored.tzinfo is None:
+        stored = stored.replace(tzinfo=timezone.utc)
+    return latest_handshake > stored.timestamp()
+
+
+class HealthWriteBatch:
+    """한 주기의 노드별 저장할 값 (같은 노드가 다시 추가되면 마지막 값 사용)"""
+
+    def __init__(self):
+        self.rows: Dict[str, Dict] = {}
+        self.status_changed: Set[str] = set()
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def add(self, node_id: str, old_status: str, new_status: str, runtime: Optional[Dict] = None):
+        """
+        상태 변경 또는 런타임 통계(runtime: latest_handshake, rx_bytes, tx_bytes)가 있으면 저장 대상에 추가
+        런타임 통계는 핸드셰이크가 앞으로 간 경우에만 넘깁니다 (handshake_advanced)
+        """
+        changed = new_status != old_status
+        if not changed and runtime is None:
+            return
+        if changed:
+            self.status_changed.add(node_id)
+        self.rows[node_id] = {
+            "node_id": node_id,
+            "status": new_status,
+            "status_changed": changed,
+            "last_handshake": handshake_time(runtime["latest_handshake"]) if runtime else None,
+            "rx_bytes": runtime["rx_bytes"] if runtime else None,
+            "tx_bytes": runtime["tx_bytes"] if runtime else None
+        }
+
+
+def _update_from_values(rows) -> Update:
+    """UPDATE nodes SET ... FROM (VALUES ...) AS v WHERE nodes.node_id = v.node_id"""
+    v = values(
+        column("node_id", String),
+        column("status", String),
+        column("status_changed", Boolean),
+        column("last_handshake", DateTime(timezone=True)),
+        column("rx_bytes", BigInteger),
+        column("tx_bytes", BigInteger),
+        name="v"
+    ).data([
+        (row["node_id"], row["status"], row["status_changed"],
+         row["last_handshake"], row["rx_bytes"], row["tx_bytes"])
+        for row in rows
+    ])
+    # NULL만 있는 VALUES 열은 text로 추론되므로 명시적으로 형 변환
+    return update(_nodes).where(_nodes.c.node_id == v.c.node_id).values(
+        status=v.c.status,
+        last_handshake=func.coalesce(cast(v.c.last_handshake, DateTime(timezone=True)), _nodes.c.last_handshake),
+        rx_bytes=func.coalesce(cast(v.c.rx_bytes, BigInteger), _nodes.c.rx_bytes),
+        tx_bytes=func.coalesce(cast(v.c.tx_bytes, BigInteger), _nodes.c.tx_bytes),
+        updated_at=case((v.c.status_changed, func.now()), else_=_nodes.c.updated_at)
+    )
+
+
+# UPDATE FROM VALUES를 쓰지 않는 DB용 (executemany)
+_update_by_key = update(_nodes).where(_nodes.c.node_id == bindparam("b_node_id")).values(
+    status=bindparam("b_status"),
+    last_handshake=func.coalesce(bindparam("b_last_handshake", type_=DateTime(timezone=True)), _nodes.c.last_handshake),
+    rx_bytes=func.coalesce(bindparam("b_rx_bytes", type_=BigInteger), _nodes.c.rx_bytes),
+    tx_bytes=func.coalesce(bindparam("b_tx_bytes", type_=BigInteger), _nodes.c.tx_bytes),
+    updated_at=case((bindparam("b_status_changed", type_=Boolean), func.now()), else_=_nodes.c.updated_at)
+)
+
+
+async def flush_health_batch(db: AsyncSession, batch: HealthWriteBatch) -> int:
+    """모은 결과를 한 번에 저장하고 커밋 -> 저장한 행 수 (저장할 것이 없으면 DB에 접근하지 않음)"""
+    if not batch.rows:
+        return 0
+
+    started = time.perf_counter()
+    rows = list(batch.rows.values())
+    try:
+        if db.bind.dialect.name == "postgresql":
+            for offset in range(0, len(rows), MAX_ROWS_PER_STATEMENT):
+                await db.execute(_update_from_values(rows[offset:offset + MAX_ROWS_PER_STATEMENT]))
+        else:
+            await db.execute(_update_by_key, [
+                {f"b_{key}": value for key, value in row.items()} for row in rows
+            ])
+        await db.commit()
+    except Exception:
+        HEALTH_CHECK_SECONDS.labels("write", "error").observe(time.perf_counter() - started)
+        await db.rollback()
+        raise
+    HEALTH_CHECK_SECONDS.labels("write", "ok").observe(time.perf_counter() - started)
+
+    if batch.status_changed:
+        fleet_revision.mark_nodes(batch.status_changed)
+    logger.debug(f"Health batch saved: {len(rows)} rows, {len(batch.status_changed)} status changes")
+    return len(rows)
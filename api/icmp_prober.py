@@ -0,0 +1,324 @@
+"""
+비동기 ICMP 프로버
+프로세스 안에서 ICMP echo 소켓 하나를 공유하여 수백 개 대상을 동시에 측정합니다 (대상마다 ping 프로세스를 만들지 않음).
+- 소켓: 비특권 ping 소켓(SOCK_DGRAM, net.ipv4.ping_group_range) 우선, 없으면 raw 소켓(CAP_NET_RAW)
+- ICMP_PROBE_NETNS 가 지정되면 그 네트워크 네임스페이스(예: /proc/<wireguard pid>/ns/net) 안에서 소켓을 열어
+  WireGuard 서버 쪽 경로로 측정합니다 (소켓은 생성된 네임스페이스에 묶이므로 별도 스레드에서 setns 후 생성)
+- 소켓을 열 수 없는 환경에서는 기존 ping 서브프로세스로 대체 (docker.sock이 있으면 wireguard-server 컨테이너에서 실행)
+"""
+
+import os
+import re
+import time
+import errno
+import socket
+import struct
+import ctypes
+import asyncio
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from prometheus_client import Counter, Histogram
+
+from circuit_breaker import CircuitOpenError, wireguard_breaker
+from wireguard_backend import run_command
+
+logger = logging.getLogger(__name__)
+
+# socket: 프로세스 내 ICMP 소켓 (열 수 없으면 서브프로세스로 대체) | subprocess: 항상 ping 프로세스
+PROBE_MODE = os.getenv("ICMP_PROBER", "socket")
+# 소켓을 열 네트워크 네임스페이스 파일 (비우면 API 프로세스의 네임스페이스)
+PROBE_NETNS = os.getenv("ICMP_PROBE_NETNS", "")
+# 동시에 측정하는 대상 수
+PROBE_CONCURRENCY = int(os.getenv("ICMP_PROBE_CONCURRENCY", "256"))
+# 대상 하나에 보내는 패킷 사이 간격 (초)
+PACKET_INTERVAL = 0.2
+MAX_PACKETS = 10
+
+ICMP_ECHO_REPLY = 0
+ICMP_ECHO_REQUEST = 8
+CLONE_NEWNET = 0x40000000
+PAYLOAD = b"vpn-probe".ljust(16, b"\0")
+
+ICMP_PACKETS = Counter(
+    "vpn_icmp_packets_total",
+    "ICMP 프로버 패킷 수 (result: sent, received, lost)",
+    ["result"]
+)
+ICMP_RTT_SECONDS = Histogram(
+    "vpn_icmp_rtt_seconds",
+    "ICMP echo 왕복 시간",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+
+_PING_SUMMARY = re.compile(r"(\d+) packets transmitted, (\d+) (?:packets )?received")
+_PING_RTT = re.compile(r"= ([\d.]+)/([\d.]+)/([\d.]+)")
+
+
+def icmp_checksum(data: bytes) -> int:
+    if len(data) % 2:
+        data += b"\0"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def echo_request(ident: int, seq: int) -> bytes:
+    header = struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, 0, ident, seq)
+    checksum = icmp_checksum(header + PAYLOAD)
+    return struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, checksum, ident, seq) + PAYLOAD
+
+
+def probe_summary(target: str, rtts: List[Optional[float]], method: str,
+                  error: Optional[str] = None) -> Dict:
+    """패킷별 RTT(초, 응답 없으면 None) -> 손실률/RTT(ms) 요약"""
+    received = [rtt for rtt in rtts if rtt is not None]
+    sent = len(rtts)
+    return {
+        "target": target,
+        "reachable": bool(received),
+        "sent": sent,
+        "received": len(received),
+        "loss": round(1 - len(received) / sent, 3) if sent else 1.0,
+        "rtt_min_ms": round(min(received) * 1000, 3) if received else None,
+        "rtt_avg_ms": round(sum(received) / len(received) * 1000, 3) if received else None,
+        "rtt_max_ms": round(max(received) * 1000, 3) if received else None,
+        "method": method,
+        "error": error
+    }
+
+
+def parse_ping_output(target: str, count: int, stdout: str) -> Dict:
+    """iputils/busybox ping 출력 -> probe_summary 형식 (RTT는 min/avg/max만 알 수 있음)"""
+    summary = _PING_SUMMARY.search(stdout)
+    sent, received = (int(summary.group(1)), int(summary.group(2))) if summary else (count, 0)
+    rtt = _PING_RTT.search(stdout) if received else None
+    result = probe_summary(target, [None] * sent, "subprocess")
+    result.update({
+        "reachable": received > 0,
+        "received": received,
+        "loss": round(1 - received / sent, 3) if sent else 1.0
+    })
+    if rtt:
+        result.update({
+            "rtt_min_ms": float(rtt.group(1)),
+            "rtt_avg_ms": float(rtt.group(2)),
+            "rtt_max_ms": float(rtt.group(3))
+        })
+    return result
+
+
+def _open_icmp_socket() -> Tuple[socket.socket, bool]:
+    """ICMP 소켓 (ping 소켓, 불가하면 raw) -> (socket, raw 여부)"""
+    try:
+        return socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP), False
+    except OSError as e:
+        if e.errno not in (errno.EACCES, errno.EPERM, errno.EPROTONOSUPPORT):
+            raise
+    return socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP), True
+
+
+def _open_icmp_socket_in_netns(path: str) -> Tuple[socket.socket, bool]:
+    """
+    지정한 네트워크 네임스페이스 안에서 소켓 생성
+    setns는 호출한 스레드에만 적용되므로 일회용 스레드에서 전환 -> 생성 -> 복귀합니다.
+    """
+    outcome: Dict = {}
+
+    def worker():
+        libc = ctypes.CDLL(None, use_errno=True)
+        try:
+            with open("/proc/thread-self/ns/net") as own, open(path) as target:
+                if libc.setns(target.fileno(), CLONE_NEWNET) != 0:
+                    err = ctypes.get_errno()
+                    raise OSError(err, f"setns({path}): {os.strerror(err)}")
+                try:
+                    outcome["result"] = _open_icmp_socket()
+                finally:
+                    libc.setns(own.fileno(), CLONE_NEWNET)
+        except Exception as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=worker, name="icmp-netns", daemon=True)
+    thread.start()
+    thread.join()
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["result"]
+
+
+class IcmpProber:
+    """
+    공유 ICMP 소켓 하나로 여러 대상을 동시에 측정 (프로세스 전역)
+    응답은 이벤트 루프의 reader 콜백에서 (대상 IP, 시퀀스)로 대기 중인 future에 전달합니다.
+    """
+
+    def __init__(self, mode: str = PROBE_MODE, netns: str = PROBE_NETNS,
+                 concurrency: int = PROBE_CONCURRENCY):
+        self.mode = mode
+        self.netns = netns
+        self.concurrency = concurrency
+        self.unavailable: Optional[str] = None if mode == "socket" else "ICMP_PROBER=subprocess"
+        self._sock: Optional[socket.socket] = None
+        self._raw = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._waiters: Dict[Tuple[str, int], asyncio.Future] = {}
+        self._ident = os.getpid() & 0xFFFF
+        self._seq = 0
+
+    @property
+    def method(self) -> str:
+        return "subprocess" if self.unavailable else ("raw" if self._raw else "datagram")
+
+    def _ensure_socket(self) -> bool:
+        """현재 이벤트 루프에 연결된 소켓 준비 (열 수 없으면 False, 이후 서브프로세스 사용)"""
+        if self.unavailable:
+            return False
+        loop = asyncio.get_running_loop()
+        if self._sock is not None and self._loop is loop:
+            return True
+        self.close()
+        try:
+            sock, raw = _open_icmp_socket_in_netns(self.netns) if self.netns else _open_icmp_socket()
+        except OSError as e:
+            self.unavailable = str(e)
+            logger.warning(f"ICMP socket unavailable, falling back to ping subprocess: {e}")
+            return False
+        sock.setblocking(False)
+        loop.add_reader(sock.fileno(), self._on_readable)
+        self._sock, self._raw, self._loop = sock, raw, loop
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        logger.info(f"ICMP prober using {self.method} socket" + (f" in {self.netns}" if self.netns else ""))
+        return True
+
+    def close(self):
+        if self._sock is None:
+            return
+        try:
+            self._loop.remove_reader(self._sock.fileno())
+        except Exception:
+            pass
+        self._sock.close()
+        self._sock = None
+        for future in self._waiters.values():
+            if not future.done():
+                future.cancel()
+        self._waiters.clear()
+
+    def _on_readable(self):
+        received_at = time.perf_counter()
+        while True:
+            try:
+                data, address = self._sock.recvfrom(2048)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                logger.debug(f"ICMP receive error: {e}")
+                return
+            if self._raw:
+                # raw 소켓은 IP 헤더 포함, 다른 프로세스의 ICMP도 받으므로 식별자로 거름
+                data = data[(data[0] & 0x0F) * 4:]
+            if len(data) < 8:
+                continue
+            icmp_type, _, _, ident, seq = struct.unpack("!BBHHH", data[:8])
+            if icmp_type != ICMP_ECHO_REPLY or (self._raw and ident != self._ident):
+                continue
+            future = self._waiters.get((address[0], seq))
+            if future is not None and not future.done():
+                future.set_result(received_at)
+
+    def _next_seq(self, target: str) -> int:
+        for _ in range(0x10000):
+            self._seq = (self._seq + 1) & 0xFFFF
+            if (target, self._seq) not in self._waiters:
+                return self._seq
+        raise RuntimeError("ICMP sequence space exhausted")
+
+    async def _echo(self, target: str, timeout: float) -> Optional[float]:
+        """echo 하나 -> RTT(초), 시간 내 응답이 없으면 None"""
+        loop = asyncio.get_running_loop()
+        seq = self._next_seq(target)
+        future = self._waiters[(target, seq)] = loop.create_future()
+        try:
+            packet = echo_request(self._ident, seq)
+            sent_at = time.perf_counter()
+            while True:
+                try:
+                    self._sock.sendto(packet, (target, 0))
+                    break
+                except (BlockingIOError, InterruptedError):
+                    # 송신 버퍼가 가득 참: 잠시 양보 후 재시도
+                    await asyncio.sleep(0.001)
+            ICMP_PACKETS.labels("sent").inc()
+            try:
+                received_at = await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                ICMP_PACKETS.labels("lost").inc()
+                return None
+            rtt = received_at - sent_at
+            ICMP_PACKETS.labels("received").inc()
+            ICMP_RTT_SECONDS.observe(rtt)
+            return rtt
+        finally:
+            self._waiters.pop((target, seq), None)
+
+    async def probe(self, target: str, count: int = 1, timeout: float = 2.0) -> Dict:
+        """
+        대상 하나에 count개 패킷 (PACKET_INTERVAL 간격, 패킷마다 timeout 초 대기) -> 손실률/RTT 요약
+        주소 오류 등 송신 실패는 error에 기록하고 도달 불가로 보고합니다.
+        """
+        count = max(1, min(count, MAX_PACKETS))
+        if not self._ensure_socket():
+            return await self._probe_subprocess(target, count, timeout)
+
+        async with self._semaphore:
+            tasks = []
+            try:
+                for i in range(count):
+                    if i:
+                        await asyncio.sleep(PACKET_INTERVAL)
+                    tasks.append(asyncio.ensure_future(self._echo(target, timeout)))
+                rtts = await asyncio.gather(*tasks)
+            except OSError as e:
+                for task in tasks:
+                    task.cancel()
+                return probe_summary(target, [None] * count, self.method, error=str(e))
+        return probe_summary(target, list(rtts), self.method)
+
+    async def probe_many(self, targets: Iterable[str], count: int = 1, timeout: float = 2.0) -> Dict[str, Dict]:
+        """여러 대상 동시 측정 (동시 측정 수는 concurrency로 제한) -> 대상별 결과"""
+        targets = list(dict.fromkeys(targets))
+        results = await asyncio.gather(*(self.probe(target, count, timeout) for target in targets))
+        return dict(zip(targets, results))
+
+    async def _probe_subprocess(self, target: str, count: int, timeout: float) -> Dict:
+        """소켓을 쓸 수 없을 때: 기존 ping 프로세스 (Docker 환경에서는 WireGuard 컨테이너에서 실행)"""
+        deadline = timeout + (count - 1) * PACKET_INTERVAL + 3
+        ping = ['ping', '-c', str(count), '-i', str(PACKET_INTERVAL), '-W', str(int(max(1, timeout))), target]
+        try:
+            if os.path.exists("/var/run/docker.sock"):
+                result = await run_command(['docker', 'exec', 'wireguard-server', *ping],
+                                           timeout=deadline, breaker=wireguard_breaker)
+            else:
+                result = await run_command(ping, timeout=deadline)
+        except CircuitOpenError:
+            raise
+        except (OSError, TimeoutError) as e:
+            return probe_summary(target, [None] * count, "subprocess", error=str(e))
+        return parse_ping_output(target, count, result.stdout)
+
+    def status(self) -> Dict:
+        return {
+            "method": self.method,
+            "netns": self.netns or None,
+            "concurrency": self.concurrency,
+            "in_flight": len(self._waiters),
+            "unavailable_reason": self.unavailable
+        }
+
+
+# 전역 프로버
+icmp_prober = IcmpProber()
@@ -0,0 +1,329 @@
+"""
+VPN IP 비트맵 할당기
+설정된 범위(기본 10.100.1.2 ~ 10.100.255.254)의 주소를 1비트씩 비트맵으로 관리합니다.
+빈 주소는 커서 위치부터 C 수준 바이트 검색으로 찾으므로 수만 개 노드에서도 할당이 O(1)에 가깝고,
+비트맵은 DB(ip_pool_state)에 저장되어 시작 시 nodes 전체 스캔이 필요 없습니다.
+"""
+
+import os
+import re
+import hashlib
+import secrets
+import threading
+import ipaddress
+import logging
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from models import IPPoolState, Node
+
+logger = logging.getLogger(__name__)
+
+# 10.100.0.x는 서버/중앙 대역, 10.100.1.1은 VPN 게이트웨이
+DEFAULT_IP_RANGES = "10.100.1.2-10.100.255.254"
+
+# 0xFF가 아닌 첫 바이트 = 빈 비트가 있는 바이트
+_FREE_BYTE = re.compile(b"[^\xff]")
+
+
+def parse_ip_ranges(spec: str) -> List[Tuple[int, int]]:
+    """
+    "a.b.c.d-e.f.g.h,10.100.5.0/24" 형식의 범위 목록 -> [(시작, 끝)] 정수 범위
+    CIDR는 네트워크/브로드캐스트 주소를 제외합니다.
+    """
+    ranges = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = [ipaddress.IPv4Address(p.strip()) for p in part.split("-", 1)]
+        else:
+            network = ipaddress.IPv4Network(part, strict=False)
+            start, end = network.network_address + 1, network.broadcast_address - 1
+        if int(end) < int(start):
+            raise ValueError(f"잘못된 IP 범위: {part}")
+        ranges.append((int(start), int(end)))
+    return ranges
+
+
+def _is_usable(address: int) -> bool:
+    """각 /24의 .0 / .255는 할당하지 않음"""
+    return address & 0xFF not in (0, 255)
+
+
+class IPAllocator:
+    """
+    비트맵 기반 VPN IP 할당기
+    비트 1 = 사용 중(또는 할당 불가), 0 = 빈 주소. 상태 변경은 호출자의 세션에 기록되며
+    호출자가 커밋합니다.
+    """
+
+    def __init__(self, ranges: Optional[str] = None, pool_name: str = "wg0"):
+        self.spec = ranges or os.getenv("WG_IP_RANGES", DEFAULT_IP_RANGES)
+        self.pool_name = pool_name
+        self.ranges = parse_ip_ranges(self.spec)
+        # 범위별 비트맵 시작 인덱스
+        self._offsets = []
+        total = 0
+        for start, end in self.ranges:
+            self._offsets.append(total)
+            total += end - start + 1
+        self.size = total
+        self._unusable = sum(
+            1 for start, end in self.ranges
+            for block in range(start & ~0xFF, end + 1, 256)
+            for address in (block, block + 255)
+            if start <= address <= end
+        )
+        self._lock = threading.RLock()
+        self._bitmap = bytearray()
+        self._cursor = 0
+        self._version: Optional[int] = None
+        self._loaded = False
+        # advisory lock 키 (풀 이름별 고정 64비트 값)
+        self._lock_key = int.from_bytes(hashlib.sha1(f"ip_pool:{pool_name}".encode()).digest()[:8], "big", signed=True)
+
+    # --- 주소 <-> 인덱스 ---
+    def index_of(self, ip: str) -> Optional[int]:
+        try:
+            address = int(ipaddress.IPv4Address(ip.split("/")[0]))
+        except ValueError:
+            return None
+        for (start, end), offset in zip(self.ranges, self._offsets):
+            if start <= address <= end:
+                return offset + address - start
+        return None
+
+    def ip_at(self, index: int) -> str:
+        for (start, end), offset in zip(self.ranges, self._offsets):
+            if index < offset + end - start + 1:
+                return str(ipaddress.IPv4Address(start + index - offset))
+        raise IndexError(index)
+
+    def contains_network(self, cidr: str) -> bool:
+        """cidr 전체가 할당 범위 중 하나에 포함되는지 (워커 라우트 대상 판별)"""
+        network = ipaddress.IPv4Network(cidr, strict=False)
+        first, last = int(network.network_address), int(network.broadcast_address)
+        return any(start <= first and last <= end for start, end in self.ranges)
+
+    # --- 비트 연산 ---
+    def _test(self, index: int) -> bool:
+        return bool(self._bitmap[index >> 3] & (1 << (index & 7)))
+
+    def _set(self, index: int):
+        self._bitmap[index >> 3] |= 1 << (index & 7)
+
+    def _clear(self, index: int):
+        self._bitmap[index >> 3] &= ~(1 << (index & 7)) & 0xFF
+
+    def _empty_bitmap(self) -> bytearray:
+        """할당 불가 주소(.0/.255, 마지막 바이트 패딩)만 표시된 비트맵"""
+        self._bitmap = bytearray((self.size + 7) // 8)
+        for index in range(self.size, len(self._bitmap) * 8):
+            self._set(index)
+        for (start, end), offset in zip(self.ranges, self._offsets):
+            # .0 / .255 위치만 순회 (256개마다 2개)
+            first_block = start & ~0xFF
+            for block in range(first_block, end + 1, 256):
+                for address in (block, block + 255):
+                    if start <= address <= end:
+                        self._set(offset + address - start)
+        return self._bitmap
+
+    # --- 잠금 / 영속화 ---
+    def _lock_pool(self, db: Session):
+        """
+        풀 잠금: PostgreSQL에서는 트랜잭션 범위 advisory lock을 잡아 여러 프로세스/워커의
+        할당을 직렬화합니다. 잠금은 호출자가 노드 행과 함께 커밋(또는 롤백)할 때 풀립니다.
+        """
+        if db.get_bind().dialect.name == "postgresql":
+            db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": self._lock_key})
+
+    def _sync(self, db: Session):
+        """잠금 획득 후 DB의 비트맵 버전과 맞춤 (버전이 같으면 작은 조회 1회로 끝남)"""
+        row = db.query(IPPoolState.version, IPPoolState.ranges).filter(
+            IPPoolState.name == self.pool_name
+        ).first()
+        if row is None or row.ranges != self.spec:
+            self.rebuild(db)
+            return
+        if self._loaded and row.version == self._version:
+            return
+        state = db.get(IPPoolState, self.pool_name, populate_existing=True)
+        if len(state.bitmap) != (self.size + 7) // 8:
+            self.rebuild(db)
+            return
+        self._bitmap = bytearray(state.bitmap)
+        self._cursor = state.cursor or 0
+        self._version = state.version
+        self._loaded = True
+
+    def ensure_loaded(self, db: Session):
+        """저장된 비트맵 로드 (없거나 범위 설정이 바뀐 경우에만 nodes에서 재구성)"""
+        if self._loaded:
+            return
+        # 잠금 순서: DB 풀 잠금 -> 프로세스 내 잠금
+        self._lock_pool(db)
+        with self._lock:
+            self._sync(db)
+
+    def rebuild(self, db: Session):
+        """nodes 테이블 기준으로 비트맵 재구성 (최초 1회 또는 범위 변경 시)"""
+        with self._lock:
+            self._empty_bitmap()
+            self._cursor = 0
+            for (vpn_ip,) in db.query(Node.vpn_ip).filter(Node.vpn_ip.isnot(None)).all():
+                index = self.index_of(vpn_ip)
+                if index is not None:
+                    self._set(index)
+            self._save(db)
+            self._loaded = True
+            logger.info(f"IP 비트맵 재구성 완료: {self.used()}/{self.size} 사용 중")
+
+    def _save(self, db: Session):
+        state = db.get(IPPoolState, self.pool_name)
+        if state is None:
+            state = IPPoolState(name=self.pool_name)
+            db.add(state)
+        state.ranges = self.spec
+        state.bitmap = bytes(self._bitmap)
+        state.cursor = self._cursor
+        # 버전은 변경마다 새 난수: 롤백된 메모리 상태가 다른 프로세스의 커밋과 같은 버전을 갖지 않도록 함
+        state.version = secrets.randbits(62)
+        self._version = state.version
+        db.flush()
+
+    # --- 할당 / 예약 / 해제 ---
+    def _next_free(self) -> Optional[int]:
+        match = _FREE_BYTE.search(self._bitmap, self._cursor) or _FREE_BYTE.search(self._bitmap, 0, self._cursor)
+        if match is None:
+            return None
+        byte_index = match.start()
+        value = self._bitmap[byte_index]
+        # 가장 낮은 0 비트
+        bit = ((~value) & (value + 1)).bit_length() - 1
+        return (byte_index << 3) + bit
+
+    def allocate(self, db: Session) -> Optional[str]:
+        """
+        빈 주소 하나를 사용 중으로 표시하고 반환 (풀이 가득 차면 None)
+        노드 행 저장과 같은 트랜잭션에서 호출해야 하며, 커밋 전까지 다른 할당은 대기합니다.
+        """
+        self._lock_pool(db)
+        with self._lock:
+            self._sync(db)
+            while True:
+                index = self._next_free()
+                if index is None:
+                    logger.error("VPN IP 풀이 가득 찼습니다")
+                    return None
+                self._set(index)
+                self._cursor = index >> 3
+                ip = self.ip_at(index)
+                # 비트맵이 DB와 어긋난 경우(다른 경로로 삽입된 노드) 인덱스 조회로 확인 후 건너뜀
+                if db.query(Node.node_id).filter(Node.vpn_ip == ip).first() is None:
+                    break
+                logger.warning(f"IP 비트맵 불일치 수정: {ip} 이미 사용 중")
+            self._save(db)
+            return ip
+
+    def allocate_many(self, db: Session, count: int) -> List[str]:
+        """
+        빈 주소 count개를 한 번의 잠금/검증 조회/기록으로 할당 (일괄 등록용)
+        풀이 부족하면 아무것도 할당하지 않고 빈 목록을 반환합니다 (호출자가 롤백).
+        """
+        self._lock_pool(db)
+        with self._lock:
+            self._sync(db)
+            ips: List[str] = []
+            while len(ips) < count:
+                batch = []
+                while len(ips) + len(batch) < count:
+                    index = self._next_free()
+                    if index is None:
+                        break
+                    self._set(index)
+                    self._cursor = index >> 3
+                    batch.append(self.ip_at(index))
+                if not batch:
+                    break
+                # 비트맵 불일치 확인을 주소마다가 아닌 배치당 한 번의 IN 조회로
+                taken = {ip for (ip,) in db.query(Node.vpn_ip).filter(Node.vpn_ip.in_(batch)).all()}
+                for ip in taken:
+                    logger.warning(f"IP 비트맵 불일치 수정: {ip} 이미 사용 중")
+                ips.extend(ip for ip in batch if ip not in taken)
+            if len(ips) < count:
+                logger.error(f"VPN IP 풀 부족: {count}개 요청, {len(ips)}개 가능")
+                # 메모리 비트맵을 DB 상태로 되돌림
+                self._loaded = False
+                return []
+            self._save(db)
+            return ips
+
+    def reserve(self, db: Session, ip: str) -> bool:
+        """특정 주소를 사용 중으로 표시 (이미 사용 중이거나 범위 밖이면 False)"""
+        index = self.index_of(ip)
+        if index is None:
+            return False
+        self._lock_pool(db)
+        with self._lock:
+            self._sync(db)
+            if self._test(index):
+                return False
+            self._set(index)
+            self._save(db)
+            return True
+
+    def release(self, db: Session, ip: Optional[str]) -> bool:
+        """주소 반환 (범위 밖 / 할당 불가 주소는 무시)"""
+        return self.release_many(db, [ip]) > 0
+
+    def release_many(self, db: Session, ips: List[Optional[str]]) -> int:
+        """여러 주소를 한 번의 잠금/기록으로 반환"""
+        indexes = []
+        for ip in ips:
+            index = self.index_of(ip) if ip else None
+            if index is not None and _is_usable(int(ipaddress.IPv4Address(ip.split("/")[0]))):
+                indexes.append(index)
+        if not indexes:
+            return 0
+        self._lock_pool(db)
+        with self._lock:
+            self._sync(db)
+            released = 0
+            for index in indexes:
+                if self._test(index):
+                    self._clear(index)
+                    # 낮은 주소가 반환되면 다음 할당이 그 위치부터 찾도록 커서를 당김
+                    self._cursor = min(self._cursor, index >> 3)
+                    released += 1
+            if released:
+                self._save(db)
+            return released
+
+    def used(self) -> int:
+        """사용 중인 주소 수 (할당 불가 주소와 패딩 비트 제외)"""
+        padding = len(self._bitmap) * 8 - self.size
+        return int.from_bytes(self._bitmap, "little").bit_count() - padding - self._unusable
+
+    def stats(self) -> dict:
+        capacity = self.size - self._unusable
+        used = self.used() if self._loaded else None
+        return {
+            "ranges": self.spec,
+            "capacity": capacity,
+            "used": used,
+            "free": capacity - used if used is not None else None
+        }
+
+    def invalidate(self):
+        """다음 호출 시 DB에서 다시 로드"""
+        with self._lock:
+            self._loaded = False
+
+
+# 전역 할당기
+ip_allocator = IPAllocator()
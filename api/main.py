@@ -1,11 +1,13 @@
-from fastapi import FastAPI, HTTPException, Depends, status, Response
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, status, Response
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.responses import JSONResponse, FileResponse, Response
-from sqlalchemy.orm import Session
-from sqlalchemy.exc import OperationalError
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 import os
+import asyncio
 import base64
 import time
 import tempfile
@@ -15,32 +17,25 @@ import logging
 
 logger = logging.getLogger(__name__)
 
-from database import SessionLocal, engine, Base
-from models import Node, NodeCreate, NodeResponse, NodeStatus
-from wireguard_manager import WireGuardManager
+from database import get_async_db
+from models import Node, NodeBatchCreate, NodeBatchResponse, NodeCreate, NodeResponse, NodeStatus
+from wireguard_manager import WireGuardManager, async_wg_manager
+from wireguard_snapshot import wg_snapshot
+from wireguard_reconciler import desired_peer_query, peer_nodes, peer_reconciler
+from app_startup import app_startup
+from background_health_monitor import health_monitor
+from circuit_breaker import CircuitOpenError, wireguard_breaker
+from icmp_prober import icmp_prober, probe_summary
+from health_history import health_history
+from health_writer import HealthWriteBatch, flush_health_batch
+from connection_manager import connection_manager
+from tracing import MAX_PROFILE_REQUESTS, TracingMiddleware, profile_text, request_profiler, span
+from metrics import CONTENT_TYPE_LATEST, MetricsMiddleware, monitor_event_loop_lag, render as render_metrics
+from wireguard_identity import server_identity
+from fleet_revision import cache_headers, fleet_revision, make_etag, not_modified, query_digest
+from node_listing import MAX_PAGE_SIZE, NODE_COLUMNS, RUNTIME_FIELDS, fetch_node_page, parse_fields, project
 from simple_worker_docker_runner import generate_simple_worker_runner, generate_simple_worker_runner_wsl
 
-# DB 연결 재시도 함수
-def wait_for_db(max_retries=30):
-    """데이터베이스 연결이 준비될 때까지 대기"""
-    for i in range(max_retries):
-        try:
-            # 연결 테스트
-            conn = engine.connect()
-            conn.close()
-            print("Database connected successfully!")
-            return True
-        except OperationalError:
-            print(f"Waiting for database... ({i+1}/{max_retries})")
-            time.sleep(2)
-    raise Exception("Could not connect to database after 30 attempts")
-
-# DB 연결 대기
-wait_for_db()
-
-# 데이터베이스 초기화
-Base.metadata.create_all(bind=engine)
-
 app = FastAPI(
     title="WireGuard VPN Manager API",
     description="자체 호스팅 WireGuard VPN 관리 시스템",
@@ -56,18 +51,34 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 라우트별 요청 시간 메트릭, 요청 단계별 시간(Server-Timing)/프로파일러
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(TracingMiddleware)
+
+@app.exception_handler(CircuitOpenError)
+async def circuit_open_handler(request: Request, exc: CircuitOpenError):
+    """WireGuard 브레이커가 열려 있으면 503 + Retry-After (요청이 제한 시간까지 쌓이지 않도록)"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc), "circuit": exc.name},
+        headers={"Retry-After": str(max(1, int(exc.retry_after)))}
+    )
+
+def wg_error_status(e: Exception) -> int:
+    """WireGuard 작업 실패의 HTTP 상태 (브레이커 열림/시간 초과는 일시적 장애이므로 503)"""
+    return 503 if isinstance(e, (CircuitOpenError, TimeoutError)) else 500
+
+# 스크랩 시 handshake 나이 집계에 사용할 dump 스냅샷의 최대 나이 (초, 스크랩 주기 정도)
+METRICS_SNAPSHOT_MAX_AGE = 15.0
+
 security = HTTPBearer()
 wg_manager = WireGuardManager()
 
 # API 토큰 (환경변수에서 가져오기)
 API_TOKEN = os.getenv("API_TOKEN", "test-token-123")
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# 단일 노드 연결 테스트 패킷 수
+PING_COUNT = 3
 
 def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """API 토큰 검증"""
@@ -89,36 +100,101 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    """헬스체크"""
-    return {"status": "healthy", "service": "vpn-manager"}
+    """헬스체크 (WireGuard 브레이커가 열려 있으면 degraded)"""
+    breaker = wireguard_breaker.status()
+    return {
+        "status": "healthy" if breaker["state"] == "closed" else "degraded",
+        "service": "vpn-manager",
+        "wireguard_circuit": breaker
+    }
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus 메트릭 (스냅샷이 METRICS_SNAPSHOT_MAX_AGE보다 오래됐을 때만 dump 1회)"""
+    try:
+        await wg_snapshot.aget(max_age=METRICS_SNAPSHOT_MAX_AGE)
+    except Exception as e:
+        logger.warning(f"메트릭용 WireGuard 스냅샷 조회 실패: {e}")
+    return Response(content=render_metrics(), headers={"Content-Type": CONTENT_TYPE_LATEST})
+
+@app.post("/api/debug/profile")
+async def start_profile(
+    requests: int = Query(10, ge=1, le=MAX_PROFILE_REQUESTS, description="측정할 다음 요청 수"),
+    token: str = Depends(verify_token)
+):
+    """다음 N개 요청을 cProfile로 측정 (완료되면 /api/debug/profile/{file} 로 다운로드)"""
+    try:
+        return request_profiler.arm(requests)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.get("/api/debug/profile")
+async def profile_status(token: str = Depends(verify_token)):
+    """프로파일 측정 상태와 저장된 파일 목록"""
+    return request_profiler.status()
+
+@app.get("/api/debug/profile/{filename}")
+async def download_profile(
+    filename: str,
+    format: str = Query("prof", pattern="^(prof|text)$", description="prof: pstats 파일 (snakeviz 등), text: 상위 함수 요약"),
+    token: str = Depends(verify_token)
+):
+    """저장된 프로파일 다운로드"""
+    path = request_profiler.path_for(filename)
+    if not path:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "text" and path.endswith(".prof"):
+        return Response(content=await asyncio.to_thread(profile_text, path), media_type="text/plain")
+    return FileResponse(path, filename=filename, media_type="application/octet-stream")
+
+@app.get("/health/live")
+async def liveness_check():
+    """Liveness: 프로세스와 이벤트 루프가 응답하는지만 확인 (DB/WireGuard 상태와 무관)"""
+    return {"status": "alive", "uptime_seconds": app_startup.status()["uptime_seconds"]}
+
+@app.get("/health/ready")
+async def readiness_check():
+    """Readiness: 백그라운드 시작 작업(DB 대기, 스키마, 피어 동기화) 진행 상황, 완료 전에는 503"""
+    progress = app_startup.status()
+    return JSONResponse(
+        status_code=200 if progress["ready"] else 503,
+        content={
+            "status": "ready" if progress["ready"] else "starting",
+            **progress,
+            "wireguard_circuit": wireguard_breaker.status()
+        }
+    )
 
 @app.post("/nodes/register", response_model=NodeResponse)
 async def register_node(
     node: NodeCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     token: str = Depends(verify_token)
 ):
     """노드 등록 및 WireGuard 설정 생성"""
     
     # 기존 노드 확인 - 재등록 허용
-    existing = db.query(Node).filter(Node.node_id == node.node_id).first()
+    existing = await db.get(Node, node.node_id)
     if existing:
         logger.info(f"Re-registering existing node {node.node_id}")
         # 기존 피어 제거
         try:
-            wg_manager.remove_peer_from_server(existing.public_key)
+            with span("remove_old_peer"):
+                await async_wg_manager.remove_peer_from_server(existing.public_key)
         except Exception as e:
             logger.warning(f"Failed to remove old peer: {e}")
         
         # 새 키 생성
-        keys = wg_manager.generate_keypair()
+        with span("keygen"):
+            keys = wg_manager.generate_keypair()
         
         # 설정 재생성 (기존 IP 유지)
-        config = wg_manager.generate_client_config(
-            private_key=keys['private_key'],
-            client_ip=existing.vpn_ip,
-            server_public_key=wg_manager.get_server_public_key()
-        )
+        with span("client_config"):
+            config = await async_wg_manager.generate_client_config(
+                private_key=keys['private_key'],
+                client_ip=existing.vpn_ip,
+                server_public_key=await async_wg_manager.get_server_public_key()
+            )
         
         # DB 업데이트
         existing.public_key = keys['public_key']
@@ -129,43 +205,49 @@ async def register_node(
         existing.status = "registered"
         existing.updated_at = datetime.utcnow()
         
-        db.commit()
-        db.refresh(existing)
+        with span("db_commit"):
+            await db.commit()
+            await db.refresh(existing)
         
         # WireGuard 서버에 새 피어 추가
         try:
-            wg_manager.add_peer_to_server(
-                public_key=keys['public_key'],
-                vpn_ip=existing.vpn_ip,
-                node_id=existing.node_id
-            )
+            with span("add_peer"):
+                await async_wg_manager.add_peer_to_server(
+                    public_key=keys['public_key'],
+                    vpn_ip=existing.vpn_ip,
+                    node_id=existing.node_id
+                )
         except Exception as e:
-            raise HTTPException(status_code=500, detail=f"WireGuard 피어 추가 실패: {str(e)}")
+            raise HTTPException(status_code=wg_error_status(e), detail=f"WireGuard 피어 추가 실패: {str(e)}")
         
         return NodeResponse(
             node_id=existing.node_id,
             vpn_ip=existing.vpn_ip,
             config=base64.b64encode(config.encode()).decode(),
             public_key=existing.public_key,
-            server_public_key=wg_manager.get_server_public_key(),
-            server_endpoint=f"{os.getenv('SERVERURL', 'localhost')}:41820"
+            server_public_key=await async_wg_manager.get_server_public_key(),
+            server_endpoint=await async_wg_manager.get_server_endpoint()
         )
     
-    # VPN IP 할당 (통합된 allocate_ip 메서드 사용)
-    vpn_ip = wg_manager.allocate_ip(node.node_type)
+    # WireGuard 키 생성
+    with span("keygen"):
+        keys = wg_manager.generate_keypair()
+    
+    # VPN IP 할당 (풀 잠금은 노드 저장 커밋까지 유지)
+    with span("ip_alloc"):
+        vpn_ip = await async_wg_manager.allocate_ip(db, node.node_type)
     if not vpn_ip:
+        await db.rollback()
         raise HTTPException(status_code=500, detail="VPN IP 할당 실패")
     
-    # WireGuard 키 생성
-    keys = wg_manager.generate_keypair()
-    
     # 피어 설정 생성
-    config = wg_manager.create_peer_config(
-        node_id=node.node_id,
-        vpn_ip=vpn_ip,
-        private_key=keys['private_key'],
-        public_key=keys['public_key']
-    )
+    with span("client_config"):
+        config = await async_wg_manager.create_peer_config(
+            node_id=node.node_id,
+            vpn_ip=vpn_ip,
+            private_key=keys['private_key'],
+            public_key=keys['public_key']
+        )
     
     # DB 저장
     db_node = Node(
@@ -181,99 +263,261 @@ async def register_node(
     )
     
     db.add(db_node)
-    db.commit()
-    db.refresh(db_node)
+    with span("db_commit"):
+        await db.commit()
+        await db.refresh(db_node)
     
     # WireGuard 서버에 피어 추가
     try:
-        wg_manager.add_peer_to_server(
-            public_key=keys['public_key'],
-            vpn_ip=vpn_ip,
-            node_id=node.node_id
-        )
+        with span("add_peer"):
+            await async_wg_manager.add_peer_to_server(
+                public_key=keys['public_key'],
+                vpn_ip=vpn_ip,
+                node_id=node.node_id
+            )
     except Exception as e:
         # 실패 시 DB에서 제거
-        db.delete(db_node)
-        db.commit()
-        raise HTTPException(status_code=500, detail=f"WireGuard 피어 추가 실패: {str(e)}")
+        await async_wg_manager.release_ip(db, vpn_ip)
+        await db.delete(db_node)
+        await db.commit()
+        raise HTTPException(status_code=wg_error_status(e), detail=f"WireGuard 피어 추가 실패: {str(e)}")
     
     return NodeResponse(
         node_id=db_node.node_id,
         vpn_ip=db_node.vpn_ip,
         config=base64.b64encode(config.encode()).decode(),
         public_key=db_node.public_key,
-        server_public_key=wg_manager.get_server_public_key(),
-        server_endpoint=f"{os.getenv('SERVERURL', 'localhost')}:41820"
+        server_public_key=await async_wg_manager.get_server_public_key(),
+        server_endpoint=await async_wg_manager.get_server_endpoint()
+    )
+
+@app.post("/nodes/register/batch", response_model=NodeBatchResponse)
+async def register_nodes_batch(
+    batch: NodeBatchCreate,
+    db: AsyncSession = Depends(get_async_db),
+    token: str = Depends(verify_token)
+):
+    """
+    노드 일괄 등록 (사전 프로비저닝)
+    N개 노드의 IP/키 할당과 저장을 한 트랜잭션으로, WireGuard 피어 적용을 설정 1회 기록 + syncconf 1회로 처리합니다.
+    재등록은 지원하지 않으며 이미 존재하는 node_id가 있으면 아무것도 등록하지 않습니다 (409).
+    """
+    node_ids = [node.node_id for node in batch.nodes]
+    if len(set(node_ids)) != len(node_ids):
+        raise HTTPException(status_code=400, detail="요청에 중복된 node_id가 있습니다")
+    
+    existing = (await db.scalars(select(Node.node_id).where(Node.node_id.in_(node_ids)))).all()
+    if existing:
+        raise HTTPException(
+            status_code=409,
+            detail=f"이미 등록된 노드: {', '.join(sorted(existing)[:20])}"
+        )
+    
+    keys = await async_wg_manager.generate_keypairs(len(batch.nodes))
+    
+    # VPN IP 일괄 할당 (풀 잠금은 노드 저장 커밋까지 유지)
+    vpn_ips = await async_wg_manager.allocate_ips(db, len(batch.nodes))
+    if not vpn_ips:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"VPN IP 할당 실패 ({len(batch.nodes)}개 요청)")
+    
+    server_public_key = await async_wg_manager.get_server_public_key()
+    server_endpoint = await async_wg_manager.get_server_endpoint()
+    
+    db_nodes = []
+    for node, node_keys, vpn_ip in zip(batch.nodes, keys, vpn_ips):
+        db_nodes.append(Node(
+            node_id=node.node_id,
+            node_type=node.node_type,
+            hostname=node.hostname,
+            public_ip=node.public_ip,
+            vpn_ip=vpn_ip,
+            description=node.description,
+            public_key=node_keys['public_key'],
+            private_key=node_keys['private_key'],
+            config=wg_manager.create_peer_config(
+                node_id=node.node_id,
+                vpn_ip=vpn_ip,
+                private_key=node_keys['private_key'],
+                public_key=node_keys['public_key']
+            ),
+            status="registered"
+        ))
+    
+    db.add_all(db_nodes)
+    try:
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        await async_wg_manager.release_ips(db, vpn_ips)
+        await db.commit()
+        logger.error(f"노드 일괄 저장 실패: {e}")
+        raise HTTPException(status_code=500, detail=f"노드 일괄 저장 실패: {str(e)}")
+    
+    # WireGuard 서버에 피어 일괄 추가 (기존 피어 유지)
+    try:
+        summary = await async_wg_manager.add_peers_to_server([
+            {"node_id": n.node_id, "public_key": n.public_key, "vpn_ip": n.vpn_ip} for n in db_nodes
+        ])
+    except Exception as e:
+        # 실패 시 DB에서 제거 (다음 reconcile에서 남은 피어 정리)
+        await async_wg_manager.release_ips(db, vpn_ips)
+        for db_node in db_nodes:
+            await db.delete(db_node)
+        await db.commit()
+        raise HTTPException(status_code=wg_error_status(e), detail=f"WireGuard 피어 일괄 추가 실패: {str(e)}")
+    
+    logger.info(f"노드 {len(db_nodes)}개 일괄 등록 ({summary.get('elapsed_seconds')}s WireGuard 적용)")
+    return NodeBatchResponse(
+        registered=len(db_nodes),
+        nodes=[
+            NodeResponse(
+                node_id=n.node_id,
+                vpn_ip=n.vpn_ip,
+                config=base64.b64encode(n.config.encode()).decode(),
+                public_key=n.public_key,
+                server_public_key=server_public_key,
+                server_endpoint=server_endpoint
+            )
+            for n in db_nodes
+        ],
+        wireguard={
+            key: value for key, value in summary.items() if key != "results"
+        } | {"failures": [r for r in summary.get("results", []) if r.get("status") == "failed"]}
     )
 
 @app.delete("/nodes/{node_id}")
 async def unregister_node(
     node_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     token: str = Depends(verify_token)
 ):
     """노드 등록 해제"""
     
-    node = db.query(Node).filter(Node.node_id == node_id).first()
+    node = await db.get(Node, node_id)
     if not node:
         raise HTTPException(status_code=404, detail="노드를 찾을 수 없습니다")
     
     # WireGuard 서버에서 피어 제거
     try:
-        wg_manager.remove_peer_from_server(node.public_key)
+        await async_wg_manager.remove_peer_from_server(node.public_key)
     except Exception as e:
         print(f"[WARNING] 피어 제거 실패: {e}")
     
-    # DB에서 제거
-    db.delete(node)
-    db.commit()
+    # DB에서 제거 (IP 반환)
+    await async_wg_manager.release_ip(db, node.vpn_ip)
+    await db.delete(node)
+    await db.commit()
+    health_history.forget(node_id)
     
     return {"message": f"노드 {node_id}가 성공적으로 제거되었습니다"}
 
 @app.get("/nodes", response_model=List[NodeStatus])
 async def list_nodes(
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    node_type: Optional[str] = None,
+    description_prefix: Optional[str] = None,
+    updated_since: Optional[datetime] = None,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
     token: str = Depends(verify_token)
 ):
-    """등록된 모든 노드 목록 조회"""
+    """
+    등록된 노드 목록 조회
+    limit/cursor로 keyset 페이지네이션 (다음 페이지 커서는 X-Next-Cursor 헤더), fields로 필드 선택
+    limit과 cursor를 모두 생략하면 전체 목록을 반환합니다.
+    """
+    try:
+        selected = parse_fields(fields, NodeStatus.model_fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    # 런타임 필드가 필요한 경우에만 스냅샷 사용 (모든 노드가 dump 1회를 공유, TTL 안이면 캐시)
+    snapshot = None
+    runtime = selected is None or bool(selected & RUNTIME_FIELDS)
+    generation = "-"
+    if runtime:
+        generation = wg_snapshot.known_generation()
+        if generation is None:
+            snapshot = await wg_snapshot.aget()
+            generation = snapshot.generation
+    
+    # 노드 리비전 + 마지막 스냅샷 generation이 같으면 DB 조회와 dump 없이 304
+    # (rx/tx 등 카운터는 generation에 포함되지 않으므로 304 동안 갱신되지 않음.
+    #  fleet_revision은 프로세스별이므로 uvicorn 워커가 여러 개면 다른 워커의 변경을 반영하지 못함)
+    etag = make_etag(fleet_revision.revision, generation, query_digest(request))
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    if runtime and snapshot is None:
+        snapshot = await wg_snapshot.aget()
+        etag = make_etag(fleet_revision.revision, snapshot.generation, query_digest(request))
     
-    nodes = db.query(Node).all()
-    node_statuses = []
+    try:
+        nodes, next_cursor = await fetch_node_page(
+            db, fields=selected, limit=limit, cursor=cursor, status=status, node_type=node_type,
+            description_prefix=description_prefix, updated_since=updated_since
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
+    node_statuses = []
     for node in nodes:
-        # WireGuard 피어 상태 조회
-        peer_status = wg_manager.get_peer_status(node.public_key)
-        
-        node_statuses.append(NodeStatus(
-            node_id=node.node_id,
-            node_type=node.node_type,
-            hostname=node.hostname,
-            public_ip=node.public_ip,
-            vpn_ip=node.vpn_ip,
-            status=node.status,
-            connected=peer_status.get('connected', False),
-            last_handshake=peer_status.get('last_handshake'),
-            bytes_sent=peer_status.get('bytes_sent', 0),
-            bytes_received=peer_status.get('bytes_received', 0),
-            created_at=node.created_at,
-            updated_at=node.updated_at
-        ))
-    
+        values = {name: getattr(node, name) for name in NodeStatus.model_fields
+                  if name in NODE_COLUMNS and (selected is None or name in selected)}
+        if snapshot is not None:
+            # WireGuard 피어 상태 조회
+            peer_status = snapshot.peer_status(node.public_key)
+            values.update(
+                connected=peer_status.get('connected', False),
+                last_handshake=peer_status.get('last_handshake'),
+                bytes_sent=peer_status.get('bytes_sent', 0),
+                bytes_received=peer_status.get('bytes_received', 0)
+            )
+        node_statuses.append(project(values, selected))
+    
+    headers = cache_headers(etag)
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    if selected is not None:
+        # 일부 필드만 요청된 경우 NodeStatus 필수 필드 검증을 건너뜀
+        return JSONResponse(content=jsonable_encoder(node_statuses), headers=headers)
+    response.headers.update(headers)
     return node_statuses
 
 @app.get("/nodes/{node_id}")
 async def get_node(
     node_id: str,
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
     token: str = Depends(verify_token)
 ):
-    """특정 노드 정보 조회"""
-    
-    node = db.query(Node).filter(Node.node_id == node_id).first()
+    """특정 노드 정보 조회 (If-None-Match 지원)"""
+    
+    # list_nodes와 같이 마지막 스냅샷 generation으로 먼저 비교 (dump 없이 304)
+    generation = wg_snapshot.known_generation()
+    if generation is not None:
+        cached = not_modified(request, make_etag(fleet_revision.node_revision(node_id), generation))
+        if cached:
+            return cached
+    
+    snapshot = await wg_snapshot.aget()
+    etag = make_etag(fleet_revision.node_revision(node_id), snapshot.generation)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    
+    node = await db.get(Node, node_id)
     if not node:
         raise HTTPException(status_code=404, detail="노드를 찾을 수 없습니다")
     
-    peer_status = wg_manager.get_peer_status(node.public_key)
+    peer_status = snapshot.peer_status(node.public_key)
+    response.headers.update(cache_headers(etag))
     
     return NodeStatus(
         node_id=node.node_id,
@@ -293,18 +537,18 @@ async def get_node(
 @app.post("/api/nodes/{node_id}/sync")
 async def sync_node_to_server(
     node_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     token: str = Depends(verify_token)
 ):
     """특정 노드를 WireGuard 서버에 동기화"""
     
-    node = db.query(Node).filter(Node.node_id == node_id).first()
+    node = await db.get(Node, node_id)
     if not node:
         raise HTTPException(status_code=404, detail="노드를 찾을 수 없습니다")
     
     try:
         # WireGuard 서버에 피어 추가
-        wg_manager.add_peer_to_server(
+        await async_wg_manager.add_peer_to_server(
             public_key=node.public_key,
             vpn_ip=node.vpn_ip,
             node_id=node.node_id
@@ -313,7 +557,7 @@ async def sync_node_to_server(
         # 상태 업데이트
         node.status = "synced"
         node.updated_at = datetime.utcnow()
-        db.commit()
+        await db.commit()
         
         return {
             "message": f"노드 {node_id}가 서버에 동기화되었습니다",
@@ -325,70 +569,72 @@ async def sync_node_to_server(
 
 @app.post("/api/nodes/sync-all")
 async def sync_all_nodes_to_server(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     token: str = Depends(verify_token)
 ):
-    """모든 노드를 WireGuard 서버에 동기화"""
+    """모든 노드를 WireGuard 서버에 동기화 (설정 1회 기록 + syncconf 1회)"""
+    
+    # reconciler와 같은 기준 (비활성화된 노드는 다시 추가하지 않음)
+    rows = (await db.execute(desired_peer_query())).all()
+    result = await async_wg_manager.apply_peers(peer_nodes(rows), prune=False)
+    
+    synced_ids = [r["node_id"] for r in result["results"] if r["status"] == "synced"]
+    if synced_ids:
+        # 적용 중 비활성화된 노드의 상태는 덮어쓰지 않음
+        await db.execute(
+            update(Node)
+            .where(Node.node_id.in_(synced_ids), Node.status != "deactivated")
+            .values(status="synced", updated_at=func.now())
+        )
     
-    nodes = db.query(Node).all()
-    synced_count = 0
-    failed_nodes = []
+    await db.commit()
     
-    for node in nodes:
-        try:
-            # WireGuard 서버에 피어 추가
-            wg_manager.add_peer_to_server(
-                public_key=node.public_key,
-                vpn_ip=node.vpn_ip,
-                node_id=node.node_id
-            )
-            
-            # 상태 업데이트
-            node.status = "synced"
-            node.updated_at = datetime.utcnow()
-            synced_count += 1
-            
-        except Exception as e:
-            failed_nodes.append({
-                "node_id": node.node_id,
-                "vpn_ip": node.vpn_ip,
-                "error": str(e)
-            })
-            logger.error(f"노드 {node.node_id} 동기화 실패: {e}")
-    
-    db.commit()
+    failed_nodes = [
+        {"node_id": r["node_id"], "vpn_ip": r["vpn_ip"], "error": r.get("error")}
+        for r in result["results"] if r["status"] == "failed"
+    ]
+    for failed in failed_nodes:
+        logger.error(f"노드 {failed['node_id']} 동기화 실패: {failed['error']}")
     
     return {
-        "message": f"동기화 완료: {synced_count}개 성공",
-        "synced": synced_count,
+        "message": f"동기화 완료: {result['synced']}개 성공",
+        "synced": result["synced"],
         "failed": len(failed_nodes),
-        "failed_nodes": failed_nodes
+        "skipped": result["skipped"],
+        "failed_nodes": failed_nodes,
+        "results": result["results"],
+        "elapsed_seconds": result["elapsed_seconds"]
     }
 
 @app.post("/api/nodes/refresh-configs")
 async def refresh_all_node_configs(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     token: str = Depends(verify_token)
 ):
     """모든 노드의 설정 파일을 재생성 (올바른 서버 IP로 업데이트)"""
     
-    nodes = db.query(Node).all()
+    started = time.monotonic()
+    # 서버 공개키/엔드포인트를 한 번 다시 조회한 뒤 모든 노드에 재사용
+    identity = await asyncio.to_thread(server_identity.refresh)
+    nodes = (await db.scalars(select(Node))).all()
     updated_count = 0
     failed_nodes = []
+    results = []
     
     for node in nodes:
         try:
             # 새 설정 파일 생성 (올바른 endpoint로)
-            new_config = wg_manager.generate_client_config(
+            new_config = await async_wg_manager.generate_client_config(
                 private_key=node.private_key,
                 client_ip=node.vpn_ip,
-                server_public_key=wg_manager.get_server_public_key()
+                server_public_key=identity.public_key
             )
             
             # DB 업데이트
             node.config = new_config
             node.updated_at = datetime.utcnow()
             updated_count += 1
+            results.append({"node_id": node.node_id, "vpn_ip": node.vpn_ip, "status": "updated"})
             
         except Exception as e:
             failed_nodes.append({
@@ -396,21 +642,24 @@ async def refresh_all_node_configs(
                 "vpn_ip": node.vpn_ip,
                 "error": str(e)
             })
+            results.append({"node_id": node.node_id, "vpn_ip": node.vpn_ip, "status": "failed", "error": str(e)})
             logger.error(f"노드 {node.node_id} 설정 업데이트 실패: {e}")
     
-    db.commit()
+    await db.commit()
     
     return {
         "message": f"설정 업데이트 완료: {updated_count}개 성공",
         "updated": updated_count,
         "failed": len(failed_nodes),
-        "failed_nodes": failed_nodes
+        "failed_nodes": failed_nodes,
+        "results": results,
+        "elapsed_seconds": round(time.monotonic() - started, 3)
     }
 
 @app.post("/api/nodes/test-single")
 async def test_single_node_connectivity(
     request: dict,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     token: str = Depends(verify_token)
 ):
     """Test connectivity to a single node from server"""
@@ -421,46 +670,41 @@ async def test_single_node_connectivity(
         raise HTTPException(status_code=400, detail="VPN IP required")
     
     try:
-        import subprocess
-        
         logger.info(f"Testing connectivity to {vpn_ip} for node {node_id}")
         
-        # First, try to ping from WireGuard container
-        wg_result = subprocess.run(
-            ["docker", "exec", "wireguard-server", "ping", "-c", "1", "-W", "2", vpn_ip],
-            capture_output=True,
-            text=True
-        )
-        
-        logger.info(f"WireGuard ping result: returncode={wg_result.returncode}, stdout={wg_result.stdout[:100]}, stderr={wg_result.stderr[:100]}")
-        
-        # If WireGuard container can't reach, try from API container
-        if wg_result.returncode != 0:
-            api_result = subprocess.run(
-                ["ping", "-c", "1", "-W", "2", vpn_ip],
-                capture_output=True,
-                text=True
-            )
-            reachable = api_result.returncode == 0
-            details = api_result.stdout if reachable else api_result.stderr
-            logger.info(f"API ping result: reachable={reachable}")
-        else:
-            reachable = True
-            details = wg_result.stdout
+        # 프로세스 내 ICMP 프로버로 3회 측정 (소켓을 쓸 수 없으면 WireGuard 컨테이너의 ping으로 대체)
+        circuit_open = False
+        try:
+            probe = await icmp_prober.probe(vpn_ip, count=PING_COUNT, timeout=2)
+        except CircuitOpenError as e:
+            circuit_open = True
+            probe = probe_summary(vpn_ip, [None] * PING_COUNT, icmp_prober.method, error=str(e))
+        reachable = probe["reachable"]
+        details = f"{probe['received']}/{probe['sent']} received via {probe['method']}"
+        if probe["rtt_avg_ms"] is not None:
+            details += f", rtt min/avg/max = {probe['rtt_min_ms']}/{probe['rtt_avg_ms']}/{probe['rtt_max_ms']} ms"
+        if probe["error"]:
+            details += f" ({probe['error']})"
+        logger.info(f"Probe result for {vpn_ip}: {details}")
         
-        # Update node status if we have node_id
-        if node_id and reachable:
-            node = db.query(Node).filter(Node.node_id == node_id).first()
-            if node:
-                node.status = "connected"
-                node.updated_at = datetime.utcnow()
-                db.commit()
+        # Update node status through the same hysteresis as the health monitor
+        # (a container outage says nothing about the node, so it is not recorded)
+        node_status = None
+        if node_id and not circuit_open:
+            old_status = await db.scalar(select(Node.status).where(Node.node_id == node_id))
+            if old_status is not None:
+                batch = HealthWriteBatch()
+                node_status = connection_manager.apply_probe(node_id, old_status, reachable, batch)["new_status"]
+                await flush_health_batch(db, batch)
         
         return {
             "reachable": reachable,
             "vpn_ip": vpn_ip,
             "message": "Connected" if reachable else "Unreachable",
-            "details": details
+            "details": details,
+            "loss": probe["loss"],
+            "rtt_ms": probe["rtt_avg_ms"],
+            "node_status": node_status
         }
         
     except Exception as e:
@@ -474,24 +718,24 @@ async def test_single_node_connectivity(
 @app.get("/api/nodes/{node_id}/download-config")
 async def download_node_config(
     node_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     token: str = Depends(verify_token)
 ):
     """특정 노드의 WireGuard 설정 파일 다운로드"""
     
-    node = db.query(Node).filter(Node.node_id == node_id).first()
+    node = await db.get(Node, node_id)
     if not node:
         raise HTTPException(status_code=404, detail="노드를 찾을 수 없습니다")
     
     # 설정이 없거나 "auto"가 포함된 경우 재생성
     if not node.config or "auto:41820" in node.config:
-        node.config = wg_manager.generate_client_config(
+        node.config = await async_wg_manager.generate_client_config(
             private_key=node.private_key,
             client_ip=node.vpn_ip,
-            server_public_key=wg_manager.get_server_public_key()
+            server_public_key=await async_wg_manager.get_server_public_key()
         )
         node.updated_at = datetime.utcnow()
-        db.commit()
+        await db.commit()
     
     return Response(
         content=node.config,
@@ -505,12 +749,12 @@ async def download_node_config(
 async def update_node_status(
     node_id: str,
     status_update: dict,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     token: str = Depends(verify_token)
 ):
     """노드 상태 업데이트"""
     
-    node = db.query(Node).filter(Node.node_id == node_id).first()
+    node = await db.get(Node, node_id)
     if not node:
         raise HTTPException(status_code=404, detail="노드를 찾을 수 없습니다")
     
@@ -519,51 +763,60 @@ async def update_node_status(
         node.status = status_update['status']
         node.updated_at = datetime.utcnow()
     
-    db.commit()
-    db.refresh(node)
+    await db.commit()
+    await db.refresh(node)
     
     return {"message": "Node status updated", "status": node.status}
 
 @app.get("/nodes/{node_id}/config")
 async def get_node_config(
     node_id: str,
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
     token: str = Depends(verify_token)
 ):
-    """노드의 WireGuard 설정 파일 조회"""
+    """노드의 WireGuard 설정 파일 조회 (If-None-Match 지원)"""
+    
+    server_endpoint = await async_wg_manager.get_server_endpoint()
+    etag = make_etag(fleet_revision.node_revision(node_id), server_endpoint)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
     
-    node = db.query(Node).filter(Node.node_id == node_id).first()
+    node = await db.get(Node, node_id)
     if not node:
         raise HTTPException(status_code=404, detail="노드를 찾을 수 없습니다")
     
+    response.headers.update(cache_headers(etag))
     return {
         "node_id": node.node_id,
         "config": base64.b64encode(node.config.encode()).decode(),
         "vpn_ip": node.vpn_ip,
-        "server_endpoint": f"{os.getenv('SERVERURL', 'localhost')}:41820"
+        "server_endpoint": server_endpoint
     }
 
 @app.post("/nodes/{node_id}/regenerate-keys")
 async def regenerate_node_keys(
     node_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     token: str = Depends(verify_token)
 ):
     """노드의 WireGuard 키 재생성"""
     
-    node = db.query(Node).filter(Node.node_id == node_id).first()
+    node = await db.get(Node, node_id)
     if not node:
         raise HTTPException(status_code=404, detail="노드를 찾을 수 없습니다")
     
     # 기존 피어 제거
     try:
-        wg_manager.remove_peer_from_server(node.public_key)
+        await async_wg_manager.remove_peer_from_server(node.public_key)
     except Exception as e:
         print(f"[WARNING] 기존 피어 제거 실패: {e}")
     
     # 새 키 생성
     keys = wg_manager.generate_keypair()
-    config = wg_manager.create_peer_config(
+    config = await async_wg_manager.create_peer_config(
         node_id=node.node_id,
         vpn_ip=node.vpn_ip,
         private_key=keys['private_key'],
@@ -576,11 +829,11 @@ async def regenerate_node_keys(
     node.config = config
     node.updated_at = datetime.utcnow()
     
-    db.commit()
+    await db.commit()
     
     # 새 피어 추가
     try:
-        wg_manager.add_peer_to_server(
+        await async_wg_manager.add_peer_to_server(
             public_key=keys['public_key'],
             vpn_ip=node.vpn_ip,
             node_id=node.node_id
@@ -599,7 +852,7 @@ async def get_wireguard_status(token: str = Depends(verify_token)):
     """WireGuard 서버 상태 조회"""
     
     try:
-        status = wg_manager.get_server_status()
+        status = await async_wg_manager.get_server_status()
         return status
     except Exception as e:
         return {
@@ -614,7 +867,7 @@ async def get_wireguard_api_status(token: str = Depends(verify_token)):
     """WireGuard 서버 상태 API (웹 대시보드용)"""
     
     try:
-        status = wg_manager.get_server_status()
+        status = await async_wg_manager.get_server_status()
         return status
     except Exception as e:
         return {
@@ -628,17 +881,49 @@ async def get_wireguard_api_status(token: str = Depends(verify_token)):
 async def fix_allowed_ips(token: str = Depends(verify_token)):
     """기존 피어들의 AllowedIPs를 /16에서 /32로 수정"""
     try:
-        result = wg_manager.fix_peer_allowed_ips()
+        result = await async_wg_manager.fix_peer_allowed_ips()
         return result
     except Exception as e:
         logger.error(f"Error fixing AllowedIPs: {e}")
         return {"error": str(e), "fixed": 0}
 
+@app.post("/api/wireguard/reconcile")
+async def reconcile_wireguard(
+    dry_run: bool = False,
+    token: str = Depends(verify_token)
+):
+    """DB 기준으로 WireGuard 설정/런타임의 차이만 적용 (dry_run=true면 차이만 반환)"""
+    try:
+        # reconcile은 스레드에서 동기 세션을 직접 열어 사용
+        return await async_wg_manager.run(peer_reconciler.run_once, dry_run=dry_run, on_demand=True)
+    except Exception as e:
+        logger.error(f"Error reconciling WireGuard peers: {e}")
+        raise HTTPException(status_code=500, detail=f"Reconcile 실패: {str(e)}")
+
+@app.get("/api/wireguard/reconcile")
+async def get_reconcile_status(token: str = Depends(verify_token)):
+    """마지막 reconcile 결과 조회"""
+    return {
+        "interval_seconds": peer_reconciler.interval,
+        "running": peer_reconciler.running,
+        "last_run": peer_reconciler.last_run
+    }
+
+@app.get("/api/wireguard/identity")
+async def get_server_identity(token: str = Depends(verify_token)):
+    """캐시된 서버 공개키/리슨 포트/엔드포인트 조회"""
+    return (await async_wg_manager.identity()).to_dict()
+
+@app.post("/api/wireguard/identity/refresh")
+async def refresh_server_identity(token: str = Depends(verify_token)):
+    """서버 공개키/엔드포인트 강제 재조회 (키 교체 또는 SERVERURL 변경 후)"""
+    return (await asyncio.to_thread(server_identity.refresh)).to_dict()
+
 # API 엔드포인트 추가
 @app.post("/api/generate-config/{token}")
 async def generate_config_for_token(
     token: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """토큰 기반 VPN 설정 생성"""
     from models import QRToken
@@ -646,7 +931,7 @@ async def generate_config_for_token(
     logger.info(f"generate-config called with token: {token}")
     
     # 먼저 DB에서 토큰 조회
-    db_token = db.query(QRToken).filter(QRToken.token == token).first()
+    db_token = await db.get(QRToken, token)
     
     if db_token:
         logger.info(f"Token found in DB: node_id={db_token.node_id}, type={db_token.node_type}")
@@ -664,7 +949,7 @@ async def generate_config_for_token(
         
         # 토큰을 사용됨으로 표시
         db_token.used = True
-        db.commit()
+        await db.commit()
         
     # DB에 없으면 메모리 캐시 확인 (fallback)
     elif token in token_store:
@@ -685,7 +970,7 @@ async def generate_config_for_token(
         node_type = "worker"
     
     # 기존 노드 확인
-    existing_node = db.query(Node).filter(Node.node_id == node_id).first()
+    existing_node = await db.get(Node, node_id)
     if existing_node:
         return {
             "config": base64.b64encode(existing_node.config.encode()).decode(),
@@ -701,19 +986,21 @@ async def generate_config_for_token(
         public_ip="0.0.0.0"  # 자동 감지
     )
     
-    # IP 할당
-    vpn_ip = wg_manager.allocate_ip(node_data.node_type)
-    if not vpn_ip:
-        raise HTTPException(status_code=500, detail="VPN IP 할당 실패")
-    
     # 키 생성
     keys = wg_manager.generate_keypair()
+    server_public_key = await async_wg_manager.get_server_public_key()
+    
+    # IP 할당 (풀 잠금은 노드 저장 커밋까지 유지)
+    vpn_ip = await async_wg_manager.allocate_ip(db, node_data.node_type)
+    if not vpn_ip:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail="VPN IP 할당 실패")
     
     # 설정 파일 생성
-    config = wg_manager.generate_client_config(
+    config = await async_wg_manager.generate_client_config(
         private_key=keys['private_key'],
         client_ip=vpn_ip,
-        server_public_key=wg_manager.get_server_public_key()
+        server_public_key=server_public_key
     )
     
     # DB 저장
@@ -732,18 +1019,19 @@ async def generate_config_for_token(
     )
     
     db.add(db_node)
-    db.commit()
+    await db.commit()
     
     # WireGuard 피어 추가
     try:
-        wg_manager.add_peer_to_server(
+        await async_wg_manager.add_peer_to_server(
             public_key=keys['public_key'],
             vpn_ip=vpn_ip,
             node_id=node_id
         )
     except Exception as e:
-        db.delete(db_node)
-        db.commit()
+        await async_wg_manager.release_ip(db, vpn_ip)
+        await db.delete(db_node)
+        await db.commit()
         raise HTTPException(status_code=500, detail=f"피어 추가 실패: {str(e)}")
     
     return {
@@ -807,6 +1095,7 @@ echo "이제 설정 파일을 다운로드하세요."
     )
 
 # 웹 기반 설치 라우터 추가
+# 라우트는 첫 요청 전에 등록되어야 하므로 라우터 모듈은 시작 시 import (무거운 qrcode/PIL은 각 모듈에서 지연 import)
 # from web_installer import router as web_installer_router
 # from test_installer import router as test_installer_router
 from vpn_status import router as vpn_status_router
@@ -815,8 +1104,6 @@ from node_manager import router as node_manager_router
 from worker_integration import router as worker_integration_router
 from central_docker_setup import router as central_docker_setup_router  # Central server Docker setup without VPN
 # from central_integration import router as central_integration_router  # Archived - central servers don't use VPN
-from background_health_monitor import health_monitor
-import asyncio
 
 # app.include_router(web_installer_router, tags=["Web Installer"])
 # app.include_router(test_installer_router, tags=["Test Installer"])
@@ -867,12 +1154,18 @@ async def get_worker_docker_compose_host_mode(worker_id: str = "worker"):
 
 # Worker node config file endpoint
 @app.get("/api/worker-config/{node_id}")
-async def get_worker_config_file(node_id: str, db: Session = Depends(get_db)):
-    """워커노드 WireGuard 설정 파일 직접 다운로드"""
+async def get_worker_config_file(node_id: str, request: Request, db: AsyncSession = Depends(get_async_db)):
+    """워커노드 WireGuard 설정 파일 직접 다운로드 (If-None-Match 지원)"""
     from models import Node
     
+    # 설정이 바뀌지 않았으면 DB 조회 없이 304
+    etag = make_etag(fleet_revision.node_revision(node_id))
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    
     # 노드 정보 조회
-    node = db.query(Node).filter(Node.node_id == node_id).first()
+    node = await db.get(Node, node_id)
     
     if not node:
         # 더 자세한 오류 메시지
@@ -892,7 +1185,8 @@ async def get_worker_config_file(node_id: str, db: Session = Depends(get_db)):
         content=node.config,
         media_type="text/plain",
         headers={
-            "Content-Disposition": f"attachment; filename={node_id}.conf"
+            "Content-Disposition": f"attachment; filename={node_id}.conf",
+            **cache_headers(etag)
         }
     )
 
@@ -908,11 +1202,11 @@ if os.path.exists(web_dashboard_path):
 async def download_docker_runner(
     node_id: str,
     os_type: str = "windows",  # OS 타입 파라미터 추가 (기본값: windows)
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """워커노드용 Docker Runner 다운로드 (OS별 분기)"""
     # 노드 조회
-    node = db.query(Node).filter(Node.node_id == node_id).first()
+    node = await db.get(Node, node_id)
     if not node:
         raise HTTPException(status_code=404, detail="Node not found")
     
@@ -940,12 +1234,12 @@ async def download_docker_runner(
 @app.get("/api/download/{node_id}/vpn-installer")
 async def download_vpn_installer(
     node_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     token: str = Depends(verify_token)
 ):
     """워커노드용 VPN 설치 스크립트 다운로드"""
     # 노드 조회
-    node = db.query(Node).filter(Node.node_id == node_id).first()
+    node = await db.get(Node, node_id)
     if not node:
         raise HTTPException(status_code=404, detail="Node not found")
     
@@ -973,50 +1267,20 @@ async def root():
 
 @app.on_event("startup")
 async def startup_event():
-    """Start background health monitor on API startup"""
-    logger.info("Background health monitor disabled for debugging")
-    # asyncio.create_task(health_monitor.start())
-    
-    # WireGuard 서버 설정 확인 및 수정
-    try:
-        logger.info("Checking WireGuard server configuration...")
-        wg_manager._ensure_server_subnet()
-        logger.info("WireGuard server configuration checked")
-    except Exception as e:
-        logger.error(f"Failed to check WireGuard config: {e}")
-    
-    # 서버 재시작 시 모든 노드 자동 동기화
-    try:
-        logger.info("Auto-syncing all nodes after server restart...")
-        db = SessionLocal()
-        try:
-            nodes = db.query(Node).all()
-            synced_count = 0
-            
-            for node in nodes:
-                try:
-                    # 각 노드를 WireGuard 서버에 추가
-                    wg_manager.add_peer_to_server(
-                        public_key=node.public_key,
-                        vpn_ip=node.vpn_ip,
-                        node_id=node.node_id
-                    )
-                    synced_count += 1
-                    logger.info(f"Synced node {node.node_id} ({node.vpn_ip})")
-                except Exception as e:
-                    logger.warning(f"Failed to sync node {node.node_id}: {e}")
-            
-            logger.info(f"Auto-sync completed: {synced_count}/{len(nodes)} nodes synced")
-        finally:
-            db.close()
-    except Exception as e:
-        logger.error(f"Failed to auto-sync nodes: {e}")
+    """DB 대기/스키마 생성/WireGuard 동기화를 백그라운드로 시작 (연결은 즉시 받음, /health/ready 참조)"""
+    # 헬스 모니터는 DB 준비 후 app_startup이 시작 (HEALTH_MONITOR_ENABLED)
+    app_startup.start()
+    app.state.loop_lag_task = asyncio.create_task(monitor_event_loop_lag())
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Stop background health monitor on API shutdown"""
     logger.info("Stopping background health monitor...")
+    app_startup.stop()
+    app.state.loop_lag_task.cancel()
     await health_monitor.stop()
+    peer_reconciler.stop()
+    icmp_prober.close()
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,341 @@
+"""
+Prometheus 메트릭 (/metrics)
+핫 경로에서는 히스토그램/카운터 관측(수 µs)만 하고, IP 풀 사용률과 handshake 나이별 피어 수 같은
+집계 값은 스크랩 시점에 이미 메모리에 있는 상태(비트맵, 캐시된 dump 스냅샷)에서 계산합니다.
+"""
+
+import time
+import asyncio
+import inspect
+import functools
+import logging
+from typing import Dict, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily, REGISTRY
+from sqlalchemy import event
+
+from tracing import add_span
+
+logger = logging.getLogger(__name__)
+
+# 버킷 (초): HTTP/DB는 ms 단위, WireGuard 제어 호출과 헬스체크는 서브프로세스/ping 단위
+FAST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SLOW_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# handshake 나이 구간 (초, 상한). WireGuard는 활성 세션을 2분마다 재협상
+HANDSHAKE_AGE_BUCKETS = (("lt_2m", 120), ("lt_5m", 300), ("lt_1h", 3600), ("lt_1d", 86400))
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "vpn_http_request_duration_seconds",
+    "HTTP 요청 처리 시간 (응답 헤더 전송까지, 라우트 템플릿별)",
+    ["method", "route", "status"],
+    buckets=FAST_BUCKETS
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "vpn_http_requests_in_progress",
+    "처리 중인 HTTP 요청 수"
+)
+WG_CALL_SECONDS = Histogram(
+    "vpn_wireguard_call_duration_seconds",
+    "WireGuard 제어 호출 시간 (backend: docker=docker exec, local, native=UAPI/netlink, fake)",
+    ["backend", "op"],
+    buckets=SLOW_BUCKETS
+)
+WG_CALL_ERRORS = Counter(
+    "vpn_wireguard_call_errors_total",
+    "실패한 WireGuard 제어 호출 수 (예외 또는 실패 반환)",
+    ["backend", "op"]
+)
+DB_QUERY_SECONDS = Histogram(
+    "vpn_db_query_duration_seconds",
+    "DB 문 실행 시간 (문 종류별)",
+    ["statement"],
+    buckets=FAST_BUCKETS
+)
+DB_CONNECTION_HOLD_SECONDS = Histogram(
+    "vpn_db_connection_hold_seconds",
+    "풀 연결 대여 시간 (세션/트랜잭션 길이)",
+    buckets=FAST_BUCKETS
+)
+DB_CONNECTIONS_CHECKED_OUT = Gauge(
+    "vpn_db_connections_checked_out",
+    "현재 대여 중인 풀 연결 수"
+)
+HEALTH_CHECK_SECONDS = Histogram(
+    "vpn_health_check_duration_seconds",
+    "헬스체크 시간 (kind: node=노드 1개 ping, liveness=dump 기반 판정, write=결과 일괄 저장, batch=일괄, cycle=모니터 배치 1회)",
+    ["kind", "result"],
+    buckets=SLOW_BUCKETS
+)
+HEALTH_OVERDUE_NODES = Gauge(
+    "vpn_health_overdue_nodes",
+    "검사 예정 시각이 지났지만 초당 검사 예산 때문에 대기 중인 노드 수"
+)
+BACKGROUND_TASK_SECONDS = Histogram(
+    "vpn_background_task_duration_seconds",
+    "백그라운드 주기 작업 1회 실행 시간",
+    ["task"],
+    buckets=SLOW_BUCKETS
+)
+BACKGROUND_TASK_LAG = Gauge(
+    "vpn_background_task_lag_seconds",
+    "백그라운드 주기 작업이 예정 시각보다 늦게 시작한 시간 (마지막 실행)",
+    ["task"]
+)
+BACKGROUND_TASK_LAST_RUN = Gauge(
+    "vpn_background_task_last_run_timestamp_seconds",
+    "백그라운드 주기 작업 마지막 실행 완료 시각",
+    ["task"]
+)
+EVENT_LOOP_LAG = Histogram(
+    "vpn_event_loop_lag_seconds",
+    "이벤트 루프 지연 (예정된 깨어남 대비 늦은 시간, 블로킹 호출 감지용)",
+    buckets=FAST_BUCKETS
+)
+
+# 이벤트 루프 지연 측정 주기 (초)
+LOOP_LAG_INTERVAL = 1.0
+
+
+# --- HTTP ---
+class MetricsMiddleware:
+    """
+    요청 시간 측정 ASGI 미들웨어 (BaseHTTPMiddleware와 달리 응답 본문을 감싸지 않음)
+    SSE처럼 오래 열린 응답이 히스토그램을 왜곡하지 않도록 응답 시작(헤더 전송)까지만 측정합니다.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        observed = False
+
+        def observe(status: int):
+            nonlocal observed
+            observed = True
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.labels(
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                str(status)
+            ).observe(time.perf_counter() - started)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and not observed:
+                observe(message["status"])
+            await send(message)
+
+        HTTP_REQUESTS_IN_PROGRESS.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception:
+            if not observed:
+                observe(500)
+            raise
+        finally:
+            HTTP_REQUESTS_IN_PROGRESS.dec()
+
+
+def render() -> bytes:
+    return generate_latest(REGISTRY)
+
+
+# --- WireGuard 제어 호출 ---
+def _failed(result) -> bool:
+    # 백엔드는 실패를 False/None/"failed" 또는 {cidr: "failed"} 로 반환
+    if result is False or result is None:
+        return True
+    if result == "failed":
+        return True
+    if isinstance(result, dict):
+        return any(value == "failed" for value in result.values())
+    return False
+
+
+def instrument_wg_call(op: str):
+    """백엔드 메서드 데코레이터: 호출 시간과 실패 수 기록 (동기/비동기 모두)"""
+
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(self, *args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    result = await func(self, *args, **kwargs)
+                except Exception:
+                    WG_CALL_ERRORS.labels(self.name, op).inc()
+                    raise
+                finally:
+                    elapsed = time.perf_counter() - started
+                    WG_CALL_SECONDS.labels(self.name, op).observe(elapsed)
+                    add_span(f"wg.{op}", elapsed)
+                if _failed(result):
+                    WG_CALL_ERRORS.labels(self.name, op).inc()
+                return result
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = func(self, *args, **kwargs)
+            except Exception:
+                WG_CALL_ERRORS.labels(self.name, op).inc()
+                raise
+            finally:
+                elapsed = time.perf_counter() - started
+                WG_CALL_SECONDS.labels(self.name, op).observe(elapsed)
+                add_span(f"wg.{op}", elapsed)
+            if _failed(result):
+                WG_CALL_ERRORS.labels(self.name, op).inc()
+            return result
+        return wrapper
+
+    return decorator
+
+
+# --- DB ---
+def _statement_kind(statement: str) -> str:
+    head = statement.lstrip()[:12].split(None, 1)
+    kind = head[0].lower() if head else ""
+    return kind if kind in ("select", "insert", "update", "delete", "with") else "other"
+
+
+def instrument_engine(engine):
+    """동기 Engine(AsyncEngine은 .sync_engine)에 문 실행 시간/연결 대여 이벤트 등록"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["metrics_query_started"].pop()
+        DB_QUERY_SECONDS.labels(_statement_kind(statement)).observe(elapsed)
+        add_span("db", elapsed)
+
+    @event.listens_for(engine, "handle_error")
+    def _on_error(context):
+        stack = context.connection.info.get("metrics_query_started") if context.connection is not None else None
+        if stack:
+            stack.pop()
+
+    @event.listens_for(engine.pool, "checkout")
+    def _checkout(dbapi_connection, connection_record, connection_proxy):
+        connection_record.info["metrics_checked_out"] = time.perf_counter()
+        DB_CONNECTIONS_CHECKED_OUT.inc()
+
+    @event.listens_for(engine.pool, "checkin")
+    def _checkin(dbapi_connection, connection_record):
+        started = connection_record.info.pop("metrics_checked_out", None)
+        if started is not None:
+            DB_CONNECTION_HOLD_SECONDS.observe(time.perf_counter() - started)
+            DB_CONNECTIONS_CHECKED_OUT.dec()
+
+
+# --- 백그라운드 작업 ---
+class TaskTimer:
+    """
+    주기 작업 1회 측정: 예정 시각 대비 시작 지연과 실행 시간
+    (루프에서 `with task_timer.run():` 후 `task_timer.schedule(interval)` 로 다음 예정 시각 지정)
+    """
+
+    def __init__(self, task: str):
+        self.task = task
+        self._due: Optional[float] = None
+
+    def schedule(self, delay: float):
+        self._due = time.monotonic() + delay
+
+    def run(self):
+        return _TaskRun(self)
+
+
+class _TaskRun:
+    def __init__(self, timer: TaskTimer):
+        self.timer = timer
+        self.started = 0.0
+
+    def __enter__(self):
+        self.started = time.monotonic()
+        if self.timer._due is not None:
+            BACKGROUND_TASK_LAG.labels(self.timer.task).set(max(0.0, self.started - self.timer._due))
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        BACKGROUND_TASK_SECONDS.labels(self.timer.task).observe(time.monotonic() - self.started)
+        BACKGROUND_TASK_LAST_RUN.labels(self.timer.task).set(time.time())
+        return False
+
+
+async def monitor_event_loop_lag(interval: float = LOOP_LAG_INTERVAL):
+    """interval마다 깨어나 늦어진 시간을 기록 (블로킹 호출이 루프를 막으면 값이 커짐)"""
+    while True:
+        expected = time.monotonic() + interval
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(0.0, time.monotonic() - expected))
+
+
+# --- 스크랩 시점 집계 ---
+class FleetCollector:
+    """IP 풀 사용률, handshake 나이별 피어 수 (이미 메모리에 있는 상태만 읽음, dump 실행 없음)"""
+
+    def describe(self):
+        # 등록 시 collect()가 호출되지 않도록 (할당기/스냅샷 모듈은 스크랩 시점에 로드)
+        return []
+
+    def collect(self):
+        from ip_allocator import ip_allocator
+        from wireguard_snapshot import wg_snapshot
+
+        stats = ip_allocator.stats()
+        capacity = GaugeMetricFamily("vpn_ip_pool_capacity", "VPN IP 풀 할당 가능 주소 수")
+        capacity.add_metric([], stats["capacity"])
+        yield capacity
+        if stats["used"] is not None:
+            used = GaugeMetricFamily("vpn_ip_pool_used", "VPN IP 풀 사용 중 주소 수")
+            used.add_metric([], stats["used"])
+            yield used
+            utilization = GaugeMetricFamily("vpn_ip_pool_utilization_ratio", "VPN IP 풀 사용률 (0-1)")
+            utilization.add_metric([], stats["used"] / stats["capacity"] if stats["capacity"] else 0.0)
+            yield utilization
+
+        snapshot = wg_snapshot.current()
+        if snapshot is None or not snapshot.ok:
+            return
+        counts = peer_handshake_buckets(snapshot.peers, time.time())
+        peers = GaugeMetricFamily(
+            "vpn_wireguard_peers", "handshake 나이 구간별 WireGuard 피어 수", labels=["handshake_age"]
+        )
+        for bucket, count in counts.items():
+            peers.add_metric([bucket], count)
+        yield peers
+        age = GaugeMetricFamily("vpn_wireguard_snapshot_age_seconds", "집계에 사용한 dump 스냅샷의 나이")
+        age.add_metric([], snapshot.age())
+        yield age
+
+
+def peer_handshake_buckets(peers: Dict[str, Dict], now: float) -> Dict[str, int]:
+    counts = {"never": 0, **{name: 0 for name, _ in HANDSHAKE_AGE_BUCKETS}, "older": 0}
+    for peer in peers.values():
+        handshake = peer.get("latest_handshake") or 0
+        if not handshake:
+            counts["never"] += 1
+            continue
+        seconds = now - handshake
+        for name, limit in HANDSHAKE_AGE_BUCKETS:
+            if seconds < limit:
+                counts[name] += 1
+                break
+        else:
+            counts["older"] += 1
+    return counts
+
+
+REGISTRY.register(FleetCollector())
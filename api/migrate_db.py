@@ -54,7 +54,10 @@ def migrate_database():
         columns_to_add = [
             ("description", "VARCHAR(255)"),
             ("central_server_ip", "VARCHAR(50)"),
-            ("docker_env_vars", "TEXT")
+            ("docker_env_vars", "TEXT"),
+            ("last_handshake", "TIMESTAMP WITH TIME ZONE"),
+            ("rx_bytes", "BIGINT"),
+            ("tx_bytes", "BIGINT")
         ]
         
         for column_name, column_type in columns_to_add:
@@ -72,6 +75,26 @@ def migrate_database():
             else:
                 print(f"- 컬럼 이미 존재: {column_name}")
         
+        # IP 할당 비트맵 테이블 (create_all로 생성된 이전 버전에 version 컬럼 추가)
+        cursor.execute("""
+            ALTER TABLE IF EXISTS ip_pool_state
+            ADD COLUMN IF NOT EXISTS version BIGINT
+        """)
+        
+        # 노드 목록 keyset 페이지네이션 인덱스 (models.py와 같은 식)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS ix_nodes_list_order
+            ON nodes ((COALESCE(vpn_ip, '')), node_id)
+        """)
+        # updated_since 필터 인덱스 (updated_at이 NULL인 새 노드도 포함하도록 created_at으로 대체한 식)
+        cursor.execute("""
+            DROP INDEX IF EXISTS ix_nodes_updated_at
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS ix_nodes_changed_at
+            ON nodes ((COALESCE(updated_at, created_at)))
+        """)
+        
         # 변경사항 커밋
         conn.commit()
         print("\n✅ 데이터베이스 마이그레이션 완료!")
@@ -1,8 +1,8 @@
-from sqlalchemy import Column, String, DateTime, Text, Boolean, Integer
+from sqlalchemy import Column, String, DateTime, Text, Boolean, Integer, BigInteger, LargeBinary, Index, literal_column
 from sqlalchemy.sql import func
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional
+from typing import Any, Dict, List, Optional
 
 from database import Base
 
@@ -10,6 +10,9 @@ from database import Base
 class Node(Base):
     """노드 정보 DB 모델"""
     __tablename__ = "nodes"
+    # created_at/updated_at 서버 기본값을 INSERT/UPDATE ... RETURNING으로 함께 받아옴
+    # (AsyncSession에서 커밋 후 속성 접근 시 지연 로딩이 일어나지 않도록)
+    __mapper_args__ = {"eager_defaults": True}
     
     node_id = Column(String, primary_key=True, index=True)
     node_type = Column(String)  # central, worker
@@ -27,6 +30,18 @@ class Node(Base):
     description = Column(String)  # 워커노드 설명 (예: "2080-test")
     central_server_url = Column(String)  # 중앙서버 공개 URL (예: http://192.168.0.88:8000)
     docker_env_vars = Column(Text)  # Docker Compose 환경변수 저장
+    
+    # 헬스체크가 일괄 저장하는 런타임 통계 (WireGuard 재시작 후에도 마지막 접속 시각 유지)
+    # 기존 테이블에는 시작 시 app_startup.SCHEMA_UPGRADES가 컬럼을 추가
+    last_handshake = Column(DateTime(timezone=True))
+    rx_bytes = Column(BigInteger)
+    tx_bytes = Column(BigInteger)
+
+# 노드 목록 keyset 페이지네이션 (node_listing.py) 정렬 키 / updated_since 필터 인덱스
+# updated_at은 첫 UPDATE 전까지 NULL이므로 필터는 생성 시각으로 대체한 식을 사용
+# 기존 DB에는 시작 시 app_startup.SCHEMA_UPGRADES(및 migrate_db.py)가 같은 인덱스를 생성
+Index("ix_nodes_list_order", func.coalesce(Node.vpn_ip, literal_column("''")), Node.node_id)
+Index("ix_nodes_changed_at", func.coalesce(Node.updated_at, Node.created_at))
 
 class QRToken(Base):
     """QR 코드 토큰 저장"""
@@ -39,6 +54,17 @@ class QRToken(Base):
     expires_at = Column(DateTime(timezone=True), nullable=False)
     used = Column(Boolean, default=False)
 
+class IPPoolState(Base):
+    """VPN IP 할당 비트맵 (ip_allocator)"""
+    __tablename__ = "ip_pool_state"
+    
+    name = Column(String, primary_key=True)
+    ranges = Column(String, nullable=False)  # 비트맵 생성 시의 WG_IP_RANGES
+    bitmap = Column(LargeBinary, nullable=False)
+    cursor = Column(Integer, default=0)
+    version = Column(BigInteger)  # 변경마다 바뀌는 토큰 (프로세스 간 캐시 검증)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
 # Pydantic 모델
 class NodeCreate(BaseModel):
     """노드 생성 요청 모델"""
@@ -82,13 +108,23 @@ class NodeResponse(BaseModel):
             }
         }
 
+class NodeBatchCreate(BaseModel):
+    """노드 일괄 등록(사전 프로비저닝) 요청 모델"""
+    nodes: List[NodeCreate] = Field(..., min_length=1, max_length=1000, description="등록할 노드 목록")
+
+class NodeBatchResponse(BaseModel):
+    """노드 일괄 등록 응답 모델"""
+    registered: int
+    nodes: List[NodeResponse]
+    wireguard: Dict[str, Any] = Field(default_factory=dict, description="피어 일괄 적용 결과")
+
 class NodeStatus(BaseModel):
     """노드 상태 정보 모델"""
     node_id: str
     node_type: str
     hostname: str
     public_ip: Optional[str]
-    vpn_ip: str
+    vpn_ip: Optional[str]
     status: str
     connected: bool
     last_handshake: Optional[datetime]
@@ -0,0 +1,205 @@
+"""
+노드 상태 변경 이벤트 스트림 (Server-Sent Events)
+구독자가 있는 동안 샘플러 하나가 주기마다 런타임 스냅샷을 한 번 읽고, 이전 샘플과 비교하여
+바뀐 필드(handshake, rx/tx, 상태)만 모든 구독자에게 전달합니다.
+서버 비용은 샘플 수에 비례하고 열린 탭(구독자) 수와는 거의 무관합니다.
+"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+from typing import Dict, Optional, Set
+
+from sqlalchemy import select
+
+from database import AsyncSessionLocal
+from fleet_revision import fleet_revision
+from metrics import TaskTimer
+from models import Node
+from wireguard_snapshot import wg_snapshot
+
+logger = logging.getLogger(__name__)
+
+# 샘플 주기 (초)
+EVENT_INTERVAL = float(os.getenv("WG_EVENT_INTERVAL", "2.0"))
+# 변경 이벤트가 없을 때 연결 유지용 주석 전송 주기 (초)
+KEEPALIVE_SECONDS = 15.0
+# 구독자별 대기 이벤트 수 (넘치면 다음에 전체 상태를 다시 보냄)
+SUBSCRIBER_QUEUE_SIZE = 32
+
+
+def format_sse(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class Subscriber:
+    """SSE 연결 하나 (node_id가 있으면 그 노드의 변경만 받음)"""
+
+    def __init__(self, node_id: Optional[str] = None):
+        self.node_id = node_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        # 큐가 넘쳐 변경분을 놓친 경우 다음 샘플에서 전체 상태를 보냄
+        self.resync = True
+
+    def select(self, nodes: Dict) -> Dict:
+        if self.node_id is None:
+            return nodes
+        return {self.node_id: nodes[self.node_id]} if self.node_id in nodes else {}
+
+    def offer(self, message: str):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.resync = True
+
+
+class NodeEventHub:
+    """
+    스냅샷 차이 계산기 + 구독자 목록
+    노드 목록(node_id, 공개키, 상태)은 fleet 리비전이 바뀐 경우에만 DB에서 다시 읽습니다.
+    """
+
+    def __init__(self, interval: float = EVENT_INTERVAL):
+        self.interval = interval
+        self.subscribers: Set[Subscriber] = set()
+        self.state: Dict[str, Dict] = {}
+        self.samples = 0
+        self.last_sample_at: Optional[float] = None
+        self._nodes: Dict[str, Dict] = {}
+        self._nodes_revision: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+
+    # --- 구독 ---
+    def subscribe(self, node_id: Optional[str] = None) -> Subscriber:
+        subscriber = Subscriber(node_id)
+        self.subscribers.add(subscriber)
+        if self.state:
+            subscriber.offer(format_sse("snapshot", {"ts": self.last_sample_at, "nodes": subscriber.select(self.state)}))
+            subscriber.resync = False
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+
+    async def stream(self, subscriber: Subscriber):
+        """SSE 본문 제너레이터 (연결이 끊기면 구독 해제)"""
+        try:
+            yield f"retry: {int(self.interval * 1000)}\n\n"
+            while True:
+                try:
+                    yield await asyncio.wait_for(subscriber.queue.get(), timeout=KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+        finally:
+            self.unsubscribe(subscriber)
+
+    # --- 샘플링 ---
+    async def _run(self):
+        logger.info("노드 이벤트 샘플러 시작")
+        timer = TaskTimer("node_events")
+        try:
+            while self.subscribers:
+                started = time.monotonic()
+                try:
+                    with timer.run():
+                        await self.sample()
+                except Exception as e:
+                    logger.error(f"노드 이벤트 샘플 실패: {e}")
+                delay = max(0.0, self.interval - (time.monotonic() - started))
+                timer.schedule(delay)
+                await asyncio.sleep(delay)
+        finally:
+            # 다음 구독 때 처음부터 다시 비교
+            self.state = {}
+            logger.info("노드 이벤트 샘플러 중지 (구독자 없음)")
+
+    async def _load_nodes(self):
+        revision = fleet_revision.revision
+        if revision == self._nodes_revision:
+            return
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(
+                select(Node.node_id, Node.public_key, Node.vpn_ip, Node.status)
+            )).all()
+        self._nodes = {
+            row.node_id: {"public_key": row.public_key, "vpn_ip": row.vpn_ip, "status": row.status}
+            for row in rows
+        }
+        self._nodes_revision = revision
+
+    async def sample(self):
+        """스냅샷 1회 -> 노드별 상태 -> 이전 상태와의 차이를 구독자에게 전달"""
+        await self._load_nodes()
+        snapshot = await wg_snapshot.aget(max_age=self.interval)
+        if not snapshot.ok:
+            # dump 실패를 모든 노드의 연결 끊김으로 전달하지 않도록 이번 샘플은 건너뜀
+            return
+
+        state = {}
+        for node_id, node in self._nodes.items():
+            peer = snapshot.peers.get(node["public_key"]) if node["public_key"] else None
+            handshake = peer["latest_handshake"] if peer else 0
+            state[node_id] = {
+                "status": node["status"],
+                "vpn_ip": node["vpn_ip"],
+                "connected": handshake > 0,
+                "latest_handshake": handshake,
+                "rx_bytes": peer["rx_bytes"] if peer else 0,
+                "tx_bytes": peer["tx_bytes"] if peer else 0
+            }
+
+        changes = {}
+        previous = self.state
+        for node_id, values in state.items():
+            before = previous.get(node_id)
+            if before is None:
+                changes[node_id] = values
+                continue
+            changed = {key: value for key, value in values.items() if before.get(key) != value}
+            if changed:
+                changes[node_id] = changed
+        for node_id in previous.keys() - state.keys():
+            # 삭제된 노드
+            changes[node_id] = None
+
+        self.state = state
+        self.samples += 1
+        self.last_sample_at = time.time()
+        self._publish(changes)
+
+    def _publish(self, changes: Dict):
+        broadcast = None
+        for subscriber in list(self.subscribers):
+            if subscriber.resync:
+                subscriber.resync = False
+                subscriber.offer(format_sse("snapshot", {"ts": self.last_sample_at, "nodes": subscriber.select(self.state)}))
+                continue
+            if not changes:
+                continue
+            if subscriber.node_id is None:
+                # 전체 구독자는 같은 직렬화 결과를 공유
+                if broadcast is None:
+                    broadcast = format_sse("changes", {"ts": self.last_sample_at, "nodes": changes})
+                subscriber.offer(broadcast)
+            elif subscriber.node_id in changes:
+                subscriber.offer(format_sse("changes", {
+                    "ts": self.last_sample_at,
+                    "nodes": {subscriber.node_id: changes[subscriber.node_id]}
+                }))
+
+    def stats(self) -> Dict:
+        return {
+            "subscribers": len(self.subscribers),
+            "interval_seconds": self.interval,
+            "samples": self.samples,
+            "tracked_nodes": len(self.state),
+            "running": self._task is not None and not self._task.done()
+        }
+
+
+# 전역 이벤트 허브
+node_events = NodeEventHub()
@@ -0,0 +1,132 @@
+"""
+노드 목록 조회 (keyset 페이지네이션, 서버 측 필터, 필드 선택)
+(vpn_ip, node_id) 순서의 커서로 다음 페이지를 인덱스 범위 검색으로 읽으므로 페이지 위치와 무관하게
+한 페이지 비용이 일정하고, config/private_key 같은 큰 Text 컬럼은 요청된 필드에 필요할 때만 로드합니다.
+"""
+
+import json
+import base64
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import func, literal_column, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
+
+from models import Node
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# 정렬 키: 대기(pending) 노드는 vpn_ip가 NULL이므로 빈 문자열로 맨 앞에 정렬
+# (models.py의 ix_nodes_list_order 인덱스와 같은 식이어야 인덱스 범위 검색이 됨. prepared statement의
+#  generic plan에서도 인덱스 식과 일치하도록 '' 는 바인드 파라미터가 아닌 리터럴로 렌더링)
+ORDER_KEY = func.coalesce(Node.vpn_ip, literal_column("''"))
+
+# updated_since 필터 키: 생성 후 한 번도 수정되지 않은 노드는 updated_at이 NULL이므로 created_at 사용
+# (models.py의 ix_nodes_changed_at 인덱스와 같은 식)
+CHANGED_AT = func.coalesce(Node.updated_at, Node.created_at)
+
+# 응답 필드 -> 로드할 DB 컬럼
+NODE_COLUMNS = {
+    "node_id": Node.node_id,
+    "node_type": Node.node_type,
+    "hostname": Node.hostname,
+    "public_ip": Node.public_ip,
+    "vpn_ip": Node.vpn_ip,
+    "status": Node.status,
+    "description": Node.description,
+    "created_at": Node.created_at,
+    "updated_at": Node.updated_at
+}
+
+# WireGuard 런타임 스냅샷에서 채우는 필드 (DB 컬럼 아님, 공개키 필요)
+RUNTIME_FIELDS = {"connected", "last_handshake", "bytes_sent", "bytes_received"}
+
+
+def parse_fields(fields: Optional[str], allowed: Iterable[str]) -> Optional[Set[str]]:
+    """fields 파라미터("node_id,vpn_ip,status") -> 필드 집합 (생략 시 None = 전체, 모르는 필드는 ValueError)"""
+    if not fields:
+        return None
+    requested = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = requested - set(allowed)
+    if unknown:
+        raise ValueError(f"알 수 없는 필드: {', '.join(sorted(unknown))}")
+    return requested
+
+
+def encode_cursor(node: Node) -> str:
+    """마지막 행의 정렬 키 -> 불투명 커서 문자열"""
+    raw = json.dumps([node.vpn_ip or "", node.node_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        vpn_ip, node_id = json.loads(raw)
+        return str(vpn_ip), str(node_id)
+    except Exception:
+        raise ValueError("잘못된 커서입니다")
+
+
+def columns_for(fields: Optional[Set[str]]) -> List:
+    """요청 필드에 필요한 컬럼만 (정렬 키는 커서 계산에 항상 필요)"""
+    if fields is None:
+        columns = list(NODE_COLUMNS.values())
+    else:
+        columns = [NODE_COLUMNS[f] for f in fields if f in NODE_COLUMNS]
+    if fields is None or fields & RUNTIME_FIELDS:
+        columns.append(Node.public_key)
+    for key in (Node.node_id, Node.vpn_ip):
+        if key not in columns:
+            columns.append(key)
+    return columns
+
+
+async def fetch_node_page(
+    db: AsyncSession,
+    *,
+    fields: Optional[Set[str]] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    node_type: Optional[str] = None,
+    description_prefix: Optional[str] = None,
+    updated_since: Optional[datetime] = None
+) -> Tuple[List[Node], Optional[str]]:
+    """
+    필터/커서 조건의 노드 한 페이지와 다음 페이지 커서 (마지막 페이지면 None)
+    limit과 cursor를 모두 생략하면 기존 클라이언트 호환을 위해 전체를 한 번에 반환합니다.
+    """
+    query = select(Node).options(load_only(*columns_for(fields), raiseload=True))
+
+    if status:
+        query = query.where(Node.status == status)
+    if node_type:
+        query = query.where(Node.node_type == node_type)
+    if description_prefix:
+        query = query.where(Node.description.startswith(description_prefix, autoescape=True))
+    if updated_since:
+        query = query.where(CHANGED_AT >= updated_since)
+    if cursor:
+        query = query.where(tuple_(ORDER_KEY, Node.node_id) > tuple_(*decode_cursor(cursor)))
+
+    query = query.order_by(ORDER_KEY, Node.node_id)
+    if limit is None and cursor is None:
+        return list((await db.scalars(query)).all()), None
+
+    limit = min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+    # 한 행 더 읽어 다음 페이지 존재 여부 확인 (COUNT 없이)
+    nodes = list((await db.scalars(query.limit(limit + 1))).all())
+    if len(nodes) <= limit:
+        return nodes, None
+    nodes = nodes[:limit]
+    return nodes, encode_cursor(nodes[-1])
+
+
+def project(values: Dict, fields: Optional[Set[str]]) -> Dict:
+    """응답 dict에서 요청된 필드만 남김"""
+    if fields is None:
+        return values
+    return {key: value for key, value in values.items() if key in fields}
@@ -2,14 +2,22 @@
 Node management endpoints for viewing and cleaning up nodes
 """
 
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
-from sqlalchemy.orm import Session
-from database import SessionLocal
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import AsyncSessionLocal, get_async_db
 from models import Node
 from typing import List, Optional, Dict, Any
 from pydantic import BaseModel
 from datetime import datetime
 from connection_manager import connection_manager
+from health_history import health_history
+from wireguard_manager import async_wg_manager
+from wireguard_snapshot import wg_snapshot
+from fleet_revision import cache_headers, fleet_revision, make_etag, not_modified, query_digest
+from node_events import node_events
+from node_listing import MAX_PAGE_SIZE, fetch_node_page, parse_fields
 import asyncio
 import logging
 
@@ -17,13 +25,6 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 class NodeInfo(BaseModel):
     node_id: str
     node_type: str
@@ -36,71 +37,96 @@ class NodeInfo(BaseModel):
 class NodeDeleteRequest(BaseModel):
     node_ids: List[str]
 
+# Fields selectable via ?fields= on /api/nodes/list
+LIST_FIELDS = ("node_id", "node_type", "hostname", "vpn_ip", "status", "created_at", "updated_at")
+
 @router.get("/api/nodes/list")
 async def list_nodes(
+    request: Request,
+    response: Response,
     node_type: Optional[str] = None,
     status: Optional[str] = None,
-    db: Session = Depends(get_db)
+    description_prefix: Optional[str] = None,
+    updated_since: Optional[datetime] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
-    List all nodes with optional filtering
+    List nodes with optional filtering, keyset pagination and sparse fieldsets
+
+    Pass `limit` (and the returned `next_cursor`) to page through the fleet;
+    without `limit`/`cursor` every matching node is returned as before.
+    Heavy columns (config, private_key) are never loaded. Honors If-None-Match.
     """
-    query = db.query(Node)
-    
-    if node_type:
-        query = query.filter(Node.node_type == node_type)
-    if status:
-        query = query.filter(Node.status == status)
+    # Unchanged fleet -> 304 without touching the DB
+    etag = make_etag(fleet_revision.revision, query_digest(request))
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
     
-    nodes = query.order_by(Node.vpn_ip).all()
+    try:
+        selected = parse_fields(fields, LIST_FIELDS)
+        nodes, next_cursor = await fetch_node_page(
+            db, fields=selected or set(LIST_FIELDS), limit=limit, cursor=cursor, status=status, node_type=node_type,
+            description_prefix=description_prefix, updated_since=updated_since
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
+    response.headers.update(cache_headers(etag))
     return {
         "total": len(nodes),
-        "nodes": [
-            {
-                "node_id": node.node_id,
-                "node_type": node.node_type,
-                "hostname": node.hostname,
-                "vpn_ip": node.vpn_ip,
-                "status": node.status,
-                "created_at": node.created_at.isoformat() if node.created_at else None,
-                "updated_at": node.updated_at.isoformat() if node.updated_at else None
-            }
-            for node in nodes
-        ]
+        "next_cursor": next_cursor,
+        "nodes": [_node_summary(node, selected) for node in nodes]
     }
 
+def _node_summary(node: Node, selected: Optional[set]) -> Dict[str, Any]:
+    names = LIST_FIELDS if selected is None else [name for name in LIST_FIELDS if name in selected]
+    summary = {}
+    for name in names:
+        value = getattr(node, name)
+        summary[name] = value.isoformat() if isinstance(value, datetime) else value
+    return summary
+
 @router.delete("/api/nodes/cleanup")
 async def cleanup_nodes(
     request: NodeDeleteRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Delete specified nodes from the database
     """
     deleted_count = 0
     failed_nodes = []
+    nodes = []
     
     for node_id in request.node_ids:
+        node = await db.get(Node, node_id)
+        if node:
+            nodes.append(node)
+        else:
+            failed_nodes.append({"node_id": node_id, "reason": "not found"})
+    
+    # Remove all peers from WireGuard with a single config write
+    try:
+        await async_wg_manager.remove_peers_from_server([node.public_key for node in nodes])
+    except Exception as e:
+        logger.warning(f"Failed to remove peers from WireGuard: {e}")  # Continue even if WireGuard removal fails
+    
+    # Return all addresses to the pool with a single bitmap write
+    await async_wg_manager.release_ips(db, [node.vpn_ip for node in nodes])
+    for node in nodes:
         try:
-            node = db.query(Node).filter(Node.node_id == node_id).first()
-            if node:
-                # Remove from WireGuard server if possible
-                try:
-                    from wireguard_manager import WireGuardManager
-                    wg_manager = WireGuardManager()
-                    wg_manager.remove_peer_from_server(node.public_key)
-                except:
-                    pass  # Continue even if WireGuard removal fails
-                
-                db.delete(node)
-                deleted_count += 1
-            else:
-                failed_nodes.append({"node_id": node_id, "reason": "not found"})
+            await db.delete(node)
+            deleted_count += 1
         except Exception as e:
-            failed_nodes.append({"node_id": node_id, "reason": str(e)})
+            failed_nodes.append({"node_id": node.node_id, "reason": str(e)})
     
-    db.commit()
+    await db.commit()
+    for node in nodes:
+        health_history.forget(node.node_id)
     
     return {
         "deleted": deleted_count,
@@ -108,31 +134,32 @@ async def cleanup_nodes(
     }
 
 @router.delete("/api/nodes/cleanup-disconnected")
-async def cleanup_disconnected_nodes(db: Session = Depends(get_db)):
+async def cleanup_disconnected_nodes(db: AsyncSession = Depends(get_async_db)):
     """
     Delete all nodes that are not currently connected
     """
-    disconnected_nodes = db.query(Node).filter(
+    disconnected_nodes = (await db.scalars(select(Node).where(
         Node.status != "connected"
-    ).all()
+    ))).all()
+    
+    # Remove all peers from WireGuard with a single config write
+    try:
+        await async_wg_manager.remove_peers_from_server([node.public_key for node in disconnected_nodes])
+    except Exception as e:
+        logger.warning(f"Failed to remove peers from WireGuard: {e}")
     
+    await async_wg_manager.release_ips(db, [node.vpn_ip for node in disconnected_nodes])
     deleted_count = 0
     for node in disconnected_nodes:
         try:
-            # Remove from WireGuard server if possible
-            try:
-                from wireguard_manager import WireGuardManager
-                wg_manager = WireGuardManager()
-                wg_manager.remove_peer_from_server(node.public_key)
-            except:
-                pass
-            
-            db.delete(node)
+            await db.delete(node)
             deleted_count += 1
         except:
             continue
     
-    db.commit()
+    await db.commit()
+    for node in disconnected_nodes:
+        health_history.forget(node.node_id)
     
     return {
         "deleted": deleted_count,
@@ -140,28 +167,20 @@ async def cleanup_disconnected_nodes(db: Session = Depends(get_db)):
     }
 
 @router.get("/api/nodes/{node_id}/status")
-async def get_node_status(node_id: str, db: Session = Depends(get_db)):
+async def get_node_status(node_id: str, db: AsyncSession = Depends(get_async_db)):
     """
     Get detailed status of a specific node
     """
-    node = db.query(Node).filter(Node.node_id == node_id).first()
+    node = await db.get(Node, node_id)
     
     if not node:
         raise HTTPException(status_code=404, detail="Node not found")
     
-    # Try to get real-time status from WireGuard
+    # Real-time status from the shared WireGuard runtime snapshot
     wg_status = "unknown"
-    try:
-        from wireguard_manager import WireGuardManager
-        wg_manager = WireGuardManager()
-        peers = wg_manager.get_peer_status()
-        
-        for peer in peers:
-            if peer.get("public_key") == node.public_key:
-                wg_status = "connected" if peer.get("latest_handshake") else "configured"
-                break
-    except:
-        pass
+    peer = (await wg_snapshot.aget()).peers.get(node.public_key)
+    if peer:
+        wg_status = "connected" if peer["latest_handshake"] else "configured"
     
     return {
         "node_id": node.node_id,
@@ -179,14 +198,14 @@ async def get_node_status(node_id: str, db: Session = Depends(get_db)):
 @router.post("/api/nodes/{node_id}/deactivate")
 async def deactivate_node(
     node_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     background_tasks: BackgroundTasks = BackgroundTasks()
 ):
     """
     노드를 안전하게 비활성화 (WireGuard 설정에서 제거하되 DB는 유지)
     Enhanced with connection state management
     """
-    node = db.query(Node).filter(Node.node_id == node_id).first()
+    node = await db.get(Node, node_id)
     if not node:
         raise HTTPException(status_code=404, detail="Node not found")
     
@@ -211,14 +230,14 @@ async def deactivate_node(
 @router.post("/api/nodes/{node_id}/activate")
 async def activate_node(
     node_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     background_tasks: BackgroundTasks = BackgroundTasks()
 ):
     """
     비활성화된 노드를 재활성화 (WireGuard 설정 복원)
     Enhanced with automatic retry and connection verification
     """
-    node = db.query(Node).filter(Node.node_id == node_id).first()
+    node = await db.get(Node, node_id)
     if not node:
         raise HTTPException(status_code=404, detail="Node not found")
     
@@ -241,7 +260,7 @@ async def activate_node(
         )
     
     # Schedule health check in background
-    background_tasks.add_task(monitor_node_health, node_id, db)
+    background_tasks.add_task(monitor_node_health, node_id)
     
     logger.info(f"Node {node_id} activated: {result}")
     return result
@@ -249,13 +268,20 @@ async def activate_node(
 @router.post("/api/nodes/test-connectivity")
 async def test_node_connectivity(
     node_type: Optional[str] = None,
-    db: Session = Depends(get_db)
+    mode: Optional[str] = Query(None, pattern="^(handshake|icmp)$"),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Test connectivity to nodes with enhanced health checking
+
+    Default (handshake) mode classifies every node as connected/idle/stale from one
+    WireGuard dump; mode=icmp pings each node instead (slow, for diagnostics).
     """
     # Use connection manager for comprehensive health checks
-    result = await connection_manager.batch_health_check(db, node_type)
+    try:
+        result = await connection_manager.batch_health_check(db, node_type, mode)
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     
     logger.info(f"Connectivity test completed: {result['connected']}/{result['total_nodes']} nodes connected")
     
@@ -264,18 +290,39 @@ async def test_node_connectivity(
 @router.post("/api/nodes/{node_id}/health-check")
 async def health_check_single_node(
     node_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Perform health check on a single node
     """
-    node = db.query(Node).filter(Node.node_id == node_id).first()
+    node = await db.get(Node, node_id)
     if not node:
         raise HTTPException(status_code=404, detail="Node not found")
     
     result = await connection_manager.health_check_node(node, db)
     return result
 
+@router.get("/api/nodes/events")
+async def node_event_stream(node_id: Optional[str] = None):
+    """
+    Server-sent events of node state changes (all nodes, or one with ?node_id=)
+
+    The first event is a full `snapshot`; later `changes` events carry only the
+    fields that differ from the previous sample (null = node removed). One shared
+    sampler reads the WireGuard runtime once per interval for all subscribers.
+    """
+    subscriber = node_events.subscribe(node_id)
+    return StreamingResponse(
+        node_events.stream(subscriber),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/api/nodes/events/stats")
+async def node_event_stats():
+    """Subscriber and sampler counters for the event stream"""
+    return node_events.stats()
+
 @router.get("/api/nodes/connection-states")
 async def get_connection_states():
     """
@@ -294,17 +341,45 @@ async def get_connection_states():
         }
     }
 
+@router.get("/api/nodes/health-history")
+async def get_health_history(
+    flapping: bool = False,
+    limit: int = Query(100, ge=1, le=1000)
+):
+    """
+    Per-node health observation summary, highest flap score first
+    (?flapping=true lists only nodes above the flap threshold)
+    """
+    return {
+        "config": health_history.config(),
+        "nodes": health_history.summary(flapping_only=flapping, limit=limit)
+    }
+
+@router.get("/api/nodes/{node_id}/health-history")
+async def get_node_health_history(
+    node_id: str,
+    limit: Optional[int] = Query(None, ge=1)
+):
+    """
+    Recent health observations for one node (newest first), with its current
+    streak, flap score and last threshold crossing
+    """
+    history = health_history.node_history(node_id, limit)
+    if history is None:
+        raise HTTPException(status_code=404, detail="No health history for node")
+    return {**history, "config": health_history.config()}
+
 @router.post("/api/nodes/auto-reconnect")
 async def trigger_auto_reconnect(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     background_tasks: BackgroundTasks = BackgroundTasks()
 ):
     """
     Trigger auto-reconnection for all disconnected nodes
     """
-    disconnected_nodes = db.query(Node).filter(
+    disconnected_nodes = (await db.scalars(select(Node).where(
         Node.status.in_(["disconnected", "error"])
-    ).all()
+    ))).all()
     
     if not disconnected_nodes:
         return {
@@ -314,11 +389,7 @@ async def trigger_auto_reconnect(
     
     # Schedule reconnection attempts in background
     for node in disconnected_nodes:
-        background_tasks.add_task(
-            connection_manager.auto_reconnect_node,
-            node,
-            db
-        )
+        background_tasks.add_task(reconnect_node, node.node_id)
     
     return {
         "message": f"Scheduled reconnection for {len(disconnected_nodes)} nodes",
@@ -331,10 +402,19 @@ async def cleanup_node_resources(node_id: str):
     await asyncio.sleep(5)  # Wait for deactivation to complete
     logger.info(f"Cleaned up resources for node {node_id}")
 
-async def monitor_node_health(node_id: str, db: Session):
+async def monitor_node_health(node_id: str):
     """Monitor node health after activation"""
     await asyncio.sleep(10)  # Wait for connection to stabilize
-    node = db.query(Node).filter(Node.node_id == node_id).first()
-    if node:
-        result = await connection_manager.health_check_node(node, db)
-        logger.info(f"Health check for {node_id}: {result}")
\ No newline at end of file
+    # The request session is closed by now, so open a dedicated one
+    async with AsyncSessionLocal() as db:
+        node = await db.get(Node, node_id)
+        if node:
+            result = await connection_manager.health_check_node(node, db)
+            logger.info(f"Health check for {node_id}: {result}")
+
+async def reconnect_node(node_id: str):
+    """Auto-reconnect a single node in its own session"""
+    async with AsyncSessionLocal() as db:
+        node = await db.get(Node, node_id)
+        if node:
+            await connection_manager.auto_reconnect_node(node, db)
\ No newline at end of file
@@ -0,0 +1,123 @@
+"""
+핸드셰이크 기반 노드 생존 판정
+`wg show wg0 dump` 한 번(wg_snapshot)으로 모든 노드를 connected / idle / stale 로 분류합니다.
+WireGuard는 트래픽이 있는 세션을 2분마다 재협상하고 워커의 PersistentKeepalive(25초)가 rx를 계속 늘리므로,
+노드별 ping 없이 latest-handshake 경과 시간과 직전 패스 대비 rx/tx 증가량으로 판정할 수 있습니다.
+ICMP(connection_manager.test_node_connectivity)는 단일 노드 진단용으로만 사용합니다.
+"""
+
+import os
+import time
+import logging
+from typing import Dict, Iterable, Optional, Tuple
+
+from prometheus_client import Gauge
+
+from wireguard_snapshot import WireGuardSnapshot, wg_snapshot
+
+logger = logging.getLogger(__name__)
+
+CONNECTED = "connected"
+IDLE = "idle"
+STALE = "stale"
+LIVENESS_STATES = (CONNECTED, IDLE, STALE)
+
+# 이 시간(초) 안에 핸드셰이크가 있었으면 connected (재협상 주기 120초 + 여유)
+CONNECTED_WITHIN = float(os.getenv("WG_LIVENESS_CONNECTED_SECONDS", "180"))
+# 이 시간(초)이 지나도록 핸드셰이크가 없으면 stale, 그 사이는 idle
+STALE_AFTER = float(os.getenv("WG_LIVENESS_STALE_SECONDS", "600"))
+
+NODE_LIVENESS = Gauge(
+    "vpn_node_liveness",
+    "마지막 생존 판정 패스의 상태별 노드 수",
+    ["state"]
+)
+
+
+def classify_peer(peer: Optional[Dict], previous: Optional[Tuple[int, int]], now: float) -> Dict:
+    """
+    피어 하나의 생존 상태
+    - connected: 최근 핸드셰이크(CONNECTED_WITHIN 이내)가 있거나 직전 패스 이후 rx가 증가
+    - idle: 핸드셰이크가 STALE_AFTER 이내지만 새 수신 트래픽 없음
+    - stale: 핸드셰이크가 없거나 STALE_AFTER보다 오래됨 (서버에 피어가 없는 경우 포함)
+    rx/tx 증가량은 직전 샘플이 없거나 카운터가 초기화된 경우(피어 재등록) None
+    """
+    if not peer:
+        return {"liveness": STALE, "handshake_age": None, "rx_delta": None, "tx_delta": None,
+                "latest_handshake": 0, "rx_bytes": None, "tx_bytes": None}
+
+    handshake = peer["latest_handshake"]
+    age = max(0.0, now - handshake) if handshake else None
+    rx_delta = tx_delta = None
+    if previous is not None and peer["rx_bytes"] >= previous[0] and peer["tx_bytes"] >= previous[1]:
+        rx_delta = peer["rx_bytes"] - previous[0]
+        tx_delta = peer["tx_bytes"] - previous[1]
+
+    if age is None:
+        liveness = STALE
+    elif age <= CONNECTED_WITHIN or (rx_delta or 0) > 0:
+        liveness = CONNECTED
+    elif age <= STALE_AFTER:
+        liveness = IDLE
+    else:
+        liveness = STALE
+
+    return {
+        "liveness": liveness,
+        "handshake_age": round(age, 1) if age is not None else None,
+        "rx_delta": rx_delta,
+        "tx_delta": tx_delta,
+        "latest_handshake": handshake,
+        "rx_bytes": peer["rx_bytes"],
+        "tx_bytes": peer["tx_bytes"]
+    }
+
+
+class PeerLiveness:
+    """
+    스냅샷 단위 rx/tx 카운터 기록 (프로세스 전역)
+    같은 스냅샷을 여러 호출자가 공유하면 증가량은 그 이전 스냅샷 기준으로 계산하여
+    TTL 안에서 두 번 판정해도 증가량이 0으로 보이지 않도록 합니다.
+    """
+
+    def __init__(self):
+        self._taken_at: Optional[float] = None
+        self._previous: Dict[str, Tuple[int, int]] = {}
+        self._current: Dict[str, Tuple[int, int]] = {}
+        self.last_pass_at: Optional[float] = None
+        self.last_counts: Dict[str, int] = {}
+
+    async def sample(self, max_age: Optional[float] = None) -> WireGuardSnapshot:
+        """생존 판정용 스냅샷 (dump 1회, 다른 호출자와 공유)"""
+        return await wg_snapshot.aget(max_age=max_age)
+
+    def classify(self, snapshot: WireGuardSnapshot,
+                 nodes: Iterable[Tuple[str, Optional[str]]]) -> Dict[str, Dict]:
+        """(node_id, public_key) 목록을 한 스냅샷으로 분류 -> node_id별 판정"""
+        if snapshot.taken_at != self._taken_at:
+            # 일부 노드만 판정한 패스도 있으므로 이전 기록에 합치고, 서버에서 사라진 피어는 버림
+            merged = {**self._previous, **self._current}
+            self._previous = {key: value for key, value in merged.items() if key in snapshot.peers}
+            self._current = {}
+            self._taken_at = snapshot.taken_at
+
+        now = time.time()
+        results = {}
+        counts = {state: 0 for state in LIVENESS_STATES}
+        for node_id, public_key in nodes:
+            peer = snapshot.peers.get(public_key) if public_key else None
+            result = classify_peer(peer, self._previous.get(public_key), now)
+            if peer:
+                self._current[public_key] = (peer["rx_bytes"], peer["tx_bytes"])
+            results[node_id] = result
+            counts[result["liveness"]] += 1
+
+        for state, count in counts.items():
+            NODE_LIVENESS.labels(state).set(count)
+        self.last_counts = counts
+        self.last_pass_at = now
+        return results
+
+
+# 전역 생존 판정기
+peer_liveness = PeerLiveness()
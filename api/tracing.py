@@ -0,0 +1,236 @@
+"""
+요청 단계별 시간 추적 (Server-Timing) + 요청 프로파일러
+요청마다 contextvar에 Trace를 두고 span()으로 감싼 단계의 시간을 이름별로 합산합니다.
+asyncio.to_thread는 컨텍스트를 복사하므로 스레드 풀에서 실행되는 WireGuard 작업의 span도 같은 요청에 기록됩니다.
+결과는 Server-Timing 응답 헤더로 내보내고, 느린 요청은 단계별 시간을 로그에 남깁니다.
+"""
+
+import os
+import io
+import time
+import pstats
+import cProfile
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 이 시간(ms)보다 오래 걸린 요청은 단계별 시간을 경고 로그로 남김 (0이면 비활성)
+SLOW_REQUEST_MS = float(os.getenv("TRACE_SLOW_REQUEST_MS", "2000"))
+# 프로파일 결과 저장 위치
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "vpn-profiles"))
+MAX_PROFILE_REQUESTS = 1000
+# 프로파일러 제어 요청 자체는 측정하지 않음
+PROFILER_PATH_PREFIX = "/api/debug/profile"
+
+
+class Trace:
+    """요청 하나의 단계별 시간 (같은 이름의 span은 합산)"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.perf_counter()
+        self._spans: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float):
+        with self._lock:
+            entry = self._spans.get(name)
+            if entry is None:
+                self._spans[name] = [seconds, 1]
+            else:
+                entry[0] += seconds
+                entry[1] += 1
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def spans(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {
+                name: {"ms": round(total * 1000, 2), "count": count}
+                for name, (total, count) in self._spans.items()
+            }
+
+    def server_timing(self) -> str:
+        """Server-Timing 헤더 값: name;dur=ms[;desc="xN"], ..., total;dur=ms"""
+        parts = []
+        for name, span in self.spans().items():
+            part = f"{name};dur={span['ms']}"
+            if span["count"] > 1:
+                part += f';desc="x{span["count"]}"'
+            parts.append(part)
+        parts.append(f"total;dur={round(self.elapsed() * 1000, 2)}")
+        return ", ".join(parts)
+
+    def summary(self) -> str:
+        return " ".join(
+            f"{name}={span['ms']}ms" + (f"(x{span['count']})" if span["count"] > 1 else "")
+            for name, span in self.spans().items()
+        )
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("request_trace", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def span(name: str):
+    """현재 요청의 단계 시간 기록 (요청 밖에서는 아무것도 하지 않음)"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, time.perf_counter() - started)
+
+
+def add_span(name: str, seconds: float):
+    """이미 측정한 시간을 현재 요청에 기록 (메트릭 계측 지점에서 사용)"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(name, seconds)
+
+
+class RequestProfiler:
+    """
+    다음 N개 요청을 cProfile로 측정하여 파일로 저장 (관리자 토큰으로 시작)
+    동시에 처리 중인 요청이 있는 동안 이벤트 루프 스레드 전체를 측정하므로, 측정 창에 겹친 다른 작업도 포함됩니다.
+    스레드 풀(WireGuard 명령, 동기 DB)에서 실행된 코드는 포함되지 않고 대기 시간으로 나타납니다.
+    """
+
+    def __init__(self, directory: str = PROFILE_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._profile: Optional[cProfile.Profile] = None
+        self._remaining = 0
+        self._active = 0
+        self._captured = 0
+        self._target = 0
+        self._paths: List[str] = []
+        self.last_file: Optional[str] = None
+
+    def arm(self, requests: int) -> Dict:
+        with self._lock:
+            if self._profile is not None:
+                raise RuntimeError("이미 프로파일 측정 중입니다")
+            self._profile = cProfile.Profile()
+            self._remaining = self._target = requests
+            self._captured = 0
+            self._paths = []
+        logger.info(f"Profiling next {requests} requests")
+        return self.status()
+
+    def begin(self, path: str) -> bool:
+        """요청 시작 시 측정 대상이면 True (측정 시작)"""
+        if self._remaining <= 0 or path.startswith(PROFILER_PATH_PREFIX):
+            return False
+        with self._lock:
+            if self._profile is None or self._remaining <= 0:
+                return False
+            self._remaining -= 1
+            self._active += 1
+            self._paths.append(path)
+            if self._active == 1:
+                self._profile.enable()
+        return True
+
+    def end(self):
+        with self._lock:
+            self._active -= 1
+            self._captured += 1
+            if self._active == 0:
+                self._profile.disable()
+            if self._captured < self._target:
+                return
+            profile, self._profile = self._profile, None
+        self._save(profile)
+
+    def _save(self, profile: cProfile.Profile):
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{self._captured}req"
+        path = os.path.join(self.directory, f"{name}.prof")
+        profile.dump_stats(path)
+        with open(os.path.join(self.directory, f"{name}.txt"), "w") as f:
+            f.write(f"requests: {', '.join(self._paths)}\n\n")
+            f.write(profile_text(path))
+        self.last_file = f"{name}.prof"
+        logger.info(f"Profile saved: {path}")
+
+    def files(self) -> List[str]:
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted((f for f in os.listdir(self.directory) if f.endswith(".prof")), reverse=True)
+
+    def path_for(self, filename: str) -> Optional[str]:
+        """다운로드할 파일 경로 (디렉터리 밖 경로는 거부)"""
+        if os.path.basename(filename) != filename or not filename.endswith((".prof", ".txt")):
+            return None
+        path = os.path.join(self.directory, filename)
+        return path if os.path.isfile(path) else None
+
+    def status(self) -> Dict:
+        return {
+            "capturing": self._profile is not None,
+            "remaining": self._remaining,
+            "captured": self._captured,
+            "target": self._target,
+            "last_file": self.last_file,
+            "files": self.files()[:20]
+        }
+
+
+def profile_text(path: str, limit: int = 60) -> str:
+    """누적 시간 기준 상위 함수 (pstats 텍스트)"""
+    out = io.StringIO()
+    stats = pstats.Stats(path, stream=out)
+    stats.sort_stats("cumulative").print_stats(limit)
+    return out.getvalue()
+
+
+# 전역 프로파일러
+request_profiler = RequestProfiler()
+
+
+class TracingMiddleware:
+    """요청마다 Trace를 만들고 응답 헤더에 Server-Timing 추가 (프로파일러가 켜져 있으면 측정)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace(f"{scope['method']} {scope['path']}")
+        token = _current_trace.set(trace)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", trace.server_timing().encode()))
+                message = {**message, "headers": headers}
+                elapsed_ms = trace.elapsed() * 1000
+                if SLOW_REQUEST_MS and elapsed_ms >= SLOW_REQUEST_MS:
+                    logger.warning(f"Slow request {trace.name} {elapsed_ms:.0f}ms: {trace.summary()}")
+            await send(message)
+
+        profiling = request_profiler.begin(scope["path"])
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if profiling:
+                request_profiler.end()
+            _current_trace.reset(token)
@@ -121,42 +121,45 @@ async def vpn_status_page(node_id: str, request: Request):
         </div>
         
         <script>
-            async function checkStatus() {{
-                const nodeId = '{node_id}';
-                
+            const nodeId = '{node_id}';
+            
+            function showStatus(data) {{
                 // 현재 시간 업데이트
                 document.getElementById('last-check').querySelector('.status-value').textContent = 
                     new Date().toLocaleTimeString();
                 
+                if (!data) {{
+                    // 노드를 찾을 수 없는 경우
+                    document.getElementById('vpn-ip').querySelector('.status-value').textContent = 
+                        '10.100.1.1 (예상)';
+                    document.getElementById('connection-status').querySelector('.status-value').textContent = 
+                        '서버에서 확인 불가';
+                    return;
+                }}
+                
+                document.getElementById('vpn-ip').querySelector('.status-value').textContent = 
+                    data.vpn_ip || '할당되지 않음';
+                
+                const statusEl = document.getElementById('connection-status');
+                if (data.connected) {{
+                    statusEl.className = 'status-item connected';
+                    statusEl.querySelector('.status-value').textContent = '✅ 연결됨';
+                }} else {{
+                    statusEl.className = 'status-item disconnected';
+                    statusEl.querySelector('.status-value').textContent = '❌ 연결 안됨';
+                }}
+            }}
+            
+            async function checkStatus() {{
                 try {{
-                    // API 호출하여 상태 확인
+                    // API 호출하여 상태 확인 (변경이 없으면 304)
                     const response = await fetch(`/nodes/${{nodeId}}`, {{
                         headers: {{
                             'Authorization': 'Bearer test-token-123'
                         }}
                     }});
                     
-                    if (response.ok) {{
-                        const data = await response.json();
-                        
-                        document.getElementById('vpn-ip').querySelector('.status-value').textContent = 
-                            data.vpn_ip || '할당되지 않음';
-                        
-                        const statusEl = document.getElementById('connection-status');
-                        if (data.connected) {{
-                            statusEl.className = 'status-item connected';
-                            statusEl.querySelector('.status-value').textContent = '✅ 연결됨';
-                        }} else {{
-                            statusEl.className = 'status-item disconnected';
-                            statusEl.querySelector('.status-value').textContent = '❌ 연결 안됨';
-                        }}
-                    }} else {{
-                        // 노드를 찾을 수 없는 경우
-                        document.getElementById('vpn-ip').querySelector('.status-value').textContent = 
-                            '10.100.1.1 (예상)';
-                        document.getElementById('connection-status').querySelector('.status-value').textContent = 
-                            '서버에서 확인 불가';
-                    }}
+                    showStatus(response.ok ? await response.json() : null);
                 }} catch (error) {{
                     console.error('상태 확인 실패:', error);
                     document.getElementById('connection-status').querySelector('.status-value').textContent = 
@@ -164,11 +167,35 @@ async def vpn_status_page(node_id: str, request: Request):
                 }}
             }}
             
-            // 페이지 로드 시 자동 확인
-            window.onload = checkStatus;
+            // 서버가 변경된 필드만 푸시 (폴링 없음)
+            let current = null;
+            function subscribe() {{
+                const events = new EventSource(`/api/nodes/events?node_id=${{encodeURIComponent(nodeId)}}`);
+                
+                events.addEventListener('snapshot', (e) => {{
+                    current = JSON.parse(e.data).nodes[nodeId] || null;
+                    showStatus(current);
+                }});
+                
+                events.addEventListener('changes', (e) => {{
+                    const changes = JSON.parse(e.data).nodes[nodeId];
+                    current = changes === null ? null : Object.assign(current || {{}}, changes);
+                    showStatus(current);
+                }});
+                
+                // EventSource가 끊기면 자동 재연결 (재연결 시 snapshot부터 다시 받음)
+                events.onerror = () => console.warn('상태 스트림 재연결 중...');
+            }}
             
-            // 5초마다 자동 새로고침
-            setInterval(checkStatus, 5000);
+            window.onload = () => {{
+                if (window.EventSource) {{
+                    subscribe();
+                }} else {{
+                    // EventSource 미지원 브라우저는 기존 방식으로 5초마다 확인
+                    checkStatus();
+                    setInterval(checkStatus, 5000);
+                }}
+            }};
         </script>
     </body>
     </html>
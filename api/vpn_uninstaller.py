@@ -4,19 +4,12 @@ WireGuard 및 VPN 설정 제거 스크립트 생성
 
 from fastapi import APIRouter, Request, Depends
 from fastapi.responses import Response
-from sqlalchemy.orm import Session
-from database import SessionLocal
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
 import base64
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.get("/api/windows-uninstaller/{token}")
 async def get_windows_uninstaller(token: str, request: Request):
     """
@@ -213,18 +206,22 @@ pause >nul
     )
 
 @router.get("/api/clean-vpn/{node_id}")
-async def clean_vpn_registration(node_id: str, db: Session = Depends(get_db)):
+async def clean_vpn_registration(node_id: str, db: AsyncSession = Depends(get_async_db)):
     """
     서버에서 노드 등록 정보 제거
     """
     from models import Node
+    from wireguard_manager import async_wg_manager
+    from health_history import health_history
     
     try:
         # 노드 찾기
-        node = db.query(Node).filter(Node.node_id == node_id).first()
+        node = await db.get(Node, node_id)
         if node:
-            db.delete(node)
-            db.commit()
+            await async_wg_manager.release_ip(db, node.vpn_ip)
+            await db.delete(node)
+            await db.commit()
+            health_history.forget(node_id)
             return {"status": "success", "message": f"노드 {node_id} 제거 완료"}
         else:
             return {"status": "not_found", "message": f"노드 {node_id}를 찾을 수 없음"}
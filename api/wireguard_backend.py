@@ -0,0 +1,768 @@
+"""
+WireGuard 제어 백엔드
+WireGuardManager가 인터페이스/설정 파일을 다루는 방식을 추상화합니다.
+
+- native: WireGuard UAPI 소켓 + rtnetlink + 공유 /config 볼륨 (서브프로세스 없음)
+- docker: `docker exec wireguard-server ...` (기존 방식, 폴백)
+- local:  같은 호스트의 wg/ip 명령 직접 실행
+- fake:   메모리 내 구현 (테스트/벤치마크용)
+
+WG_BACKEND 환경변수(auto|native|docker|local|fake)로 선택합니다.
+"""
+
+import os
+import asyncio
+import base64
+import errno
+import socket
+import struct
+import subprocess
+import threading
+import ipaddress
+import logging
+from abc import ABC, abstractmethod
+from collections import Counter
+from typing import Dict, List, Optional
+
+from circuit_breaker import CircuitBreaker, wireguard_breaker
+from metrics import instrument_wg_call
+from wireguard_keys import derive_public_key
+
+logger = logging.getLogger(__name__)
+
+DOCKER_SOCKET = "/var/run/docker.sock"
+WIREGUARD_CONTAINER = "wireguard-server"
+# wireguard-server 컨테이너 내부 경로
+CONTAINER_CONFIG_FILE = "/config/wg_confs/wg0.conf"
+
+ROUTE_ADDED = "added"
+ROUTE_EXISTS = "exists"
+ROUTE_FAILED = "failed"
+
+# 명령 실행 제한 시간 (초, 동기/비동기 모두)
+COMMAND_TIMEOUT = float(os.getenv("WG_COMMAND_TIMEOUT", "10"))
+
+# `docker exec`가 컨테이너에 닿지 못했을 때의 오류 (명령 자체의 실패와 구분하여 브레이커에 기록)
+DOCKER_UNAVAILABLE_MARKERS = (
+    "Error response from daemon", "No such container", "is not running", "is restarting",
+    "Cannot connect to the Docker daemon"
+)
+
+
+def container_unavailable(result: subprocess.CompletedProcess) -> bool:
+    return result.returncode != 0 and any(marker in result.stderr for marker in DOCKER_UNAVAILABLE_MARKERS)
+
+
+async def _kill_process(process: Optional[asyncio.subprocess.Process]):
+    """아직 실행 중인 하위 프로세스를 종료하고 회수"""
+    if process is None or process.returncode is not None:
+        return
+    try:
+        process.kill()
+    except ProcessLookupError:
+        pass
+    await process.wait()
+
+
+async def run_command(cmd: List[str], timeout: float = COMMAND_TIMEOUT,
+                      breaker: Optional[CircuitBreaker] = None) -> subprocess.CompletedProcess:
+    """
+    이벤트 루프를 막지 않는 명령 실행 (제한 시간 초과 시 프로세스 종료 후 TimeoutError)
+    breaker가 있으면 열려 있을 때 CircuitOpenError, 시간 초과/실행 불가/docker 데몬 오류를 실패로 기록
+    취소(CancelledError)되면 프로세스를 종료/회수하고 브레이커의 시험 호출 자리를 반환한 뒤 다시 발생시킴
+    """
+    if breaker:
+        breaker.before_call()
+    process = None
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"{' '.join(cmd[:4])} 시간 초과 ({timeout}s)")
+    except (OSError, TimeoutError) as e:
+        if breaker:
+            breaker.record_failure(str(e))
+        await _kill_process(process)
+        raise
+    except BaseException:
+        if breaker:
+            breaker.release()
+        await _kill_process(process)
+        raise
+    result = subprocess.CompletedProcess(cmd, process.returncode, stdout.decode(), stderr.decode())
+    if breaker:
+        if container_unavailable(result):
+            breaker.record_failure(result.stderr.strip())
+        else:
+            breaker.record_success()
+    return result
+
+# 호출 시간/실패 수를 메트릭으로 기록하는 제어 호출 (하위 클래스 구현을 자동으로 감쌈)
+INSTRUMENTED_OPS = (
+    "dump", "adump", "set_peer", "remove_peer", "remove_peers", "read_config", "write_config",
+    "syncconf", "add_route", "add_routes", "restart_interface", "public_key"
+)
+
+
+def parse_config_peers(content: str) -> Dict[str, List[str]]:
+    """설정 파일의 [Peer] 섹션에서 공개키 -> AllowedIPs 추출"""
+    peers: Dict[str, List[str]] = {}
+    public_key = None
+    allowed_ips: List[str] = []
+    in_peer = False
+
+    def flush():
+        if in_peer and public_key:
+            peers[public_key] = allowed_ips
+
+    for raw in content.splitlines():
+        line = raw.strip()
+        if line.startswith("["):
+            flush()
+            in_peer = line == "[Peer]"
+            public_key, allowed_ips = None, []
+        elif in_peer and "=" in line and not line.startswith("#"):
+            key, value = [p.strip() for p in line.split("=", 1)]
+            if key == "PublicKey":
+                public_key = value
+            elif key == "AllowedIPs":
+                allowed_ips = [ip.strip() for ip in value.split(",") if ip.strip()]
+    flush()
+    return peers
+
+
+def render_dump(private_key: str, public_key: str, listen_port: int, peers: Dict[str, Dict]) -> str:
+    """피어 테이블을 `wg show dump` 형식 문자열로 변환"""
+    lines = [f"{private_key}\t{public_key}\t{listen_port}\toff"]
+    for key, peer in peers.items():
+        lines.append("\t".join([
+            key,
+            "(none)",
+            peer.get("endpoint") or "(none)",
+            ",".join(peer.get("allowed_ips") or []) or "(none)",
+            str(peer.get("latest_handshake", 0)),
+            str(peer.get("rx_bytes", 0)),
+            str(peer.get("tx_bytes", 0)),
+            str(peer.get("persistent_keepalive") or "off")
+        ]))
+    return "\n".join(lines) + "\n"
+
+
+class WireGuardBackend(ABC):
+    """WireGuard 제어 인터페이스"""
+
+    name = "base"
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        for op in INSTRUMENTED_OPS:
+            if op in cls.__dict__:
+                setattr(cls, op, instrument_wg_call(op)(cls.__dict__[op]))
+
+    def __init__(self, interface: str = "wg0"):
+        self.interface = interface
+
+    @abstractmethod
+    def dump(self) -> str:
+        """`wg show <iface> dump` 형식의 런타임 상태"""
+
+    async def adump(self) -> str:
+        """dump()의 비동기 버전 (기본 구현은 스레드 풀에서 실행)"""
+        return await asyncio.to_thread(self.dump)
+
+    @abstractmethod
+    def set_peer(self, public_key: str, allowed_ips: str) -> bool:
+        """런타임에 피어 추가/갱신 (AllowedIPs 교체)"""
+
+    @abstractmethod
+    def remove_peer(self, public_key: str) -> bool:
+        """런타임에서 피어 제거"""
+
+    def remove_peers(self, public_keys: List[str]) -> bool:
+        """런타임에서 여러 피어 제거 (기본 구현은 하나씩 제거)"""
+        return all([self.remove_peer(key) for key in public_keys])
+
+    @abstractmethod
+    def read_config(self) -> Optional[str]:
+        """서버 설정 파일 내용 (읽기 실패 시 None)"""
+
+    @abstractmethod
+    def write_config(self, content: str) -> bool:
+        """서버 설정 파일 교체"""
+
+    def config_version(self) -> Optional[str]:
+        """설정 파일 변경 감지용 버전 (알 수 없으면 None -> 매번 다시 읽음)"""
+        return None
+
+    @abstractmethod
+    def syncconf(self) -> bool:
+        """설정 파일의 피어 목록을 런타임에 반영 (`wg syncconf`)"""
+
+    @abstractmethod
+    def add_route(self, cidr: str) -> str:
+        """WireGuard 인터페이스로 라우트 추가 (ROUTE_ADDED/ROUTE_EXISTS/ROUTE_FAILED)"""
+
+    def add_routes(self, cidrs: List[str]) -> Dict[str, str]:
+        """라우트 일괄 추가 (기본 구현은 하나씩 추가)"""
+        return {cidr: self.add_route(cidr) for cidr in cidrs}
+
+    @abstractmethod
+    def restart_interface(self) -> bool:
+        """인터페이스 재시작 (`wg-quick down/up`)"""
+
+    @abstractmethod
+    def public_key(self) -> Optional[str]:
+        """서버 인터페이스 공개키"""
+
+
+class CommandBackend(WireGuardBackend):
+    """wg/ip 명령 실행 백엔드 (prefix가 있으면 docker exec로 컨테이너 안에서 실행)"""
+
+    def __init__(self, interface: str = "wg0", prefix: Optional[List[str]] = None,
+                 config_file: str = CONTAINER_CONFIG_FILE, mirror_file: Optional[str] = None):
+        super().__init__(interface)
+        self.prefix = prefix or []
+        self.config_file = config_file
+        # API 컨테이너에도 마운트된 같은 파일 (변경 감지용 stat에만 사용)
+        self.mirror_file = mirror_file or (None if self.prefix else config_file)
+        self.name = "docker" if self.prefix else "local"
+
+    def _run(self, cmd: List[str], input: Optional[str] = None,
+             timeout: float = COMMAND_TIMEOUT) -> subprocess.CompletedProcess:
+        """
+        명령 실행 (제한 시간 초과 시 프로세스 종료 후 TimeoutError)
+        브레이커가 열려 있으면 실행하지 않고 CircuitOpenError
+        """
+        wireguard_breaker.before_call()
+        try:
+            result = subprocess.run(self.prefix + cmd, input=input, capture_output=True, text=True,
+                                    timeout=timeout)
+        except subprocess.TimeoutExpired:
+            wireguard_breaker.record_failure(f"{' '.join(cmd[:3])} timeout")
+            raise TimeoutError(f"{' '.join(cmd[:3])} 시간 초과 ({timeout}s)")
+        except OSError as e:
+            wireguard_breaker.record_failure(str(e))
+            raise
+        except BaseException:
+            wireguard_breaker.release()
+            raise
+        if container_unavailable(result):
+            wireguard_breaker.record_failure(result.stderr.strip())
+        else:
+            wireguard_breaker.record_success()
+        return result
+
+    async def _arun(self, cmd: List[str], timeout: float = COMMAND_TIMEOUT) -> subprocess.CompletedProcess:
+        """이벤트 루프를 막지 않는 명령 실행 (제한 시간 초과 시 프로세스 종료 후 TimeoutError)"""
+        return await run_command(self.prefix + cmd, timeout, breaker=wireguard_breaker)
+
+    def dump(self) -> str:
+        result = self._run(["wg", "show", self.interface, "dump"])
+        if result.returncode != 0:
+            raise RuntimeError(f"wg show dump 실패: {result.stderr.strip()}")
+        return result.stdout
+
+    async def adump(self) -> str:
+        result = await self._arun(["wg", "show", self.interface, "dump"])
+        if result.returncode != 0:
+            raise RuntimeError(f"wg show dump 실패: {result.stderr.strip()}")
+        return result.stdout
+
+    def set_peer(self, public_key: str, allowed_ips: str) -> bool:
+        result = self._run(["wg", "set", self.interface, "peer", public_key, "allowed-ips", allowed_ips])
+        if result.returncode != 0:
+            logger.warning(f"wg set 실패: {result.stderr}")
+        return result.returncode == 0
+
+    def remove_peer(self, public_key: str) -> bool:
+        result = self._run(["wg", "set", self.interface, "peer", public_key, "remove"])
+        if result.returncode != 0:
+            logger.warning(f"wg set remove 경고: {result.stderr}")
+        return result.returncode == 0
+
+    def remove_peers(self, public_keys: List[str]) -> bool:
+        """`wg set`은 여러 peer 인자를 받으므로 명령 한 번으로 제거"""
+        if not public_keys:
+            return True
+        cmd = ["wg", "set", self.interface]
+        for key in public_keys:
+            cmd += ["peer", key, "remove"]
+        result = self._run(cmd)
+        if result.returncode != 0:
+            logger.warning(f"wg set remove 경고: {result.stderr}")
+        return result.returncode == 0
+
+    def read_config(self) -> Optional[str]:
+        result = self._run(["cat", self.config_file])
+        if result.returncode != 0:
+            logger.error(f"Failed to read config file: {result.stderr}")
+            return None
+        return result.stdout
+
+    def config_version(self) -> Optional[str]:
+        return _stat_version(self.mirror_file) if self.mirror_file else None
+
+    def write_config(self, content: str) -> bool:
+        # 내용은 stdin으로 전달 (셸 인용 문제 방지), 임시 파일 작성/fsync 후 rename
+        tmp_file = f"{self.config_file}.tmp"
+        result = self._run(
+            ["sh", "-c", f"cat > {tmp_file} && sync && mv {tmp_file} {self.config_file}"],
+            input=content
+        )
+        if result.returncode != 0:
+            logger.error(f"Failed to write config: {result.stderr}")
+        return result.returncode == 0
+
+    def syncconf(self) -> bool:
+        # wg syncconf는 wg-quick 전용 항목(Address 등)을 이해하지 못하므로 strip 결과를 사용
+        result = self._run([
+            "bash", "-c",
+            f"wg syncconf {self.interface} <(wg-quick strip {self.config_file})"
+        ])
+        if result.returncode != 0:
+            logger.warning(f"Config sync failed: {result.stderr}")
+        return result.returncode == 0
+
+    def add_route(self, cidr: str) -> str:
+        result = self._run(["ip", "route", "add", cidr, "dev", self.interface])
+        if result.returncode == 0:
+            return ROUTE_ADDED
+        if "File exists" in result.stderr:
+            return ROUTE_EXISTS
+        logger.warning(f"라우트 추가 실패: {result.stderr}")
+        return ROUTE_FAILED
+
+    def add_routes(self, cidrs: List[str]) -> Dict[str, str]:
+        """`ip -batch` 한 번으로 라우트 일괄 적용 (replace라서 이미 있어도 성공)"""
+        if not cidrs:
+            return {}
+        batch = "".join(f"route replace {cidr} dev {self.interface}\n" for cidr in cidrs)
+        result = self._run(["ip", "-force", "-batch", "-"], input=batch)
+        statuses = {cidr: ROUTE_ADDED for cidr in cidrs}
+        if result.returncode != 0:
+            # 실패한 줄: "Command failed -:<line>"
+            for line in result.stderr.splitlines():
+                if "Command failed" in line and ":" in line:
+                    try:
+                        statuses[cidrs[int(line.rsplit(":", 1)[1]) - 1]] = ROUTE_FAILED
+                    except (ValueError, IndexError):
+                        pass
+            logger.warning(f"라우트 일괄 추가 일부 실패: {result.stderr.strip()}")
+        return statuses
+
+    def restart_interface(self) -> bool:
+        ok = True
+        for cmd in (["wg-quick", "down", self.interface], ["wg-quick", "up", self.interface]):
+            result = self._run(cmd)
+            if result.returncode != 0:
+                logger.error(f"재시작 명령 실패: {result.stderr}")
+                ok = False
+        return ok
+
+    def public_key(self) -> Optional[str]:
+        result = self._run(["wg", "show", self.interface, "public-key"])
+        if result.returncode == 0 and result.stdout.strip():
+            return result.stdout.strip()
+        return None
+
+
+def _stat_version(path: str) -> Optional[str]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return f"{st.st_mtime_ns}:{st.st_size}:{st.st_ino}"
+
+
+def _b64_to_hex(key: str) -> str:
+    return base64.b64decode(key).hex()
+
+
+def _hex_to_b64(key: str) -> str:
+    return base64.b64encode(bytes.fromhex(key)).decode()
+
+
+def _derive_public_key(private_key_b64: str) -> Optional[str]:
+    """X25519 개인키에서 공개키 계산"""
+    try:
+        return derive_public_key(private_key_b64)
+    except Exception as e:
+        logger.debug(f"공개키 계산 실패: {e}")
+        return None
+
+
+class NativeBackend(WireGuardBackend):
+    """
+    WireGuard UAPI 소켓과 rtnetlink로 직접 제어하는 백엔드
+    API가 WireGuard와 같은 네트워크 네임스페이스에서 실행되고
+    UAPI 소켓(/var/run/wireguard/wg0.sock)과 /config 볼륨이 공유되어 있어야 합니다.
+    """
+
+    name = "native"
+
+    # rtnetlink 상수
+    RTM_NEWROUTE = 24
+    NLMSG_ERROR = 2
+    NLM_F_REQUEST = 0x1
+    NLM_F_ACK = 0x4
+    NLM_F_EXCL = 0x200
+    NLM_F_CREATE = 0x400
+    RT_TABLE_MAIN = 254
+    RTPROT_BOOT = 3
+    RT_SCOPE_LINK = 253
+    RTN_UNICAST = 1
+    RTA_DST = 1
+    RTA_OIF = 4
+
+    def __init__(self, interface: str = "wg0", socket_path: Optional[str] = None,
+                 config_file: Optional[str] = None):
+        super().__init__(interface)
+        self.socket_path = socket_path or os.getenv(
+            "WG_UAPI_SOCKET", f"/var/run/wireguard/{interface}.sock"
+        )
+        config_path = os.getenv("WIREGUARD_CONFIG_PATH", "/config")
+        self.config_file = config_file or f"{config_path}/wg_confs/{interface}.conf"
+        self._nl_seq = 0
+
+    @classmethod
+    def available(cls, interface: str = "wg0") -> bool:
+        socket_path = os.getenv("WG_UAPI_SOCKET", f"/var/run/wireguard/{interface}.sock")
+        return os.path.exists(socket_path)
+
+    # --- UAPI ---
+    def _uapi(self, request: str) -> List[str]:
+        wireguard_breaker.before_call()
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.settimeout(min(5.0, COMMAND_TIMEOUT))
+                sock.connect(self.socket_path)
+                sock.sendall(request.encode())
+                data = b""
+                while not data.endswith(b"\n\n"):
+                    chunk = sock.recv(65536)
+                    if not chunk:
+                        break
+                    data += chunk
+        except OSError as e:
+            wireguard_breaker.record_failure(f"UAPI: {e}")
+            raise
+        except BaseException:
+            wireguard_breaker.release()
+            raise
+        wireguard_breaker.record_success()
+
+        lines = data.decode().strip().split("\n")
+        if not lines or not lines[-1].startswith("errno="):
+            raise RuntimeError("UAPI 응답 형식 오류")
+        code = int(lines[-1].split("=", 1)[1])
+        if code != 0:
+            raise RuntimeError(f"UAPI 오류: errno={code}")
+        return lines[:-1]
+
+    def _get(self) -> Dict:
+        interface = {"private_key": None, "listen_port": 0}
+        peers: Dict[str, Dict] = {}
+        current = None
+        for line in self._uapi("get=1\n\n"):
+            key, value = line.split("=", 1)
+            if key == "public_key":
+                current = {
+                    "allowed_ips": [], "endpoint": None, "latest_handshake": 0,
+                    "rx_bytes": 0, "tx_bytes": 0, "persistent_keepalive": None
+                }
+                peers[_hex_to_b64(value)] = current
+            elif current is None:
+                if key == "private_key":
+                    interface["private_key"] = _hex_to_b64(value)
+                elif key == "listen_port":
+                    interface["listen_port"] = int(value)
+            elif key == "endpoint":
+                current["endpoint"] = value
+            elif key == "allowed_ip":
+                current["allowed_ips"].append(value)
+            elif key == "last_handshake_time_sec":
+                current["latest_handshake"] = int(value)
+            elif key == "rx_bytes":
+                current["rx_bytes"] = int(value)
+            elif key == "tx_bytes":
+                current["tx_bytes"] = int(value)
+            elif key == "persistent_keepalive_interval" and value != "0":
+                current["persistent_keepalive"] = value
+        return {"interface": interface, "peers": peers}
+
+    def dump(self) -> str:
+        state = self._get()
+        private_key = state["interface"]["private_key"]
+        public_key = _derive_public_key(private_key) if private_key else None
+        return render_dump("(hidden)", public_key or "(none)",
+                           state["interface"]["listen_port"], state["peers"])
+
+    def set_peer(self, public_key: str, allowed_ips: str) -> bool:
+        request = f"set=1\npublic_key={_b64_to_hex(public_key)}\nreplace_allowed_ips=true\n"
+        for ip in allowed_ips.split(","):
+            request += f"allowed_ip={ip.strip()}\n"
+        try:
+            self._uapi(request + "\n")
+            return True
+        except Exception as e:
+            logger.warning(f"UAPI set 실패: {e}")
+            return False
+
+    def remove_peer(self, public_key: str) -> bool:
+        try:
+            self._uapi(f"set=1\npublic_key={_b64_to_hex(public_key)}\nremove=true\n\n")
+            return True
+        except Exception as e:
+            logger.warning(f"UAPI remove 경고: {e}")
+            return False
+
+    def remove_peers(self, public_keys: List[str]) -> bool:
+        if not public_keys:
+            return True
+        request = "set=1\n" + "".join(
+            f"public_key={_b64_to_hex(key)}\nremove=true\n" for key in public_keys
+        )
+        try:
+            self._uapi(request + "\n")
+            return True
+        except Exception as e:
+            logger.warning(f"UAPI remove 경고: {e}")
+            return False
+
+    # --- 공유 볼륨 설정 파일 ---
+    def read_config(self) -> Optional[str]:
+        try:
+            with open(self.config_file, "r") as f:
+                return f.read()
+        except OSError as e:
+            logger.error(f"Failed to read config file: {e}")
+            return None
+
+    def config_version(self) -> Optional[str]:
+        return _stat_version(self.config_file)
+
+    def write_config(self, content: str) -> bool:
+        """임시 파일 작성 -> fsync -> rename (원자적 교체)"""
+        tmp_file = f"{self.config_file}.tmp"
+        try:
+            with open(tmp_file, "w") as f:
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, self.config_file)
+            dir_fd = os.open(os.path.dirname(self.config_file) or ".", os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+            return True
+        except OSError as e:
+            logger.error(f"Failed to write config: {e}")
+            return False
+
+    def syncconf(self) -> bool:
+        """설정 파일과 런타임 피어의 차이만 UAPI set 한 번으로 적용 (기존 세션 유지)"""
+        content = self.read_config()
+        if content is None:
+            return False
+        desired = parse_config_peers(content)
+        try:
+            current = self._get()["peers"]
+            request = "set=1\n"
+            for key in current:
+                if key not in desired:
+                    request += f"public_key={_b64_to_hex(key)}\nremove=true\n"
+            for key, allowed_ips in desired.items():
+                if key in current and sorted(current[key]["allowed_ips"]) == sorted(allowed_ips):
+                    continue
+                request += f"public_key={_b64_to_hex(key)}\nreplace_allowed_ips=true\n"
+                for ip in allowed_ips:
+                    request += f"allowed_ip={ip}\n"
+            self._uapi(request + "\n")
+            return True
+        except Exception as e:
+            logger.warning(f"Config sync failed: {e}")
+            return False
+
+    # --- rtnetlink ---
+    def add_route(self, cidr: str) -> str:
+        network = ipaddress.IPv4Network(cidr, strict=False)
+        try:
+            ifindex = socket.if_nametoindex(self.interface)
+        except OSError as e:
+            logger.warning(f"라우트 추가 실패: {e}")
+            return ROUTE_FAILED
+
+        self._nl_seq += 1
+        rtmsg = struct.pack(
+            "BBBBBBBBI", socket.AF_INET, network.prefixlen, 0, 0,
+            self.RT_TABLE_MAIN, self.RTPROT_BOOT, self.RT_SCOPE_LINK, self.RTN_UNICAST, 0
+        )
+        attrs = struct.pack("HH", 8, self.RTA_DST) + network.network_address.packed
+        attrs += struct.pack("HHI", 8, self.RTA_OIF, ifindex)
+        flags = self.NLM_F_REQUEST | self.NLM_F_ACK | self.NLM_F_CREATE | self.NLM_F_EXCL
+        body = rtmsg + attrs
+        message = struct.pack("IHHII", 16 + len(body), self.RTM_NEWROUTE, flags, self._nl_seq, 0) + body
+
+        try:
+            with socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE) as sock:
+                sock.settimeout(5)
+                sock.send(message)
+                reply = sock.recv(4096)
+        except OSError as e:
+            logger.warning(f"라우트 추가 실패: {e}")
+            return ROUTE_FAILED
+
+        msg_type = struct.unpack_from("H", reply, 4)[0]
+        if msg_type == self.NLMSG_ERROR:
+            code = -struct.unpack_from("i", reply, 16)[0]
+            if code == 0:
+                return ROUTE_ADDED
+            if code == errno.EEXIST:
+                return ROUTE_EXISTS
+            logger.warning(f"라우트 추가 실패: {os.strerror(code)}")
+            return ROUTE_FAILED
+        return ROUTE_ADDED
+
+    def restart_interface(self) -> bool:
+        # 네이티브 백엔드는 인터페이스 재시작 대신 전체 피어 재적용
+        return self.syncconf()
+
+    def public_key(self) -> Optional[str]:
+        try:
+            private_key = self._get()["interface"]["private_key"]
+        except Exception as e:
+            logger.warning(f"UAPI get 실패: {e}")
+            return None
+        return _derive_public_key(private_key) if private_key else None
+
+
+class FakeBackend(WireGuardBackend):
+    """메모리 내 WireGuard 백엔드 (노트북에서 제어 경로 테스트/벤치마크용)"""
+
+    name = "fake"
+
+    def __init__(self, interface: str = "wg0", config: Optional[str] = None,
+                 public_key: str = "RkFLRS1TRVJWRVItUFVCTElDLUtFWS0wMDAwMDAwMDA=",
+                 listen_port: int = 51820):
+        super().__init__(interface)
+        self.config = config if config is not None else (
+            "[Interface]\nAddress = 10.100.0.1/16\nListenPort = 51820\nPrivateKey = (fake)\n"
+        )
+        self.peers: Dict[str, Dict] = {}
+        self.routes = set()
+        self.calls = Counter()
+        self._public_key = public_key
+        self.listen_port = listen_port
+        self._config_version = 0
+        self._lock = threading.Lock()
+
+    def dump(self) -> str:
+        self.calls["dump"] += 1
+        with self._lock:
+            return render_dump("(hidden)", self._public_key, self.listen_port, dict(self.peers))
+
+    def set_peer(self, public_key: str, allowed_ips: str) -> bool:
+        self.calls["set_peer"] += 1
+        with self._lock:
+            peer = self.peers.setdefault(public_key, {"latest_handshake": 0, "rx_bytes": 0, "tx_bytes": 0})
+            peer["allowed_ips"] = [ip.strip() for ip in allowed_ips.split(",")]
+        return True
+
+    def remove_peer(self, public_key: str) -> bool:
+        self.calls["remove_peer"] += 1
+        with self._lock:
+            self.peers.pop(public_key, None)
+        return True
+
+    def read_config(self) -> Optional[str]:
+        self.calls["read_config"] += 1
+        return self.config
+
+    def config_version(self) -> Optional[str]:
+        return str(self._config_version)
+
+    def write_config(self, content: str) -> bool:
+        self.calls["write_config"] += 1
+        self.config = content
+        self._config_version += 1
+        return True
+
+    def syncconf(self) -> bool:
+        self.calls["syncconf"] += 1
+        desired = parse_config_peers(self.config)
+        with self._lock:
+            for key in list(self.peers):
+                if key not in desired:
+                    del self.peers[key]
+            for key, allowed_ips in desired.items():
+                peer = self.peers.setdefault(key, {"latest_handshake": 0, "rx_bytes": 0, "tx_bytes": 0})
+                peer["allowed_ips"] = allowed_ips
+        return True
+
+    def add_route(self, cidr: str) -> str:
+        self.calls["add_route"] += 1
+        if cidr in self.routes:
+            return ROUTE_EXISTS
+        self.routes.add(cidr)
+        return ROUTE_ADDED
+
+    def restart_interface(self) -> bool:
+        self.calls["restart_interface"] += 1
+        return self.syncconf()
+
+    def public_key(self) -> Optional[str]:
+        return self._public_key
+
+
+def create_backend(kind: Optional[str] = None, interface: str = "wg0") -> WireGuardBackend:
+    """WG_BACKEND 설정에 맞는 백엔드 생성 (auto: native > docker > local)"""
+    kind = (kind or os.getenv("WG_BACKEND", "auto")).lower()
+
+    if kind == "auto":
+        if NativeBackend.available(interface):
+            kind = "native"
+        elif os.path.exists(DOCKER_SOCKET):
+            kind = "docker"
+        else:
+            kind = "local"
+
+    if kind == "native":
+        return NativeBackend(interface)
+    if kind == "docker":
+        config_path = os.getenv("WIREGUARD_CONFIG_PATH", "/config")
+        return CommandBackend(interface, prefix=["docker", "exec", WIREGUARD_CONTAINER],
+                              mirror_file=f"{config_path}/wg_confs/{interface}.conf")
+    if kind == "local":
+        config_path = os.getenv("WIREGUARD_CONFIG_PATH", "/config")
+        return CommandBackend(interface, config_file=f"{config_path}/wg_confs/{interface}.conf")
+    if kind == "fake":
+        return FakeBackend(interface)
+    raise ValueError(f"알 수 없는 WG_BACKEND: {kind}")
+
+
+_backend: Optional[WireGuardBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_backend() -> WireGuardBackend:
+    """프로세스 전역 백엔드"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend()
+                logger.info(f"WireGuard 백엔드: {_backend.name}")
+    return _backend
+
+
+def set_backend(backend: WireGuardBackend):
+    """백엔드 교체 (테스트/벤치마크에서 FakeBackend 주입용)"""
+    global _backend
+    with _backend_lock:
+        _backend = backend
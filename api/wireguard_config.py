@@ -0,0 +1,247 @@
+"""
+wg0.conf 파싱 모델
+설정 파일을 한 번 파싱하여 [Interface]와 공개키/AllowedIPs로 인덱싱된 [Peer] 레코드로 보관합니다.
+피어 추가/제거/교체는 O(1)이며, 파일 변경(mtime)이 감지될 때만 다시 읽습니다.
+"""
+
+import threading
+import logging
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+from wireguard_backend import WireGuardBackend, get_backend
+
+logger = logging.getLogger(__name__)
+
+
+class PeerEntry:
+    """[Peer] 섹션 하나"""
+
+    __slots__ = ("public_key", "allowed_ips", "node_id", "options", "comments")
+
+    def __init__(self, public_key: str, allowed_ips: Optional[List[str]] = None,
+                 node_id: Optional[str] = None, options: Optional[Dict[str, str]] = None,
+                 comments: Optional[List[str]] = None):
+        self.public_key = public_key
+        self.allowed_ips = allowed_ips or []
+        self.node_id = node_id
+        self.options = options or {}
+        self.comments = comments or []
+
+    def render(self) -> str:
+        lines = ["[Peer]"]
+        if self.node_id:
+            lines.append(f"# {self.node_id}")
+        lines.extend(self.comments)
+        lines.append(f"PublicKey = {self.public_key}")
+        if self.allowed_ips:
+            lines.append(f"AllowedIPs = {', '.join(self.allowed_ips)}")
+        for key, value in self.options.items():
+            lines.append(f"{key} = {value}")
+        return "\n".join(lines) + "\n"
+
+    def copy(self) -> "PeerEntry":
+        return PeerEntry(self.public_key, list(self.allowed_ips), self.node_id,
+                         dict(self.options), list(self.comments))
+
+
+class WireGuardConfig:
+    """wg0.conf 메모리 모델"""
+
+    def __init__(self, interface_lines: Optional[List[str]] = None):
+        # [Interface] 섹션은 wg-quick 전용 항목(PostUp 등)이 많으므로 줄 단위로 그대로 보존
+        self.interface_lines = interface_lines or []
+        self.peers: Dict[str, PeerEntry] = {}
+        self._by_ip: Dict[str, str] = {}
+        self.dirty = False
+
+    @classmethod
+    def parse(cls, content: str) -> "WireGuardConfig":
+        config = cls()
+        peer: Optional[PeerEntry] = None
+        in_peer = False
+
+        for raw in content.splitlines():
+            line = raw.strip()
+            if line.startswith("["):
+                if peer is not None:
+                    config.add_peer(peer)
+                in_peer = line == "[Peer]"
+                peer = PeerEntry("") if in_peer else None
+                if not in_peer:
+                    config.interface_lines.append(raw)
+                continue
+
+            if not in_peer:
+                config.interface_lines.append(raw)
+            elif line.startswith("#"):
+                if peer.node_id is None and not peer.public_key:
+                    peer.node_id = line.lstrip("#").strip()
+                else:
+                    peer.comments.append(line)
+            elif "=" in line:
+                key, value = [p.strip() for p in line.split("=", 1)]
+                if key == "PublicKey":
+                    peer.public_key = value
+                elif key == "AllowedIPs":
+                    peer.allowed_ips = [ip.strip() for ip in value.split(",") if ip.strip()]
+                else:
+                    peer.options[key] = value
+
+        if peer is not None:
+            config.add_peer(peer)
+
+        while config.interface_lines and not config.interface_lines[-1].strip():
+            config.interface_lines.pop()
+        config.dirty = False
+        return config
+
+    def copy(self) -> "WireGuardConfig":
+        """독립적으로 수정 가능한 복사본 (캐시된 모델을 공유하지 않음)"""
+        config = WireGuardConfig(list(self.interface_lines))
+        config.peers = {key: peer.copy() for key, peer in self.peers.items()}
+        config._by_ip = dict(self._by_ip)
+        config.dirty = self.dirty
+        return config
+
+    def render(self) -> str:
+        parts = ["\n".join(self.interface_lines) + "\n"]
+        for peer in self.peers.values():
+            parts.append("\n" + peer.render())
+        return "".join(parts)
+
+    # --- [Interface] ---
+    def interface_value(self, key: str) -> Optional[str]:
+        for line in self.interface_lines:
+            if "=" in line and line.split("=", 1)[0].strip() == key:
+                return line.split("=", 1)[1].strip()
+        return None
+
+    def set_interface_value(self, key: str, value: str):
+        for i, line in enumerate(self.interface_lines):
+            if "=" in line and line.split("=", 1)[0].strip() == key:
+                self.interface_lines[i] = f"{key} = {value}"
+                self.dirty = True
+                return
+        self.interface_lines.append(f"{key} = {value}")
+        self.dirty = True
+
+    # --- [Peer] ---
+    def get_peer(self, public_key: str) -> Optional[PeerEntry]:
+        return self.peers.get(public_key)
+
+    def find_by_ip(self, ip: str) -> Optional[str]:
+        """AllowedIPs(ip 또는 ip/32)로 피어 공개키 조회"""
+        return self._by_ip.get(ip if "/" in ip else f"{ip}/32")
+
+    def add_peer(self, peer: PeerEntry):
+        """피어 추가 (같은 공개키가 있으면 교체)"""
+        if not peer.public_key:
+            return
+        self.remove_peer(peer.public_key)
+        self.peers[peer.public_key] = peer
+        for ip in peer.allowed_ips:
+            self._by_ip[ip] = peer.public_key
+        self.dirty = True
+
+    def remove_peer(self, public_key: str) -> bool:
+        peer = self.peers.pop(public_key, None)
+        if peer is None:
+            return False
+        for ip in peer.allowed_ips:
+            if self._by_ip.get(ip) == public_key:
+                del self._by_ip[ip]
+        self.dirty = True
+        return True
+
+    def set_allowed_ips(self, public_key: str, allowed_ips: List[str]):
+        peer = self.peers[public_key]
+        for ip in peer.allowed_ips:
+            if self._by_ip.get(ip) == public_key:
+                del self._by_ip[ip]
+        peer.allowed_ips = allowed_ips
+        for ip in allowed_ips:
+            self._by_ip[ip] = public_key
+        self.dirty = True
+
+
+class WireGuardConfigStore:
+    """
+    파싱된 설정 캐시
+    파일 버전(mtime)이 바뀐 경우에만 다시 읽고, 수정은 edit() 블록 안에서 한 번에 기록합니다.
+    """
+
+    def __init__(self, backend: Optional[WireGuardBackend] = None):
+        self._backend = backend
+        self._lock = threading.RLock()
+        self._config: Optional[WireGuardConfig] = None
+        self._version: Optional[str] = None
+
+    @property
+    def backend(self) -> WireGuardBackend:
+        return self._backend or get_backend()
+
+    def version(self) -> Optional[str]:
+        """설정 파일 버전 (mtime 등, 알 수 없으면 None)"""
+        return self.backend.config_version()
+
+    def load(self) -> Optional[WireGuardConfig]:
+        """
+        현재 설정 모델의 복사본 (읽기 실패 시 None)
+        캐시된 모델은 edit() 블록 안에서만 수정되므로 조회용으로는 복사본을 반환합니다.
+        """
+        with self._lock:
+            config = self._load()
+            return config.copy() if config is not None else None
+
+    def _load(self) -> Optional[WireGuardConfig]:
+        """캐시된 설정 모델 (호출자가 _lock 보유)"""
+        with self._lock:
+            version = self.backend.config_version()
+            if self._config is not None and version is not None and version == self._version:
+                return self._config
+
+            content = self.backend.read_config()
+            if content is None:
+                return None
+            self._config = WireGuardConfig.parse(content)
+            self._version = version
+            return self._config
+
+    def save(self, config: WireGuardConfig) -> bool:
+        with self._lock:
+            if not self.backend.write_config(config.render()):
+                self.invalidate()
+                return False
+            config.dirty = False
+            self._config = config
+            self._version = self.backend.config_version()
+            return True
+
+    @contextmanager
+    def edit(self) -> Iterator[Optional[WireGuardConfig]]:
+        """
+        설정 수정 블록: with store.edit() as config: ...
+        블록이 정상 종료되고 변경이 있으면 한 번만 기록합니다.
+        """
+        with self._lock:
+            config = self._load()
+            if config is None:
+                yield None
+                return
+            try:
+                yield config
+            except Exception:
+                self.invalidate()
+                raise
+            if config.dirty and not self.save(config):
+                raise RuntimeError("WireGuard 설정 파일 쓰기 실패")
+
+    def invalidate(self):
+        with self._lock:
+            self._config = None
+            self._version = None
+
+
+# 전역 설정 저장소
+wg_config_store = WireGuardConfigStore()
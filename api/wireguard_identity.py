@@ -0,0 +1,213 @@
+"""
+WireGuard 서버 identity 캐시
+서버 공개키, 리슨 포트, 클라이언트가 접속할 엔드포인트를 프로세스당 한 번만 조회합니다.
+키 파일이 바뀌거나(mtime) refresh()가 호출될 때만 다시 조회하므로 클라이언트 설정 생성은 문자열 작업만 남습니다.
+"""
+
+import os
+import threading
+import time
+import logging
+import urllib.request
+from typing import Optional, Tuple
+
+from wireguard_backend import get_backend
+from wireguard_keys import derive_public_key
+from wireguard_snapshot import wg_snapshot
+
+logger = logging.getLogger(__name__)
+
+PUBLIC_KEY_NOT_FOUND = "SERVER_PUBLIC_KEY_NOT_FOUND"
+
+# 조회 실패(공개키 없음, 외부 IP 감지 실패)를 다시 시도하기까지의 시간 (초)
+IDENTITY_RETRY_SECONDS = float(os.getenv("WG_IDENTITY_RETRY", "30"))
+
+
+class ServerIdentity:
+    """한 번 조회된 서버 identity (읽기 전용)"""
+
+    def __init__(self, public_key: str, listen_port: Optional[int],
+                 endpoint_host: str, endpoint_port: int):
+        self.public_key = public_key
+        self.listen_port = listen_port
+        self.endpoint_host = endpoint_host
+        self.endpoint_port = endpoint_port
+        self.loaded_at = time.monotonic()
+
+    @property
+    def ok(self) -> bool:
+        return self.public_key != PUBLIC_KEY_NOT_FOUND
+
+    @property
+    def endpoint(self) -> str:
+        return f"{self.endpoint_host}:{self.endpoint_port}"
+
+    def to_dict(self) -> dict:
+        return {
+            "public_key": self.public_key,
+            "listen_port": self.listen_port,
+            "endpoint": self.endpoint,
+            "age_seconds": round(time.monotonic() - self.loaded_at, 1)
+        }
+
+
+def resolve_endpoint_host() -> Tuple[str, bool]:
+    """
+    클라이언트가 접속할 서버 주소 (SERVERURL, auto면 LOCAL_SERVER_IP, 그래도 없으면 외부 IP 감지)
+    반환: (주소, 확정 여부) - 외부 IP 감지 실패 시 localhost와 False
+    """
+    server_endpoint = os.getenv("SERVERURL", "localhost")
+    local_server_ip = os.getenv("LOCAL_SERVER_IP", "localhost")
+    if server_endpoint != "auto":
+        return server_endpoint, True
+
+    # 로컬 네트워크에서는 항상 LOCAL_SERVER_IP 사용
+    if local_server_ip and local_server_ip != "localhost":
+        logger.info(f"Using LOCAL_SERVER_IP for local network: {local_server_ip}")
+        return local_server_ip, True
+
+    # LOCAL_SERVER_IP가 설정되지 않은 경우에만 외부 IP 감지 시도
+    try:
+        response = urllib.request.urlopen('https://api.ipify.org', timeout=5)
+        detected_ip = response.read().decode('utf-8').strip()
+        logger.info(f"Auto-detected IP: {detected_ip}")
+        return detected_ip, True
+    except Exception:
+        logger.warning("Could not detect server IP, using localhost")
+        return "localhost", False
+
+
+class ServerIdentityCache:
+    """
+    프로세스 전역 서버 identity 캐시
+    get()은 키 파일들의 stat만 비교하고, 변경이 없으면 캐시된 값을 그대로 반환합니다.
+    """
+
+    def __init__(self, config_path: Optional[str] = None):
+        self.config_path = config_path or os.getenv("WIREGUARD_CONFIG_PATH", "/config")
+        self.endpoint_port = int(os.getenv("WG_PUBLIC_PORT", "41820"))
+        self._lock = threading.Lock()
+        self._identity: Optional[ServerIdentity] = None
+        self._signature = None
+        self._retry_at = 0.0
+
+    @property
+    def cache_file(self) -> str:
+        return f"{self.config_path}/server/publickey"
+
+    def _key_files(self):
+        return [
+            self.cache_file,
+            f"{self.config_path}/server/publickey-server",
+            f"{self.config_path}/server/server.publickey",
+            f"{self.config_path}/wg0.conf"
+        ]
+
+    def _file_signature(self):
+        signature = []
+        for path in self._key_files():
+            try:
+                st = os.stat(path)
+                signature.append((path, st.st_mtime_ns, st.st_size))
+            except OSError:
+                signature.append((path, None, None))
+        return tuple(signature)
+
+    def get(self) -> ServerIdentity:
+        """캐시된 identity (키 파일 변경 또는 실패 후 재시도 시간이 지난 경우에만 다시 조회)"""
+        signature = self._file_signature()
+        identity = self._identity
+        if identity is not None and signature == self._signature and time.monotonic() < self._retry_at:
+            return identity
+
+        with self._lock:
+            signature = self._file_signature()
+            if self._identity is not None and signature == self._signature and time.monotonic() < self._retry_at:
+                return self._identity
+            previous = self._identity
+            identity, complete = self._load(previous)
+            self._identity = identity
+            # 캐시 파일 기록으로 바뀐 stat을 포함하도록 조회 후 다시 계산
+            self._signature = self._file_signature()
+            self._retry_at = float("inf") if complete else time.monotonic() + IDENTITY_RETRY_SECONDS
+            return identity
+
+    def refresh(self) -> ServerIdentity:
+        """키/엔드포인트 강제 재조회"""
+        with self._lock:
+            self._identity = None
+            self._signature = None
+        return self.get()
+
+    def invalidate(self):
+        with self._lock:
+            self._identity = None
+            self._signature = None
+
+    def _load(self, previous: Optional[ServerIdentity]) -> Tuple[ServerIdentity, bool]:
+        public_key = self._lookup_public_key()
+
+        # 엔드포인트는 키 파일 변경과 무관하므로 확정된 값이 있으면 재사용
+        if previous is not None and previous.endpoint_host != "localhost":
+            endpoint_host, endpoint_ok = previous.endpoint_host, True
+        else:
+            endpoint_host, endpoint_ok = resolve_endpoint_host()
+
+        listen_port = wg_snapshot.get().interface.get("listen_port")
+
+        identity = ServerIdentity(public_key, listen_port, endpoint_host, self.endpoint_port)
+        logger.info(f"서버 identity 로드: {public_key[:8]}... endpoint {identity.endpoint}")
+        return identity, identity.ok and endpoint_ok
+
+    def _save_cache(self, key: str):
+        try:
+            os.makedirs(f"{self.config_path}/server", exist_ok=True)
+            with open(self.cache_file, "w") as f:
+                f.write(key)
+        except OSError as e:
+            logger.warning(f"서버 공개키 캐시 저장 실패: {e}")
+
+    def _lookup_public_key(self) -> str:
+        """서버 공개키 조회 (캐시 파일 -> 컨테이너 키 파일 -> wg0.conf PrivateKey -> 인터페이스)"""
+        try:
+            # 1. 서버 공개키 파일 확인 (캐시)
+            if os.path.exists(self.cache_file):
+                with open(self.cache_file, "r") as f:
+                    key = f.read().strip()
+                    if key and key != PUBLIC_KEY_NOT_FOUND:
+                        return key
+
+            # 2. LinuxServer WireGuard 컨테이너의 경우
+            for server_pubkey_path in self._key_files()[1:3]:
+                if os.path.exists(server_pubkey_path):
+                    with open(server_pubkey_path, "r") as f:
+                        key = f.read().strip()
+                    if key:
+                        self._save_cache(key)
+                        logger.info(f"서버 공개키 찾음: {server_pubkey_path}")
+                        return key
+
+            # 3. wg0.conf에서 PrivateKey 찾아서 공개키 계산
+            wg_conf_path = self._key_files()[3]
+            if os.path.exists(wg_conf_path):
+                with open(wg_conf_path, "r") as f:
+                    for line in f:
+                        if line.strip().startswith("PrivateKey"):
+                            public_key = derive_public_key(line.split("=", 1)[1].strip())
+                            self._save_cache(public_key)
+                            return public_key
+
+            # 4. WireGuard 인터페이스에서 직접 조회
+            public_key = get_backend().public_key()
+            if public_key:
+                self._save_cache(public_key)
+                return public_key
+
+            logger.error("서버 공개키를 찾을 수 없습니다. WireGuard 서버가 실행 중인지 확인하세요.")
+        except Exception as e:
+            logger.error(f"서버 공개키 조회 실패: {e}")
+        return PUBLIC_KEY_NOT_FOUND
+
+
+# 전역 identity 캐시
+server_identity = ServerIdentityCache()
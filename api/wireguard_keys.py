@@ -0,0 +1,100 @@
+"""
+WireGuard 키 생성
+`wg genkey`/`wg pubkey` 서브프로세스 대신 cryptography 패키지의 X25519로 프로세스 내에서 키를 생성합니다.
+백그라운드에서 채워지는 키 풀을 두어 등록이 몰려도 키를 바로 꺼내 쓸 수 있습니다.
+"""
+
+import os
+import base64
+import threading
+import logging
+from collections import deque
+from typing import Deque, Dict
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey
+
+logger = logging.getLogger(__name__)
+
+
+def _clamp(raw: bytes) -> bytes:
+    """Curve25519 개인키 클램핑 (`wg genkey`와 같은 형식)"""
+    key = bytearray(raw)
+    key[0] &= 248
+    key[31] = (key[31] & 127) | 64
+    return bytes(key)
+
+
+def derive_public_key(private_key: str) -> str:
+    """base64 개인키 -> base64 공개키 (`wg pubkey`)"""
+    private = X25519PrivateKey.from_private_bytes(base64.b64decode(private_key))
+    raw = private.public_key().public_bytes(
+        encoding=serialization.Encoding.Raw,
+        format=serialization.PublicFormat.Raw
+    )
+    return base64.b64encode(raw).decode()
+
+
+def generate_keypair() -> Dict[str, str]:
+    """WireGuard 키 쌍 생성 (프로세스 내)"""
+    private_key = base64.b64encode(_clamp(os.urandom(32))).decode()
+    return {
+        "private_key": private_key,
+        "public_key": derive_public_key(private_key)
+    }
+
+
+class KeypairPool:
+    """
+    미리 생성해 둔 키 쌍 풀
+    pop()은 풀에서 바로 꺼내고, 풀이 low-water 아래로 내려가면 백그라운드 스레드가 다시 채웁니다.
+    """
+
+    def __init__(self, size: int = None):
+        self.size = size if size is not None else int(os.getenv("WG_KEYPAIR_POOL_SIZE", "64"))
+        self.low_water = max(self.size // 2, 1)
+        self._keys: Deque[Dict[str, str]] = deque()
+        self._refill_needed = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_worker(self):
+        if self._thread is not None or self.size <= 0:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._refill_loop, name="wg-keypair-pool", daemon=True)
+                self._thread.start()
+                self._refill_needed.set()
+
+    def _refill_loop(self):
+        while True:
+            self._refill_needed.wait()
+            self._refill_needed.clear()
+            try:
+                while len(self._keys) < self.size:
+                    self._keys.append(generate_keypair())
+            except Exception as e:
+                logger.error(f"키 풀 채우기 실패: {e}")
+
+    def warm(self):
+        """백그라운드 채우기 시작 (앱 시작 시 호출)"""
+        self._ensure_worker()
+
+    def pop(self) -> Dict[str, str]:
+        """키 쌍 하나 꺼내기 (풀이 비어 있으면 즉시 생성)"""
+        self._ensure_worker()
+        try:
+            keypair = self._keys.popleft()
+        except IndexError:
+            keypair = generate_keypair()
+        if len(self._keys) < self.low_water:
+            self._refill_needed.set()
+        return keypair
+
+    def available(self) -> int:
+        return len(self._keys)
+
+
+# 전역 키 풀
+keypair_pool = KeypairPool()
@@ -1,12 +1,62 @@
-import subprocess
 import os
-from typing import Dict, Optional
+import asyncio
+import functools
+import threading
+from typing import Dict, List, Optional
 from datetime import datetime
 import logging
 import ipaddress
+import time
+
+from circuit_breaker import CircuitOpenError, wireguard_breaker
+from ip_allocator import ip_allocator
+from wireguard_backend import get_backend, ROUTE_ADDED, ROUTE_EXISTS
+from wireguard_config import PeerEntry, wg_config_store
+from wireguard_identity import server_identity
+from wireguard_keys import keypair_pool
+from wireguard_snapshot import wg_snapshot
+from tracing import span
 
 logger = logging.getLogger(__name__)
 
+# 피어 변경(설정 파일 + 런타임)을 프로세스 안에서 직렬화하는 잠금 (중첩 호출이 있으므로 RLock)
+# reconciler는 상태 조회부터 적용까지 이 잠금을 보유하여 등록 중인 피어를 제거하지 않습니다.
+peer_mutation_lock = threading.RLock()
+
+
+def serialized(func):
+    """peer_mutation_lock을 보유한 채 실행"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with peer_mutation_lock:
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def _format_bytes(num: int) -> str:
+    """`wg show`과 같은 단위로 바이트 수 표시"""
+    if num < 1024:
+        return f"{num} B"
+    for unit in ("KiB", "MiB", "GiB"):
+        num /= 1024
+        if num < 1024:
+            return f"{num:.2f} {unit}"
+    return f"{num / 1024:.2f} TiB"
+
+
+def _format_handshake_age(seconds: float) -> str:
+    """`wg show`과 같은 형식으로 마지막 핸드셰이크 경과 시간 표시"""
+    seconds = max(int(seconds), 0)
+    if seconds == 0:
+        return "Now"
+    parts = []
+    for name, size in (("day", 86400), ("hour", 3600), ("minute", 60), ("second", 1)):
+        value, seconds = divmod(seconds, size)
+        if value:
+            parts.append(f"{value} {name}{'s' if value > 1 else ''}")
+    return ", ".join(parts) + " ago"
+
+
 class WireGuardManager:
     """WireGuard 서버 관리 클래스"""
     
@@ -16,92 +66,68 @@ class WireGuardManager:
         # LinuxServer WireGuard 이미지는 /config/wg_confs/wg0.conf 사용
         self.server_config = f"{self.config_path}/wg_confs/wg0.conf"
         self.used_ips = set()  # 사용 중인 IP 관리
+        self.backend = get_backend()
+        self.config_store = wg_config_store
         
     def generate_keypair(self) -> Dict[str, str]:
-        """WireGuard 키 쌍 생성"""
+        """WireGuard 키 쌍 생성 (프로세스 내 X25519, 미리 채워진 풀 사용)"""
         try:
-            # 개인키 생성
-            private_key = subprocess.check_output(
-                ["wg", "genkey"], 
-                stderr=subprocess.PIPE
-            ).decode().strip()
-            
-            # 공개키 생성
-            public_key = subprocess.check_output(
-                ["wg", "pubkey"], 
-                input=private_key.encode(),
-                stderr=subprocess.PIPE
-            ).decode().strip()
-            
-            return {
-                "private_key": private_key,
-                "public_key": public_key
-            }
-        except subprocess.CalledProcessError as e:
+            return keypair_pool.pop()
+        except Exception as e:
             logger.error(f"키 생성 실패: {e}")
             raise Exception(f"WireGuard 키 생성 실패: {str(e)}")
     
-    def allocate_ip(self, node_type: str = "worker") -> Optional[str]:
-        """워커노드용 IP 자동 할당 (중앙서버는 VPN 사용 안함)"""
+    def allocate_ip(self, node_type: str = "worker", db=None) -> Optional[str]:
+        """
+        워커노드용 IP 자동 할당 (중앙서버는 VPN 사용 안함)
+        db를 넘기면 호출자의 트랜잭션 안에서 할당하며, 풀 잠금은 호출자가 노드 행과 함께
+        커밋할 때 풀립니다 (동시 등록 시 IP 충돌 방지).
+        """
+        if db is not None:
+            try:
+                vpn_ip = ip_allocator.allocate(db)
+            except Exception as e:
+                logger.error(f"IP 할당 실패: {e}")
+                ip_allocator.invalidate()
+                raise
+            if vpn_ip:
+                logger.info(f"IP 할당 완료: {vpn_ip}")
+            return vpn_ip
+        
         try:
             from database import SessionLocal
-            from models import Node
             
             db = SessionLocal()
+            try:
+                # 비트맵 할당기: WG_IP_RANGES 범위 (기본 10.100.1.2 ~ 10.100.255.254)
+                vpn_ip = ip_allocator.allocate(db)
+                db.commit()
+            finally:
+                db.close()
             
-            # 워커 노드용 IP 할당 (10.100.1.x 대역)
-            # 현재 사용 중인 모든 워커노드 IP 조회
-            used_ips = db.query(Node.vpn_ip).all()
-            used_ip_set = set([ip[0] for ip in used_ips if ip[0]])
-            
-            # 10.100.1.2부터 10.100.1.254까지 순차 할당 (최대 253개)
-            for i in range(2, 255):
-                candidate_ip = f"10.100.1.{i}"
-                if candidate_ip not in used_ip_set:
-                    db.close()
-                    logger.info(f"IP 할당 완료: {candidate_ip}")
-                    return candidate_ip
-            
-            db.close()
-            logger.error("워커 노드용 IP 풀이 가득 찼습니다")
-            return None
+            if vpn_ip:
+                logger.info(f"IP 할당 완료: {vpn_ip}")
+            return vpn_ip
             
         except Exception as e:
             logger.error(f"IP 할당 실패: {e}")
+            ip_allocator.invalidate()
             return None
     
+    def release_ip(self, db, vpn_ip: Optional[str]):
+        """노드 삭제 시 IP 반환 (호출자의 세션에 기록, 호출자가 커밋)"""
+        try:
+            ip_allocator.release(db, vpn_ip)
+        except Exception as e:
+            logger.warning(f"IP 반환 실패 ({vpn_ip}): {e}")
+            ip_allocator.invalidate()
+    
     def generate_client_config(self, private_key: str, client_ip: str, 
                               server_public_key: str = None, client_network: str = None) -> str:
-        """클라이언트용 WireGuard 설정 생성"""
+        """클라이언트용 WireGuard 설정 생성 (서버 공개키/엔드포인트는 identity 캐시 사용)"""
+        identity = server_identity.get()
         if not server_public_key:
-            server_public_key = self.get_server_public_key()
-        
-        server_endpoint = os.getenv("SERVERURL", "localhost")
-        local_server_ip = os.getenv("LOCAL_SERVER_IP", "localhost")
-        
-        # SERVERURL이 "auto"인 경우 LOCAL_SERVER_IP 사용
-        if server_endpoint == "auto":
-            # 로컬 네트워크에서는 항상 LOCAL_SERVER_IP 사용
-            if local_server_ip and local_server_ip != "localhost":
-                server_endpoint = local_server_ip
-                logger.info(f"Using LOCAL_SERVER_IP for local network: {server_endpoint}")
-            else:
-                # LOCAL_SERVER_IP가 설정되지 않은 경우에만 외부 IP 감지 시도
-                try:
-                    import urllib.request
-                    response = urllib.request.urlopen('https://api.ipify.org', timeout=5)
-                    detected_ip = response.read().decode('utf-8').strip()
-                    # 감지된 IP가 사설 IP 대역이면 그대로 사용
-                    if detected_ip.startswith(('192.168.', '10.', '172.')):
-                        server_endpoint = detected_ip
-                    else:
-                        # 공인 IP인 경우 LOCAL_SERVER_IP 우선 사용
-                        server_endpoint = local_server_ip if local_server_ip != "localhost" else detected_ip
-                    logger.info(f"Auto-detected IP: {server_endpoint}")
-                except:
-                    # 폴백: localhost 사용
-                    server_endpoint = "localhost"
-                    logger.warning("Could not detect server IP, using localhost")
+            server_public_key = identity.public_key
         
         config = f"""[Interface]
 PrivateKey = {private_key}
@@ -111,90 +137,24 @@ MTU = 1420
 
 [Peer]
 PublicKey = {server_public_key}
-Endpoint = {server_endpoint}:41820
+Endpoint = {identity.endpoint}
 AllowedIPs = 10.100.0.1/16
 PersistentKeepalive = 25
 """
         return config
     
     def get_server_public_key(self) -> str:
-        """서버의 공개키 조회"""
-        try:
-            # 1. 서버 공개키 파일 확인 (캐시)
-            pubkey_file = f"{self.config_path}/server/publickey"
-            if os.path.exists(pubkey_file):
-                with open(pubkey_file, "r") as f:
-                    key = f.read().strip()
-                    if key and key != "SERVER_PUBLIC_KEY_NOT_FOUND":
-                        return key
-            
-            # 2. LinuxServer WireGuard 컨테이너의 경우
-            server_pubkey_paths = [
-                f"{self.config_path}/server/publickey-server",  # 실제 파일명
-                f"{self.config_path}/server/server.publickey"
-            ]
-            for server_pubkey_path in server_pubkey_paths:
-                if os.path.exists(server_pubkey_path):
-                    with open(server_pubkey_path, "r") as f:
-                        key = f.read().strip()
-                        if key:
-                            # 캐시에 저장
-                            os.makedirs(f"{self.config_path}/server", exist_ok=True)
-                            with open(pubkey_file, "w") as f:
-                                f.write(key)
-                            logger.info(f"서버 공개키 찾음: {server_pubkey_path}")
-                            return key
-            
-            # 3. wg0.conf에서 PrivateKey 찾아서 공개키 계산
-            wg_conf_path = f"{self.config_path}/wg0.conf"
-            if os.path.exists(wg_conf_path):
-                with open(wg_conf_path, "r") as f:
-                    for line in f:
-                        if line.strip().startswith("PrivateKey"):
-                            private_key = line.split("=")[1].strip()
-                            # wg pubkey로 공개키 생성
-                            result = subprocess.run(
-                                ["echo", private_key, "|", "wg", "pubkey"],
-                                shell=True,
-                                capture_output=True,
-                                text=True
-                            )
-                            if result.returncode == 0:
-                                public_key = result.stdout.strip()
-                                # 캐시에 저장
-                                os.makedirs(f"{self.config_path}/server", exist_ok=True)
-                                with open(pubkey_file, "w") as f:
-                                    f.write(public_key)
-                                return public_key
-            
-            # 4. Docker 컨테이너에서 직접 조회
-            if os.path.exists("/var/run/docker.sock"):
-                result = subprocess.run(
-                    ["docker", "exec", "wireguard-server", "wg", "show", self.interface, "public-key"],
-                    capture_output=True,
-                    text=True
-                )
-                if result.returncode == 0:
-                    public_key = result.stdout.strip()
-                    # 캐시에 저장
-                    os.makedirs(f"{self.config_path}/server", exist_ok=True)
-                    with open(pubkey_file, "w") as f:
-                        f.write(public_key)
-                    return public_key
-            
-            # 실패 시 에러 메시지
-            logger.error("서버 공개키를 찾을 수 없습니다. WireGuard 서버가 실행 중인지 확인하세요.")
-            return "SERVER_PUBLIC_KEY_NOT_FOUND"
-            
-        except Exception as e:
-            logger.error(f"서버 공개키 조회 실패: {e}")
-            return "SERVER_PUBLIC_KEY_NOT_FOUND"
+        """서버의 공개키 조회 (프로세스 전역 캐시, 키 파일 변경 시에만 다시 조회)"""
+        return server_identity.get().public_key
+    
+    def get_server_endpoint(self) -> str:
+        """클라이언트가 접속할 서버 엔드포인트 (host:port)"""
+        return server_identity.get().endpoint
     
     def create_peer_config(self, node_id: str, vpn_ip: str, 
                           private_key: str, public_key: str) -> str:
         """피어용 WireGuard 설정 파일 생성"""
-        server_public_key = self.get_server_public_key()
-        server_endpoint = os.getenv("SERVERURL", "localhost")
+        identity = server_identity.get()
         
         config = f"""[Interface]
 # Node ID: {node_id}
@@ -205,13 +165,14 @@ MTU = 1420
 
 [Peer]
 # VPN Server
-PublicKey = {server_public_key}
-Endpoint = {server_endpoint}:41820
+PublicKey = {identity.public_key}
+Endpoint = {identity.endpoint}
 AllowedIPs = 10.100.0.1/16
 PersistentKeepalive = 25
 """
         return config
     
+    @serialized
     def add_peer_to_server(self, public_key: str, vpn_ip: str, node_id: str):
         """서버에 피어 추가 및 설정 파일 업데이트"""
         logger.info(f"=== Starting add_peer_to_server ===")
@@ -220,174 +181,72 @@ PersistentKeepalive = 25
         
         try:
             # 0. 서버 설정 파일 서브넷 마스크 확인 및 수정
-            self._ensure_server_subnet()
+            with span("peer.ensure_subnet"):
+                self._ensure_server_subnet()
             
             # 1. 먼저 같은 IP를 가진 기존 피어가 있는지 확인하고 제거
-            logger.info(f"Checking for docker socket at /var/run/docker.sock")
-            if os.path.exists("/var/run/docker.sock"):
-                # 현재 피어 목록 확인
-                logger.info("Docker socket found, trying to get peer list")
-                dump_cmd = [
-                    "docker", "exec", "wireguard-server",
-                    "wg", "show", self.interface, "dump"
-                ]
-                logger.info(f"Running command: {' '.join(dump_cmd)}")
-                result = subprocess.run(dump_cmd, capture_output=True, text=True)
+            with span("peer.replace_existing"):
+                snapshot = wg_snapshot.get(max_age=0)
+                if not snapshot.ok:
+                    logger.warning(f"Failed to get WireGuard peer list: {snapshot.error}")
+                for existing_key, peer in snapshot.peers.items():
+                    # 같은 IP를 가진 다른 피어가 있으면 먼저 제거
+                    if f"{vpn_ip}/32" in peer["allowed_ips"] and existing_key != public_key:
+                        logger.info(f"기존 피어 제거 중: {existing_key[:8]}... (IP: {vpn_ip})")
+                        self.remove_peer_from_server(existing_key)
                 
-                # 실패 시 로그 출력
-                if result.returncode != 0:
-                    logger.warning(f"Failed to get WireGuard peer list: {result.stderr}")
-                    logger.info("Trying alternative approach...")
-                
-                if result.returncode == 0:
-                    for line in result.stdout.strip().split('\n')[1:]:
-                        parts = line.split('\t')
-                        if len(parts) >= 3:
-                            existing_key = parts[0]
-                            allowed_ips = parts[3]
-                            # 같은 IP를 가진 다른 피어가 있으면 먼저 제거
-                            if f"{vpn_ip}/32" in allowed_ips and existing_key != public_key:
-                                logger.info(f"기존 피어 제거 중: {existing_key[:8]}... (IP: {vpn_ip})")
-                                self.remove_peer_from_server(existing_key)
+                # 런타임에는 없지만 설정 파일에만 남은 같은 IP의 피어도 제거
+                config = self.config_store.load()
+                stale_key = config.find_by_ip(vpn_ip) if config else None
+                if stale_key and stale_key != public_key:
+                    logger.info(f"설정 파일의 기존 피어 제거 중: {stale_key[:8]}... (IP: {vpn_ip})")
+                    self.remove_peer_from_server(stale_key)
             
-            # 2. 설정 파일에 피어 추가 (먼저 파일 업데이트)
-            # 3. 설정 파일에 피어 추가 전에 중복 확인
-            config_path = "/config/wg_confs/wg0.conf"
-            logger.info(f"Checking config file at {config_path}")
-            if os.path.exists("/var/run/docker.sock"):
-                # 현재 설정 읽기
-                read_cmd = [
-                    "docker", "exec", "wireguard-server",
-                    "cat", config_path
-                ]
-                result = subprocess.run(read_cmd, capture_output=True, text=True)
-                
-                # 실패 시 로그 출력
-                if result.returncode != 0:
-                    logger.error(f"Failed to read config file: {result.stderr}")
-                    logger.info(f"Command was: {' '.join(read_cmd)}")
-                    # 설정 파일 직접 접근 시도
-                    config_mount_path = "./config/wg_confs/wg0.conf"
-                    if os.path.exists(config_mount_path):
-                        logger.info("Trying direct file access...")
-                        with open(config_mount_path, 'r') as f:
-                            config_content = f.read()
-                            if public_key not in config_content:
-                                # 직접 파일에 추가
-                                with open(config_mount_path, 'a') as f:
-                                    f.write(f"\n[Peer]\n")
-                                    f.write(f"# {node_id}\n")
-                                    f.write(f"PublicKey = {public_key}\n")
-                                    f.write(f"AllowedIPs = {vpn_ip}/32\n")
-                                logger.info("Added peer directly to config file")
-                    return
+            # 2. 설정 파일에 피어 추가 (공개키 인덱스로 중복 확인)
+            allowed_ips = f"{vpn_ip}/32"
+            with span("peer.config_write"), self.config_store.edit() as config:
+                if config is None:
+                    raise Exception("설정 파일을 읽을 수 없습니다")
                 
-                # PublicKey가 이미 있는지 확인
-                if result.returncode == 0 and public_key not in result.stdout:
-                    # 설정 파일에 피어 추가 (각 줄을 개별적으로 추가)
+                existing = config.get_peer(public_key)
+                if existing is not None and existing.allowed_ips == [allowed_ips]:
+                    logger.info(f"피어가 이미 설정에 존재함: {public_key[:8]}...")
+                    added = False
+                else:
                     logger.info(f"Adding peer {node_id} to config file...")
                     # 피어의 AllowedIPs 설정 (해당 피어의 고유 IP만)
-                    allowed_ips = f"{vpn_ip}/32"
-                    append_cmds = [
-                        ["docker", "exec", "wireguard-server", "sh", "-c", f"echo '' >> {config_path}"],
-                        ["docker", "exec", "wireguard-server", "sh", "-c", f"echo '[Peer]' >> {config_path}"],
-                        ["docker", "exec", "wireguard-server", "sh", "-c", f"echo '# {node_id}' >> {config_path}"],
-                        ["docker", "exec", "wireguard-server", "sh", "-c", f"echo 'PublicKey = {public_key}' >> {config_path}"],
-                        ["docker", "exec", "wireguard-server", "sh", "-c", f"echo 'AllowedIPs = {allowed_ips}' >> {config_path}"]
-                    ]
-                    for cmd in append_cmds:
-                        result = subprocess.run(cmd, capture_output=True, text=True)
-                        if result.returncode != 0:
-                            logger.error(f"Failed to append to config: {result.stderr}")
-                    
-                    # WireGuard에 피어 추가 (wg set 명령 사용)
-                    logger.info(f"WireGuard에 피어 추가 중...")
-                    
-                    # 먼저 기존 피어 제거 (있을 경우)
-                    remove_cmd = [
-                        "docker", "exec", "wireguard-server",
-                        "wg", "set", self.interface,
-                        "peer", public_key,
-                        "remove"
-                    ]
-                    subprocess.run(remove_cmd, capture_output=True, text=True)
-                    
-                    # 새로 피어 추가
-                    wg_cmd = [
-                        "docker", "exec", "wireguard-server",
-                        "wg", "set", self.interface,
-                        "peer", public_key,
-                        "allowed-ips", allowed_ips
-                    ]
-                    wg_result = subprocess.run(wg_cmd, capture_output=True, text=True)
-                    
-                    if wg_result.returncode != 0:
-                        logger.warning(f"wg set 실패: {wg_result.stderr}")
+                    config.add_peer(PeerEntry(public_key, [allowed_ips], node_id=node_id))
+                    added = True
+            
+            if added:
+                # WireGuard에 피어 추가 (먼저 기존 피어 제거 후 새로 추가)
+                logger.info(f"WireGuard에 피어 추가 중...")
+                with span("peer.runtime_apply"):
+                    self.backend.remove_peer(public_key)
+                    if not self.backend.set_peer(public_key, allowed_ips):
                         # wg set 실패 시 인터페이스 재시작
                         logger.info("WireGuard 인터페이스 재시작 중...")
-                        restart_cmds = [
-                            ["docker", "exec", "wireguard-server", "wg-quick", "down", "wg0"],
-                            ["docker", "exec", "wireguard-server", "wg-quick", "up", "wg0"]
-                        ]
-                        for cmd in restart_cmds:
-                            result = subprocess.run(cmd, capture_output=True, text=True)
-                            if result.returncode != 0:
-                                logger.error(f"재시작 명령 실패: {result.stderr}")
+                        self.backend.restart_interface()
                     else:
                         logger.info(f"피어 추가 성공: {public_key[:8]}...")
-                        
                         # 설정 파일과 동기화
-                        sync_cmd = [
-                            "docker", "exec", "wireguard-server",
-                            "wg", "syncconf", self.interface, config_path
-                        ]
-                        sync_result = subprocess.run(sync_cmd, capture_output=True, text=True)
-                        if sync_result.returncode != 0:
-                            logger.warning(f"Config sync failed: {sync_result.stderr}")
-                else:
-                    logger.info(f"피어가 이미 설정에 존재함: {public_key[:8]}...")
-            else:
-                # 로컬 환경에서 직접 파일 수정
-                logger.info(f"No Docker socket found, trying local file access at {self.server_config}")
-                if not os.path.exists(self.server_config):
-                    logger.error(f"Config file not found at {self.server_config}")
-                    return
-                    
-                with open(self.server_config, 'r') as f:
-                    if public_key not in f.read():
-                        # 피어의 AllowedIPs 설정
-                        allowed_ips = f"{vpn_ip}/16"
-                        with open(self.server_config, 'a') as f:
-                            f.write(f"\n[Peer]\n# {node_id}\nPublicKey = {public_key}\nAllowedIPs = {allowed_ips}\n")
-                
-                # 설정 재로드
-                subprocess.run(["wg", "syncconf", self.interface, self.server_config], 
-                             capture_output=True, text=True)
+                        self.backend.syncconf()
             
-            # 3. 워커 노드(10.100.1.x)인 경우 라우트 추가
-            ip_obj = ipaddress.IPv4Address(vpn_ip)
-            if ip_obj in ipaddress.IPv4Network('10.100.1.0/24'):
+            # 3. 워커 노드(할당 범위)인 경우 라우트 추가
+            if self._needs_route(f"{vpn_ip}/32"):
                 logger.info(f"워커 노드 감지: {vpn_ip}, 라우트 추가 중...")
-                if os.path.exists("/var/run/docker.sock"):
-                    route_cmd = [
-                        "docker", "exec", "wireguard-server",
-                        "ip", "route", "add", f"{vpn_ip}/32", "dev", self.interface
-                    ]
-                else:
-                    route_cmd = [
-                        "ip", "route", "add", f"{vpn_ip}/32", "dev", self.interface
-                    ]
-                
-                route_result = subprocess.run(route_cmd, capture_output=True, text=True)
-                if route_result.returncode == 0:
+                with span("peer.route"):
+                    route_status = self.backend.add_route(f"{vpn_ip}/32")
+                if route_status == ROUTE_ADDED:
                     logger.info(f"라우트 추가 성공: {vpn_ip}")
-                elif "File exists" in route_result.stderr:
+                elif route_status == ROUTE_EXISTS:
                     logger.info(f"라우트 이미 존재: {vpn_ip}")
-                else:
-                    logger.warning(f"라우트 추가 실패: {route_result.stderr}")
             
+            wg_snapshot.invalidate()
             logger.info(f"피어 추가 성공: {node_id} ({vpn_ip})")
             
+        except CircuitOpenError:
+            raise
         except Exception as e:
             logger.error(f"피어 추가 실패: {e}")
             logger.error(f"Exception type: {type(e).__name__}")
@@ -395,366 +254,398 @@ PersistentKeepalive = 25
             logger.error(f"Traceback: {traceback.format_exc()}")
             raise Exception(f"피어 추가 실패: {str(e)}")
     
-    def remove_peer_from_server(self, public_key: str):
-        """서버에서 피어 제거 및 설정 파일에서도 완전히 삭제"""
+    @serialized
+    def apply_peers(self, nodes: List[Dict], prune: bool = False) -> Dict:
+        """
+        피어 목록을 한 번에 적용 (sync-all, 시작 시 자동 동기화, 일괄 등록용)
+        설정 파일 1회 기록 + `wg syncconf` 1회 + 라우트 일괄 추가
+        nodes: [{"node_id", "public_key", "vpn_ip"}, ...]
+        prune=False (기본): 기존 피어 유지, 같은 IP를 가진 다른 키의 피어만 교체 (추가 적용)
+        prune=True: 목록에 없는 피어 제거 (전체 목록 적용, 적용할 피어가 하나도 없으면 거부)
+        목록에 없는 피어 정리는 기본적으로 reconciler의 diff에 맡깁니다.
+        """
+        started = time.monotonic()
+        results = []
+        desired: Dict[str, PeerEntry] = {}
+        
+        for node in nodes:
+            result = {"node_id": node["node_id"], "vpn_ip": node["vpn_ip"]}
+            results.append(result)
+            public_key = node.get("public_key")
+            vpn_ip = node.get("vpn_ip")
+            if not public_key or public_key == "pending" or not vpn_ip or vpn_ip == "0.0.0.0":
+                result.update(status="skipped", error="VPN 설정 전 노드")
+                continue
+            try:
+                ipaddress.IPv4Address(vpn_ip)
+            except ValueError as e:
+                result.update(status="failed", error=str(e))
+                continue
+            desired[public_key] = PeerEntry(public_key, [f"{vpn_ip}/32"], node_id=node["node_id"])
+            result["status"] = "pending"
+        
+        if prune and not desired:
+            # 빈 DB나 일부만 읽힌 결과로 모든 피어를 지우지 않도록 보호
+            raise ValueError("적용할 피어가 없어 prune을 거부합니다")
+        
+        removed = 0
         try:
-            # 1. 런타임에서 피어 제거
-            if os.path.exists("/var/run/docker.sock"):
-                cmd = [
-                    "docker", "exec", "wireguard-server",
-                    "wg", "set", self.interface,
-                    "peer", public_key,
-                    "remove"
-                ]
-            else:
-                cmd = [
-                    "wg", "set", self.interface,
-                    "peer", public_key,
-                    "remove"
-                ]
+            # 1. 설정 파일을 원하는 피어 목록으로 교체 (기존 피어의 추가 옵션은 유지)
+            with self.config_store.edit() as config:
+                if config is None:
+                    raise Exception("설정 파일을 읽을 수 없습니다")
+                if prune:
+                    for public_key in list(config.peers):
+                        if public_key not in desired:
+                            config.remove_peer(public_key)
+                            removed += 1
+                else:
+                    for public_key, peer in desired.items():
+                        stale_key = config.find_by_ip(peer.allowed_ips[0])
+                        if stale_key and stale_key != public_key:
+                            config.remove_peer(stale_key)
+                            removed += 1
+                for public_key, peer in desired.items():
+                    existing = config.get_peer(public_key)
+                    if existing is not None and existing.allowed_ips == peer.allowed_ips:
+                        if existing.node_id != peer.node_id:
+                            existing.node_id = peer.node_id
+                            config.dirty = True
+                        continue
+                    if existing is not None:
+                        peer.options = existing.options
+                    config.add_peer(peer)
             
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            if result.returncode != 0:
-                logger.warning(f"wg set remove 경고: {result.stderr}")
+            # 2. 런타임에 한 번에 반영
+            if not self.backend.syncconf():
+                raise Exception("wg syncconf 실패")
+        except Exception as e:
+            logger.error(f"피어 일괄 적용 실패: {e}")
+            for result in results:
+                if result["status"] == "pending":
+                    result.update(status="failed", error=str(e))
+            wg_snapshot.invalidate()
+            return self._bulk_summary(results, removed, started)
+        
+        # 3. 워커 노드 라우트 일괄 추가
+        route_cidrs = [
+            peer.allowed_ips[0] for peer in desired.values() if self._needs_route(peer.allowed_ips[0])
+        ]
+        route_statuses = self.backend.add_routes(route_cidrs)
+        
+        for result in results:
+            if result["status"] != "pending":
+                continue
+            result["status"] = "synced"
+            route_status = route_statuses.get(f"{result['vpn_ip']}/32")
+            if route_status:
+                result["route"] = route_status
+        
+        wg_snapshot.invalidate()
+        return self._bulk_summary(results, removed, started)
+    
+    def _bulk_summary(self, results: List[Dict], removed: int, started: float) -> Dict:
+        summary = {
+            "results": results,
+            "synced": sum(1 for r in results if r["status"] == "synced"),
+            "failed": sum(1 for r in results if r["status"] == "failed"),
+            "skipped": sum(1 for r in results if r["status"] == "skipped"),
+            "removed_peers": removed,
+            "elapsed_seconds": round(time.monotonic() - started, 3)
+        }
+        logger.info(
+            f"피어 일괄 적용: {summary['synced']} synced, {summary['failed']} failed, "
+            f"{summary['skipped']} skipped, {removed} removed ({summary['elapsed_seconds']}s)"
+        )
+        return summary
+    
+    @staticmethod
+    def _needs_route(cidr: str) -> bool:
+        """워커 노드 할당 범위(WG_IP_RANGES) 안의 주소인지 확인"""
+        return ip_allocator.contains_network(cidr)
+    
+    def remove_peer_from_server(self, public_key: str):
+        """서버에서 피어 제거 및 설정 파일에서도 완전히 삭제 (인터페이스 재시작 없음)"""
+        self.remove_peers_from_server([public_key])
+    
+    @serialized
+    def remove_peers_from_server(self, public_keys: List[str]) -> int:
+        """
+        여러 피어를 런타임과 설정 파일에서 제거
+        `wg set ... remove`만 사용하므로 다른 피어의 터널/세션은 유지됩니다.
+        """
+        public_keys = [key for key in public_keys if key and key != "pending"]
+        if not public_keys:
+            return 0
+        
+        try:
+            # 1. 런타임에서 피어 제거 (명령 1회)
+            self.backend.remove_peers(public_keys)
             
-            # 2. 설정 파일에서 피어 섹션 완전히 제거
-            config_path = "/config/wg_confs/wg0.conf"
-            if os.path.exists("/var/run/docker.sock"):
-                # Docker 환경: 설정 파일 읽기
-                read_cmd = [
-                    "docker", "exec", "wireguard-server",
-                    "cat", config_path
-                ]
-                result = subprocess.run(read_cmd, capture_output=True, text=True)
-                if result.returncode == 0:
-                    config_lines = result.stdout.splitlines()
-                    new_config = []
-                    skip_peer = False
-                    
-                    for line in config_lines:
-                        # 해당 PublicKey를 가진 [Peer] 섹션 찾기
-                        if line.strip() == "[Peer]":
-                            # 다음 줄들을 확인하여 이 피어인지 확인
-                            peer_section = [line]
-                            for i in range(config_lines.index(line) + 1, len(config_lines)):
-                                next_line = config_lines[i]
-                                if next_line.strip().startswith("PublicKey") and public_key in next_line:
-                                    skip_peer = True
-                                    break
-                                elif next_line.strip() == "[Peer]" or next_line.strip().startswith("["):
-                                    break
-                                peer_section.append(next_line)
-                            
-                            if not skip_peer:
-                                new_config.extend(peer_section)
-                        elif skip_peer:
-                            # 이 피어 섹션 건너뛰기
-                            if line.strip() == "" or line.strip().startswith("["):
-                                skip_peer = False
-                                if line.strip() != "":
-                                    new_config.append(line)
-                        else:
-                            new_config.append(line)
-                    
-                    # 새 설정을 파일에 쓰기
-                    new_config_str = "\n".join(new_config)
-                    write_cmd = [
-                        "docker", "exec", "wireguard-server",
-                        "sh", "-c",
-                        f"echo '{new_config_str}' > {config_path}"
-                    ]
-                    subprocess.run(write_cmd, capture_output=True, text=True)
-                    
-                    # WireGuard 재시작으로 설정 적용
-                    restart_cmd = [
-                        "docker", "exec", "wireguard-server",
-                        "wg-quick", "down", "wg0"
-                    ]
-                    subprocess.run(restart_cmd, capture_output=True, text=True)
-                    
-                    restart_cmd = [
-                        "docker", "exec", "wireguard-server",
-                        "wg-quick", "up", "wg0"
-                    ]
-                    subprocess.run(restart_cmd, capture_output=True, text=True)
+            # 2. 설정 파일에서 피어 섹션 제거 (원자적 기록 1회)
+            removed = 0
+            with self.config_store.edit() as config:
+                if config is not None:
+                    removed = sum(1 for key in public_keys if config.remove_peer(key))
             
-            logger.info(f"피어 완전 제거 성공: {public_key[:8]}...")
+            wg_snapshot.invalidate()
+            logger.info(f"피어 완전 제거 성공: {len(public_keys)}개 (설정 파일 {removed}개)")
+            return removed
             
         except Exception as e:
             logger.error(f"피어 제거 실패: {e}")
             raise Exception(f"피어 제거 실패: {str(e)}")
     
     def get_peer_status(self, public_key: str) -> Dict:
-        """특정 피어의 상태 조회"""
-        try:
-            # Docker 컨테이너에서 실행하는 경우
-            if os.path.exists("/var/run/docker.sock"):
-                result = subprocess.run(
-                    ["docker", "exec", "wireguard-server", "wg", "show", self.interface, "dump"],
-                    capture_output=True,
-                    text=True
-                )
-            else:
-                result = subprocess.run(
-                    ["wg", "show", self.interface, "dump"],
-                    capture_output=True,
-                    text=True
-                )
-            
-            # dump 형식 파싱
-            for line in result.stdout.strip().split('\n')[1:]:  # 첫 줄은 인터페이스 정보
-                parts = line.split('\t')
-                if len(parts) >= 8 and parts[0] == public_key:
-                    last_handshake_ts = int(parts[4]) if parts[4] != '0' else 0
-                    return {
-                        "connected": last_handshake_ts > 0,
-                        "last_handshake": datetime.fromtimestamp(last_handshake_ts) if last_handshake_ts > 0 else None,
-                        "bytes_received": int(parts[5]),
-                        "bytes_sent": int(parts[6])
-                    }
-            
-            # 피어를 찾지 못한 경우
-            return {
-                "connected": False,
-                "last_handshake": None,
-                "bytes_received": 0,
-                "bytes_sent": 0
-            }
-            
-        except Exception as e:
-            logger.error(f"피어 상태 조회 실패: {e}")
-            return {
-                "connected": False,
-                "last_handshake": None,
-                "bytes_received": 0,
-                "bytes_sent": 0
-            }
+        """특정 피어의 상태 조회 (공유 런타임 스냅샷 사용)"""
+        return wg_snapshot.get().peer_status(public_key)
     
+    @serialized
     def _ensure_server_subnet(self):
-        """서버 설정의 서브넷 마스크가 올바른지 확인하고 수정"""
+        """서버 설정의 서브넷 마스크가 올바른지 확인하고 수정 (파일이 바뀐 경우에만 다시 읽음)"""
         try:
-            if os.path.exists("/var/run/docker.sock"):
-                # 설정 파일 읽기
-                read_cmd = [
-                    "docker", "exec", "wireguard-server",
-                    "cat", "/config/wg_confs/wg0.conf"
-                ]
-                result = subprocess.run(read_cmd, capture_output=True, text=True)
+            with self.config_store.edit() as config:
+                if config is None:
+                    return
                 
-                if result.returncode == 0:
-                    config_content = result.stdout
-                    
-                    # Address 라인에 /16이 없으면 추가
-                    if "Address = 10.100.0.1\n" in config_content or "Address = 10.100.0.1 " in config_content:
-                        logger.info("Fixing server subnet mask to /16")
-                        
-                        # sed로 수정
-                        fix_cmd = [
-                            "docker", "exec", "wireguard-server", "sh", "-c",
-                            "sed -i 's/^Address = 10.100.0.1$/Address = 10.100.0.1\/16/' /config/wg_confs/wg0.conf"
-                        ]
-                        subprocess.run(fix_cmd, capture_output=True, text=True)
-                        
-                        # WireGuard 재시작
-                        restart_cmds = [
-                            ["docker", "exec", "wireguard-server", "wg-quick", "down", "wg0"],
-                            ["docker", "exec", "wireguard-server", "wg-quick", "up", "wg0"]
-                        ]
-                        for cmd in restart_cmds:
-                            subprocess.run(cmd, capture_output=True, text=True)
-                        
-                        logger.info("Server subnet mask fixed and WireGuard restarted")
+                # Address에 /16이 없으면 추가
+                if config.interface_value("Address") != "10.100.0.1":
+                    return
+                
+                logger.info("Fixing server subnet mask to /16")
+                config.set_interface_value("Address", "10.100.0.1/16")
+            
+            # WireGuard 재시작
+            self.backend.restart_interface()
+            
+            logger.info("Server subnet mask fixed and WireGuard restarted")
         except Exception as e:
             logger.warning(f"Failed to ensure server subnet: {e}")
     
-    def get_server_status(self) -> Dict:
-        """WireGuard 서버 전체 상태 조회"""
-        try:
-            # Docker 컨테이너에서 실행하는 경우
-            if os.path.exists("/var/run/docker.sock"):
-                result = subprocess.run(
-                    ["docker", "exec", "wireguard-server", "wg", "show", self.interface],
-                    capture_output=True,
-                    text=True
-                )
-            else:
-                result = subprocess.run(
-                    ["wg", "show", self.interface],
-                    capture_output=True,
-                    text=True
-                )
-            
-            interface_info = {}
-            peers = []
-            current_peer = None
-            
-            # 출력 파싱
-            for line in result.stdout.strip().split('\n'):
-                if line.startswith('interface:'):
-                    interface_info['interface'] = line.split(':')[1].strip()
-                elif line.startswith('  public key:'):
-                    interface_info['public_key'] = line.split(':')[1].strip()
-                elif line.startswith('  private key:'):
-                    interface_info['private_key'] = '(hidden)'
-                elif line.startswith('  listening port:'):
-                    interface_info['port'] = line.split(':')[1].strip()
-                elif line.startswith('peer:'):
-                    if current_peer:
-                        peers.append(current_peer)
-                    current_peer = {'public_key': line.split(':')[1].strip()}
-                elif current_peer:
-                    if line.startswith('  endpoint:'):
-                        current_peer['endpoint'] = line.split(':', 1)[1].strip()
-                    elif line.startswith('  allowed ips:'):
-                        current_peer['allowed_ips'] = line.split(':', 1)[1].strip()
-                    elif line.startswith('  latest handshake:'):
-                        current_peer['latest_handshake'] = line.split(':', 1)[1].strip()
-                    elif line.startswith('  transfer:'):
-                        current_peer['transfer'] = line.split(':', 1)[1].strip()
-            
-            if current_peer:
-                peers.append(current_peer)
-            
-            return {
-                "interface": interface_info,
-                "peers": peers,
-                "peer_count": len(peers),
-                "status": "running"
-            }
-            
-        except subprocess.CalledProcessError as e:
-            logger.error(f"서버 상태 조회 실패: {e}")
+    def get_server_status(self, snapshot=None) -> Dict:
+        """WireGuard 서버 전체 상태 조회 (공유 런타임 스냅샷 사용)"""
+        snapshot = snapshot or wg_snapshot.get()
+        if not snapshot.ok:
             return {
-                "error": f"WireGuard 상태 조회 실패: {str(e)}",
+                "error": f"WireGuard 상태 조회 실패: {snapshot.error}",
                 "interface": {},
                 "peers": [],
                 "peer_count": 0,
                 "status": "error"
             }
-        except Exception as e:
-            logger.error(f"예상치 못한 오류: {e}")
-            return {
-                "error": f"오류 발생: {str(e)}",
-                "interface": {},
-                "peers": [],
-                "peer_count": 0,
-                "status": "error"
+        
+        interface_info = {
+            "interface": self.interface,
+            "public_key": snapshot.interface.get("public_key"),
+            "private_key": "(hidden)",
+            "port": str(snapshot.interface.get("listen_port") or "")
+        }
+        
+        # `wg show` 출력과 같은 형식으로 피어 정보 구성
+        now = time.time()
+        peers = []
+        for peer in snapshot.peers.values():
+            current_peer = {
+                "public_key": peer["public_key"],
+                "allowed_ips": ", ".join(peer["allowed_ips"]) or "(none)"
             }
+            if peer["endpoint"]:
+                current_peer["endpoint"] = peer["endpoint"]
+            if peer["latest_handshake"] > 0:
+                current_peer["latest_handshake"] = _format_handshake_age(now - peer["latest_handshake"])
+            if peer["rx_bytes"] or peer["tx_bytes"]:
+                current_peer["transfer"] = (
+                    f"{_format_bytes(peer['rx_bytes'])} received, {_format_bytes(peer['tx_bytes'])} sent"
+                )
+            peers.append(current_peer)
+        
+        return {
+            "interface": interface_info,
+            "peers": peers,
+            "peer_count": len(peers),
+            "status": "running"
+        }
     
+    @serialized
     def fix_peer_allowed_ips(self):
         """기존 피어들의 AllowedIPs를 /16에서 /32로 수정"""
         try:
             fixed_count = 0
-            config_path = "/config/wg_confs/wg0.conf"
             
-            if os.path.exists("/var/run/docker.sock"):
-                # 1. 현재 설정 파일 읽기
-                read_cmd = ["docker", "exec", "wireguard-server", "cat", config_path]
-                result = subprocess.run(read_cmd, capture_output=True, text=True)
-                
-                if result.returncode != 0:
-                    logger.error(f"Failed to read config: {result.stderr}")
+            # 1. 현재 설정 모델에서 /16 피어 수정
+            with self.config_store.edit() as config:
+                if config is None:
                     return {"error": "Failed to read config", "fixed": 0}
                 
-                # 2. 설정 파일 내용 수정
-                lines = result.stdout.split('\n')
-                new_lines = []
-                
-                for line in lines:
-                    if line.strip().startswith('AllowedIPs'):
-                        # AllowedIPs 라인 파싱
-                        parts = line.split('=')
-                        if len(parts) == 2:
-                            ips = parts[1].strip()
-                            # /16을 /32로 변경
-                            if '/16' in ips:
-                                # IP 주소 추출
-                                ip_addr = ips.split('/')[0].strip()
-                                new_line = f"AllowedIPs = {ip_addr}/32"
-                                new_lines.append(new_line)
-                                fixed_count += 1
-                                logger.info(f"Fixed AllowedIPs: {ips} -> {ip_addr}/32")
-                            else:
-                                new_lines.append(line)
-                        else:
-                            new_lines.append(line)
-                    else:
-                        new_lines.append(line)
-                
-                # 3. 수정된 내용을 파일에 쓰기
-                if fixed_count > 0:
-                    new_content = '\n'.join(new_lines)
-                    
-                    # 임시 파일에 쓰기
-                    write_cmd = [
-                        "docker", "exec", "wireguard-server", "sh", "-c",
-                        f"cat > {config_path}.tmp << 'EOF'\n{new_content}\nEOF"
-                    ]
-                    result = subprocess.run(write_cmd, capture_output=True, text=True)
-                    
-                    if result.returncode == 0:
-                        # 원본 파일 교체
-                        mv_cmd = [
-                            "docker", "exec", "wireguard-server",
-                            "mv", f"{config_path}.tmp", config_path
-                        ]
-                        subprocess.run(mv_cmd, capture_output=True, text=True)
-                        
-                        # 4. WireGuard 설정 다시 로드
-                        reload_cmd = [
-                            "docker", "exec", "wireguard-server",
-                            "wg", "syncconf", "wg0", config_path
-                        ]
-                        reload_result = subprocess.run(reload_cmd, capture_output=True, text=True)
-                        
-                        if reload_result.returncode != 0:
-                            # syncconf 실패 시 재시작
-                            logger.warning("syncconf failed, restarting interface...")
-                            restart_cmds = [
-                                ["docker", "exec", "wireguard-server", "wg-quick", "down", "wg0"],
-                                ["docker", "exec", "wireguard-server", "wg-quick", "up", "wg0"]
-                            ]
-                            for cmd in restart_cmds:
-                                subprocess.run(cmd, capture_output=True, text=True)
-                        
-                        logger.info(f"Fixed {fixed_count} peer(s) AllowedIPs configuration")
-                        return {"success": True, "fixed": fixed_count}
-                    else:
-                        logger.error(f"Failed to write new config: {result.stderr}")
-                        return {"error": "Failed to write config", "fixed": 0}
-                else:
-                    logger.info("No peers with /16 subnet found, all configs are correct")
-                    return {"success": True, "fixed": 0, "message": "All peers already have correct AllowedIPs"}
-            else:
-                # 로컬 파일 시스템 직접 접근
-                config_mount_path = "./config/wg_confs/wg0.conf"
-                if os.path.exists(config_mount_path):
-                    with open(config_mount_path, 'r') as f:
-                        content = f.read()
-                    
-                    # /16을 /32로 변경
-                    import re
-                    pattern = r'AllowedIPs\s*=\s*(\d+\.\d+\.\d+\.\d+)/16'
-                    matches = re.findall(pattern, content)
-                    
-                    if matches:
-                        for ip in matches:
-                            old_pattern = f"{ip}/16"
-                            new_pattern = f"{ip}/32"
-                            content = content.replace(old_pattern, new_pattern)
+                for peer in list(config.peers.values()):
+                    fixed_ips = []
+                    for ip in peer.allowed_ips:
+                        if ip.endswith('/16'):
+                            ip_addr = ip.split('/')[0]
+                            logger.info(f"Fixed AllowedIPs: {ip} -> {ip_addr}/32")
+                            ip = f"{ip_addr}/32"
                             fixed_count += 1
-                            logger.info(f"Fixed: {old_pattern} -> {new_pattern}")
-                        
-                        # 파일 저장
-                        with open(config_mount_path, 'w') as f:
-                            f.write(content)
-                        
-                        return {"success": True, "fixed": fixed_count}
-                    else:
-                        return {"success": True, "fixed": 0, "message": "No /16 subnets found"}
-                else:
-                    return {"error": "Config file not found", "fixed": 0}
+                        fixed_ips.append(ip)
+                    if fixed_ips != peer.allowed_ips:
+                        config.set_allowed_ips(peer.public_key, fixed_ips)
+            
+            if fixed_count == 0:
+                logger.info("No peers with /16 subnet found, all configs are correct")
+                return {"success": True, "fixed": 0, "message": "All peers already have correct AllowedIPs"}
+            
+            # 2. WireGuard 설정 다시 로드
+            if not self.backend.syncconf():
+                # syncconf 실패 시 재시작
+                logger.warning("syncconf failed, restarting interface...")
+                self.backend.restart_interface()
+            
+            wg_snapshot.invalidate()
+            logger.info(f"Fixed {fixed_count} peer(s) AllowedIPs configuration")
+            return {"success": True, "fixed": fixed_count}
                     
         except Exception as e:
             logger.error(f"Error fixing peer AllowedIPs: {e}")
-            return {"error": str(e), "fixed": 0}
\ No newline at end of file
+            return {"error": str(e), "fixed": 0}
+
+
+# 동시에 실행할 WireGuard 변경 작업 수와 호출별 제한 시간 (초)
+WG_MAX_CONCURRENCY = int(os.getenv("WG_MAX_CONCURRENCY", "4"))
+WG_CALL_TIMEOUT = float(os.getenv("WG_CALL_TIMEOUT", "30"))
+WG_BULK_TIMEOUT = float(os.getenv("WG_BULK_TIMEOUT", "120"))
+
+
+class AsyncWireGuardManager:
+    """
+    FastAPI 엔드포인트용 비동기 WireGuard 관리 클래스
+    상태 조회는 비동기 스냅샷(create_subprocess_exec 또는 UAPI)을 사용하고, 피어 변경은 스레드 풀에서
+    동시 실행 수 제한과 호출별 제한 시간 아래 실행하여 느린 `docker exec`가 이벤트 루프를 막지 않도록 합니다.
+    제한 시간이 지나면 호출자는 TimeoutError를 받고, 이미 시작된 작업은 스레드에서 끝까지 실행됩니다.
+    세마포어 자리는 호출자가 아니라 스레드 작업이 실제로 끝날 때 반환되므로 시간 초과 후에도 동시 실행 수가 유지됩니다.
+    """
+    
+    def __init__(self, manager: Optional[WireGuardManager] = None,
+                 concurrency: int = WG_MAX_CONCURRENCY, timeout: float = WG_CALL_TIMEOUT):
+        self.manager = manager or WireGuardManager()
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(concurrency)
+    
+    async def run(self, func, *args, timeout: Optional[float] = None, **kwargs):
+        """
+        블로킹 WireGuard 작업을 동시성 제한/제한 시간 아래 스레드 풀에서 실행
+        브레이커가 열려 있으면 세마포어 대기열에 들어가기 전에 CircuitOpenError로 즉시 실패
+        """
+        wireguard_breaker.check()
+        await self._semaphore.acquire()
+        try:
+            future = asyncio.ensure_future(asyncio.to_thread(func, *args, **kwargs))
+        except BaseException:
+            self._semaphore.release()
+            raise
+        # 호출자가 시간 초과/취소로 떠나도 스레드 작업이 끝날 때까지 자리를 유지
+        future.add_done_callback(lambda _: self._semaphore.release())
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"{getattr(func, '__name__', 'WireGuard 작업')} 시간 초과 ({timeout or self.timeout}s)")
+    
+    # --- 조회 (이벤트 루프 안에서 완료) ---
+    async def get_peer_status(self, public_key: str) -> Dict:
+        return (await wg_snapshot.aget()).peer_status(public_key)
+    
+    async def get_server_status(self) -> Dict:
+        return self.manager.get_server_status(await wg_snapshot.aget())
+    
+    async def identity(self):
+        """서버 identity (최초 조회/키 변경 시에만 스레드에서 파일/인터페이스 조회)"""
+        return await asyncio.to_thread(server_identity.get)
+    
+    async def get_server_public_key(self) -> str:
+        return (await self.identity()).public_key
+    
+    async def get_server_endpoint(self) -> str:
+        return (await self.identity()).endpoint
+    
+    async def generate_client_config(self, private_key: str, client_ip: str,
+                                     server_public_key: str = None) -> str:
+        await self.identity()
+        return self.manager.generate_client_config(private_key, client_ip, server_public_key)
+    
+    async def create_peer_config(self, node_id: str, vpn_ip: str,
+                                 private_key: str, public_key: str) -> str:
+        await self.identity()
+        return self.manager.create_peer_config(node_id, vpn_ip, private_key, public_key)
+    
+    # --- IP 할당 (AsyncSession의 트랜잭션 안에서 동기 할당기 실행) ---
+    async def allocate_ip(self, db, node_type: str = "worker") -> Optional[str]:
+        """
+        호출자의 AsyncSession 트랜잭션 안에서 IP 할당 (풀 잠금은 호출자의 커밋까지 유지)
+        run_sync는 같은 연결에서 실행되므로 advisory lock 대기 중에도 이벤트 루프는 막히지 않습니다.
+        """
+        try:
+            vpn_ip = await db.run_sync(ip_allocator.allocate)
+        except Exception as e:
+            logger.error(f"IP 할당 실패: {e}")
+            ip_allocator.invalidate()
+            raise
+        if vpn_ip:
+            logger.info(f"IP 할당 완료: {vpn_ip}")
+        return vpn_ip
+    
+    async def allocate_ips(self, db, count: int) -> List[str]:
+        """일괄 등록용 IP count개 할당 (풀 부족 시 빈 목록, 호출자의 트랜잭션 안에서)"""
+        try:
+            return await db.run_sync(ip_allocator.allocate_many, count)
+        except Exception as e:
+            logger.error(f"IP 일괄 할당 실패: {e}")
+            ip_allocator.invalidate()
+            raise
+    
+    async def release_ip(self, db, vpn_ip: Optional[str]):
+        """노드 삭제 시 IP 반환 (호출자의 AsyncSession에 기록, 호출자가 커밋)"""
+        try:
+            await db.run_sync(ip_allocator.release_many, [vpn_ip])
+        except Exception as e:
+            logger.warning(f"IP 반환 실패 ({vpn_ip}): {e}")
+            ip_allocator.invalidate()
+    
+    async def release_ips(self, db, vpn_ips: List[Optional[str]]):
+        """여러 노드 삭제 시 IP 일괄 반환 (한 번의 풀 잠금/기록)"""
+        try:
+            await db.run_sync(ip_allocator.release_many, vpn_ips)
+        except Exception as e:
+            logger.warning(f"IP 일괄 반환 실패: {e}")
+            ip_allocator.invalidate()
+    
+    def generate_keypair(self) -> Dict[str, str]:
+        return self.manager.generate_keypair()
+    
+    async def generate_keypairs(self, count: int) -> List[Dict[str, str]]:
+        """일괄 등록용 키 쌍 count개 (풀이 비면 생성이 이어지므로 스레드에서)"""
+        return await asyncio.to_thread(lambda: [self.manager.generate_keypair() for _ in range(count)])
+    
+    # --- 변경 (스레드 풀, 동시성 제한) ---
+    async def add_peer_to_server(self, public_key: str, vpn_ip: str, node_id: str):
+        return await self.run(self.manager.add_peer_to_server, public_key, vpn_ip, node_id)
+    
+    async def add_peers_to_server(self, nodes: List[Dict]) -> Dict:
+        """여러 피어를 기존 피어를 유지한 채 설정 1회 기록 + syncconf 1회로 추가"""
+        return await self.apply_peers(nodes, prune=False)
+    
+    async def apply_peers(self, nodes: List[Dict], prune: bool = False) -> Dict:
+        return await self.run(self.manager.apply_peers, nodes, prune, timeout=WG_BULK_TIMEOUT)
+    
+    async def remove_peer_from_server(self, public_key: str):
+        return await self.run(self.manager.remove_peer_from_server, public_key)
+    
+    async def remove_peers_from_server(self, public_keys: List[str]) -> int:
+        return await self.run(self.manager.remove_peers_from_server, public_keys)
+    
+    async def fix_peer_allowed_ips(self):
+        return await self.run(self.manager.fix_peer_allowed_ips)
+    
+    async def ensure_server_subnet(self):
+        return await self.run(self.manager._ensure_server_subnet)
+
+
+# 전역 비동기 매니저 (동시성 제한을 프로세스 전체에서 공유)
+async_wg_manager = AsyncWireGuardManager()
@@ -0,0 +1,292 @@
+"""
+WireGuard 피어 desired-state reconciler
+DB(원하는 상태), wg0.conf(파싱 모델), 런타임 dump 세 곳의 피어 집합(공개키 -> AllowedIPs)을 비교하여
+차이가 나는 피어에 대해서만 `wg set` 추가/제거/갱신과 설정 파일 1회 기록을 수행합니다.
+변경이 없을 때는 dump 1회와 해시 비교만 수행합니다 (설정 파일은 버전이 바뀔 때만 파싱하고,
+DB는 노드 변경(fleet_revision)이 있거나 차이가 발견될 때만 조회).
+"""
+
+import asyncio
+import hashlib
+import os
+import time
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from fleet_revision import fleet_revision
+from metrics import TaskTimer
+from models import Node
+from wireguard_backend import get_backend
+from wireguard_config import PeerEntry, wg_config_store
+from wireguard_manager import WireGuardManager, peer_mutation_lock
+from wireguard_snapshot import wg_snapshot
+
+logger = logging.getLogger(__name__)
+
+PeerSet = Dict[str, List[str]]
+
+# 캐시된 DB 피어 집합의 최대 사용 시간 (초): fleet_revision은 프로세스 단위이므로
+# 다른 프로세스의 노드 변경도 이 시간 안에는 반영되도록 주기적으로 다시 읽음
+DESIRED_CACHE_MAX_AGE = 600.0
+
+
+def peer_set_hash(peers: PeerSet) -> str:
+    """피어 집합의 순서 무관 해시"""
+    digest = hashlib.sha256()
+    for public_key in sorted(peers):
+        digest.update(public_key.encode())
+        digest.update(b"=")
+        digest.update(",".join(sorted(peers[public_key])).encode())
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+def diff_peer_sets(desired: PeerSet, actual: PeerSet) -> Dict[str, List[str]]:
+    """actual을 desired로 만들기 위한 최소 변경 (공개키 목록)"""
+    add = [key for key in desired if key not in actual]
+    remove = [key for key in actual if key not in desired]
+    update = [
+        key for key in desired
+        if key in actual and sorted(desired[key]) != sorted(actual[key])
+    ]
+    return {"add": add, "remove": remove, "update": update}
+
+
+def desired_peer_query():
+    """
+    WireGuard에 있어야 하는 노드 (reconciler, 시작 시 동기화, sync-all이 같은 기준 사용)
+    비활성화된 노드는 제외합니다. 키/IP가 아직 없는 노드는 apply_peers와 desired_peers가 건너뜁니다.
+    """
+    return select(Node.node_id, Node.public_key, Node.vpn_ip).where(Node.status != "deactivated")
+
+
+def peer_nodes(rows) -> List[Dict]:
+    """desired_peer_query() 결과 -> apply_peers 입력"""
+    return [{"node_id": row.node_id, "public_key": row.public_key, "vpn_ip": row.vpn_ip} for row in rows]
+
+
+class PeerReconciler:
+    """DB 기준으로 WireGuard 설정/런타임 드리프트를 주기적으로 수정"""
+
+    def __init__(self):
+        self.interval = float(os.getenv("WG_RECONCILE_INTERVAL", "60"))
+        # 주기 실행 한 번에 제거할 수 있는 최대 피어 수 (수동 실행은 제한 없음)
+        self.max_removals = int(os.getenv("WG_RECONCILE_MAX_REMOVALS", "10"))
+        self.running = False
+        self.last_run: Optional[Dict] = None
+        # 정상 상태에서 DB 조회/설정 파일 파싱을 생략하기 위한 캐시
+        self._desired_cache: Optional[Dict] = None
+        self._config_cache: Optional[Dict] = None
+
+    def desired_peers(self, db: Session) -> Dict[str, Dict]:
+        """DB의 활성 노드 -> {공개키: {"node_id", "allowed_ips"}}"""
+        rows = db.execute(desired_peer_query()).all()
+        desired = {}
+        for node_id, public_key, vpn_ip in rows:
+            if not public_key or public_key == "pending" or not vpn_ip or vpn_ip == "0.0.0.0":
+                continue
+            desired[public_key] = {"node_id": node_id, "allowed_ips": [f"{vpn_ip}/32"]}
+        return desired
+
+    def reconcile(self, db: Session, dry_run: bool = False, on_demand: bool = False) -> Dict:
+        """
+        차이 계산 후 (dry_run이 아니면) 최소 변경만 적용
+        피어 변경 잠금을 끝까지 보유하고, 런타임/설정 파일을 읽은 뒤에 DB를 읽습니다.
+        등록은 노드 커밋 후 피어를 추가하므로, 조회 시점의 런타임/설정 파일에 있는 피어는 DB에도 보입니다.
+        주기 실행(on_demand=False)은 DB 결과가 비어 있거나 제거할 피어가 max_removals를 넘으면 제거를 보류합니다.
+        """
+        with peer_mutation_lock:
+            return self._reconcile(db, dry_run, on_demand)
+
+    def _config_peers(self) -> Optional[Dict]:
+        """설정 파일 피어 집합과 해시 (파일 버전이 같으면 다시 파싱하지 않음)"""
+        version = wg_config_store.version()
+        cached = self._config_cache
+        if version is not None and cached is not None and cached["version"] == version:
+            return cached
+        config = wg_config_store.load()
+        if config is None:
+            return None
+        peers: PeerSet = {key: peer.allowed_ips for key, peer in config.peers.items()}
+        self._config_cache = {"version": version, "peers": peers, "hash": peer_set_hash(peers)}
+        return self._config_cache
+
+    def _desired(self, db: Session) -> Dict:
+        """DB 피어 집합과 해시 (항상 DB에서 새로 읽음)"""
+        revision = fleet_revision.revision
+        nodes = self.desired_peers(db)
+        peers: PeerSet = {key: info["allowed_ips"] for key, info in nodes.items()}
+        self._desired_cache = {
+            "revision": revision,
+            "loaded_at": time.monotonic(),
+            "nodes": nodes,
+            "peers": peers,
+            "hash": peer_set_hash(peers)
+        }
+        return self._desired_cache
+
+    def _cached_desired(self) -> Optional[Dict]:
+        """노드 변경이 없었고 오래되지 않은 DB 피어 집합 캐시"""
+        cached = self._desired_cache
+        if cached is None or cached["revision"] != fleet_revision.revision:
+            return None
+        if time.monotonic() - cached["loaded_at"] > DESIRED_CACHE_MAX_AGE:
+            return None
+        return cached
+
+    def _reconcile(self, db: Session, dry_run: bool, on_demand: bool) -> Dict:
+        started = time.monotonic()
+
+        snapshot = wg_snapshot.get(max_age=0)
+        if not snapshot.ok:
+            return self._finish({"success": False, "error": snapshot.error, "dry_run": dry_run}, started)
+        runtime: PeerSet = {key: peer["allowed_ips"] for key, peer in snapshot.peers.items()}
+        runtime_hash = peer_set_hash(runtime)
+
+        config_state = self._config_peers()
+        if config_state is None:
+            return self._finish({"success": False, "error": "설정 파일을 읽을 수 없습니다", "dry_run": dry_run}, started)
+        config_peers: PeerSet = config_state["peers"]
+
+        # 정상 상태: dump 1회 + 해시 비교 (노드 변경이 없으면 DB 조회 생략)
+        cached = self._cached_desired()
+        if cached is not None and runtime_hash == cached["hash"] == config_state["hash"]:
+            return self._finish({"success": True, "changed": False, "dry_run": dry_run, "peer_count": len(cached["peers"])}, started)
+
+        # 차이가 있으면 항상 DB를 새로 읽은 결과로 판단 (캐시로 피어를 제거하지 않음)
+        desired_state = self._desired(db)
+        desired_nodes = desired_state["nodes"]
+        desired: PeerSet = desired_state["peers"]
+        desired_hash = desired_state["hash"]
+
+        if runtime_hash == desired_hash and config_state["hash"] == desired_hash:
+            return self._finish({"success": True, "changed": False, "dry_run": dry_run, "peer_count": len(desired)}, started)
+
+        runtime_diff = diff_peer_sets(desired, runtime)
+        config_diff = diff_peer_sets(desired, config_peers)
+        diff = {
+            "runtime": self._describe(runtime_diff, desired_nodes, desired, runtime),
+            "config": self._describe(config_diff, desired_nodes, desired, config_peers)
+        }
+
+        if dry_run:
+            return self._finish({"success": True, "changed": True, "dry_run": True, "diff": diff}, started)
+
+        backend = get_backend()
+        errors = []
+
+        # 빈 DB/일부만 읽힌 결과로 인터페이스 전체를 비우지 않도록 주기 실행의 대량 제거는 보류
+        removals = set(runtime_diff["remove"]) | set(config_diff["remove"])
+        held_removals = 0
+        if removals and not on_demand and (not desired or len(removals) > self.max_removals):
+            held_removals = len(removals)
+            runtime_diff["remove"] = []
+            config_diff["remove"] = []
+            logger.warning(
+                f"WireGuard reconcile: 피어 {held_removals}개 제거 보류 (DB 피어 {len(desired)}개, "
+                f"주기 실행 제한 {self.max_removals}개) - 수동 reconcile로 적용"
+            )
+
+        # 1. 설정 파일: 한 번의 기록으로 반영
+        try:
+            with wg_config_store.edit() as editable:
+                for key in config_diff["remove"]:
+                    editable.remove_peer(key)
+                for key in config_diff["add"]:
+                    editable.add_peer(PeerEntry(key, list(desired[key]), node_id=desired_nodes[key]["node_id"]))
+                for key in config_diff["update"]:
+                    editable.set_allowed_ips(key, list(desired[key]))
+        except Exception as e:
+            errors.append(f"config: {e}")
+
+        # 2. 런타임: 변경된 피어만 `wg set`
+        for key in runtime_diff["remove"]:
+            if not backend.remove_peer(key):
+                errors.append(f"remove {key[:8]}...")
+        for key in runtime_diff["add"] + runtime_diff["update"]:
+            if not backend.set_peer(key, ",".join(desired[key])):
+                errors.append(f"set {key[:8]}...")
+
+        # 3. 새로 추가된 워커 노드 라우트
+        route_cidrs = [
+            desired[key][0] for key in runtime_diff["add"] + runtime_diff["update"]
+            if WireGuardManager._needs_route(desired[key][0])
+        ]
+        backend.add_routes(route_cidrs)
+
+        wg_snapshot.invalidate()
+        result = {
+            "success": not errors,
+            "changed": True,
+            "dry_run": False,
+            "diff": diff,
+            "held_removals": held_removals,
+            "errors": errors
+        }
+        logger.info(
+            f"WireGuard reconcile: runtime +{len(runtime_diff['add'])} -{len(runtime_diff['remove'])} "
+            f"~{len(runtime_diff['update'])}, config +{len(config_diff['add'])} "
+            f"-{len(config_diff['remove'])} ~{len(config_diff['update'])}"
+        )
+        return self._finish(result, started)
+
+    def _describe(self, diff: Dict[str, List[str]], desired_nodes: Dict[str, Dict],
+                  desired: PeerSet, actual: PeerSet) -> Dict[str, List[Dict]]:
+        return {
+            "add": [
+                {"public_key": key, "node_id": desired_nodes[key]["node_id"], "allowed_ips": desired[key]}
+                for key in diff["add"]
+            ],
+            "remove": [{"public_key": key, "allowed_ips": actual[key]} for key in diff["remove"]],
+            "update": [
+                {
+                    "public_key": key,
+                    "node_id": desired_nodes[key]["node_id"],
+                    "allowed_ips": desired[key],
+                    "current_allowed_ips": actual[key]
+                }
+                for key in diff["update"]
+            ]
+        }
+
+    def _finish(self, result: Dict, started: float) -> Dict:
+        result["elapsed_seconds"] = round(time.monotonic() - started, 3)
+        result["checked_at"] = datetime.now().isoformat()
+        if not result.get("dry_run"):
+            self.last_run = result
+        return result
+
+    def run_once(self, dry_run: bool = False, on_demand: bool = False) -> Dict:
+        db = SessionLocal()
+        try:
+            return self.reconcile(db, dry_run=dry_run, on_demand=on_demand)
+        finally:
+            db.close()
+
+    async def start(self):
+        """주기적 reconcile 루프"""
+        if self.running or self.interval <= 0:
+            return
+        self.running = True
+        logger.info(f"Starting WireGuard reconciler (interval {self.interval}s)")
+        timer = TaskTimer("reconciler")
+        while self.running:
+            timer.schedule(self.interval)
+            await asyncio.sleep(self.interval)
+            try:
+                with timer.run():
+                    await asyncio.to_thread(self.run_once)
+            except Exception as e:
+                logger.error(f"Error in WireGuard reconcile: {e}")
+
+    def stop(self):
+        self.running = False
+
+
+# 전역 reconciler
+peer_reconciler = PeerReconciler()
@@ -0,0 +1,250 @@
+"""
+WireGuard 런타임 스냅샷 서비스
+`wg show wg0 dump` 한 번의 결과를 공개키 인덱스 테이블로 파싱하여 짧은 TTL 동안 공유합니다.
+동시에 들어온 요청은 진행 중인 하나의 조회 결과를 함께 사용합니다 (single-flight).
+비동기 엔드포인트는 aget()으로 이벤트 루프를 막지 않고 같은 캐시를 사용합니다.
+"""
+
+import os
+import asyncio
+import hashlib
+import threading
+import time
+import logging
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+from wireguard_backend import get_backend
+
+logger = logging.getLogger(__name__)
+
+# 스냅샷 유효 시간 (초)
+DEFAULT_SNAPSHOT_TTL = float(os.getenv("WG_SNAPSHOT_TTL", "2.0"))
+
+EMPTY_PEER_STATUS = {
+    "connected": False,
+    "last_handshake": None,
+    "bytes_received": 0,
+    "bytes_sent": 0
+}
+
+
+def dump_generation(peers: Dict[str, Dict]) -> str:
+    """
+    피어 테이블의 짧은 해시 (ETag 구성 요소)
+    공개키, endpoint, AllowedIPs, 연결 여부만 포함합니다. 트래픽마다 바뀌는 rx/tx와 handshake 시각까지
+    넣으면 활성 피어가 하나만 있어도 매 dump마다 달라져 304가 나오지 않기 때문입니다.
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    for key in sorted(peers):
+        peer = peers[key]
+        allowed_ips = ",".join(sorted(peer["allowed_ips"]))
+        digest.update(f"{key}\t{peer['endpoint']}\t{allowed_ips}\t{peer['latest_handshake'] > 0}\n".encode())
+    return digest.hexdigest()
+
+
+def parse_wg_dump(output: str) -> Dict:
+    """`wg show <iface> dump` 출력을 인터페이스 정보와 공개키 인덱스 피어 테이블로 파싱"""
+    interface = {}
+    peers: Dict[str, Dict] = {}
+
+    lines = output.strip().split('\n') if output.strip() else []
+    if lines:
+        # 첫 줄: private-key, public-key, listen-port, fwmark
+        parts = lines[0].split('\t')
+        if len(parts) >= 3:
+            interface = {
+                "public_key": parts[1],
+                "listen_port": int(parts[2]) if parts[2].isdigit() else None,
+                "fwmark": parts[3] if len(parts) > 3 else "off"
+            }
+
+    for line in lines[1:]:
+        # public-key, preshared-key, endpoint, allowed-ips, latest-handshake,
+        # transfer-rx, transfer-tx, persistent-keepalive
+        parts = line.split('\t')
+        if len(parts) < 8:
+            continue
+        peers[parts[0]] = {
+            "public_key": parts[0],
+            "endpoint": None if parts[2] == "(none)" else parts[2],
+            "allowed_ips": [] if parts[3] == "(none)" else parts[3].split(','),
+            "latest_handshake": int(parts[4]) if parts[4].isdigit() else 0,
+            "rx_bytes": int(parts[5]) if parts[5].isdigit() else 0,
+            "tx_bytes": int(parts[6]) if parts[6].isdigit() else 0,
+            "persistent_keepalive": None if parts[7] == "off" else parts[7]
+        }
+
+    return {"interface": interface, "peers": peers}
+
+
+class WireGuardSnapshot:
+    """한 시점의 WireGuard 런타임 상태 (읽기 전용)"""
+
+    def __init__(self, interface: Dict, peers: Dict[str, Dict], error: Optional[str] = None,
+                 generation: str = "none"):
+        self.interface = interface
+        self.peers = peers
+        self.error = error
+        # 피어 구성 해시: 피어/endpoint/연결 여부가 같은 스냅샷은 같은 generation (ETag 구성 요소)
+        self.generation = generation
+        self.taken_at = time.monotonic()
+        self.fetched_at = datetime.now()
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def age(self) -> float:
+        return time.monotonic() - self.taken_at
+
+    def peer_status(self, public_key: Optional[str]) -> Dict:
+        """기존 get_peer_status()와 동일한 형식의 피어 상태"""
+        peer = self.peers.get(public_key) if public_key else None
+        if not peer:
+            return dict(EMPTY_PEER_STATUS)
+
+        last_handshake_ts = peer["latest_handshake"]
+        return {
+            "connected": last_handshake_ts > 0,
+            "last_handshake": datetime.fromtimestamp(last_handshake_ts) if last_handshake_ts > 0 else None,
+            "bytes_received": peer["rx_bytes"],
+            "bytes_sent": peer["tx_bytes"]
+        }
+
+
+class _Flight:
+    """진행 중인 dump 조회 하나"""
+
+    def __init__(self, generation: int):
+        self.done = threading.Event()
+        self.generation = generation
+        self.result: Optional[WireGuardSnapshot] = None
+
+
+class WireGuardSnapshotService:
+    """
+    프로세스 전역 런타임 스냅샷 캐시
+    TTL 안에서는 캐시를 반환하고, 만료 시 동시 호출자들이 하나의 dump 결과를 공유합니다.
+    invalidate()마다 세대(_generation)가 올라가며, 이전 세대에 시작된 조회 결과는 캐시에 저장되지 않고
+    무효화 이후의 호출자가 그 조회에 합류하지도 않습니다.
+    """
+
+    def __init__(self, ttl: float = DEFAULT_SNAPSHOT_TTL,
+                 fetcher: Optional[Callable[[], str]] = None,
+                 interface: str = "wg0"):
+        self.ttl = ttl
+        self.interface = interface
+        self._fetcher = fetcher
+        self._lock = threading.Lock()
+        self._snapshot: Optional[WireGuardSnapshot] = None
+        self._inflight: Optional[_Flight] = None
+        self._atask: Optional[asyncio.Task] = None
+        self._generation = 0
+
+    def _store(self, snapshot: WireGuardSnapshot, generation: int):
+        """조회 시작 이후 무효화되지 않은 경우에만 캐시에 저장 (호출자가 _lock 보유)"""
+        if generation == self._generation:
+            self._snapshot = snapshot
+
+    def get(self, max_age: Optional[float] = None) -> WireGuardSnapshot:
+        """스냅샷 조회 (max_age 초보다 오래된 경우에만 새로 dump)"""
+        ttl = self.ttl if max_age is None else max_age
+
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot.age() < ttl:
+                return snapshot
+            flight = self._inflight
+            leader = flight is None
+            if leader:
+                flight = self._inflight = _Flight(self._generation)
+
+        if not leader:
+            flight.done.wait()
+            return flight.result
+
+        try:
+            flight.result = self._fetch()
+            with self._lock:
+                self._store(flight.result, flight.generation)
+        finally:
+            with self._lock:
+                if self._inflight is flight:
+                    self._inflight = None
+            flight.done.set()
+
+        return flight.result
+
+    async def aget(self, max_age: Optional[float] = None) -> WireGuardSnapshot:
+        """get()의 비동기 버전 (같은 이벤트 루프의 동시 호출자는 하나의 dump 태스크를 공유)"""
+        ttl = self.ttl if max_age is None else max_age
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.age() < ttl:
+            return snapshot
+
+        task = self._atask
+        if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+            task = self._atask = asyncio.ensure_future(self._afetch(self._generation))
+        # 한 호출자가 취소되어도 공유 중인 조회는 계속 진행
+        return await asyncio.shield(task)
+
+    async def _afetch(self, generation: int) -> WireGuardSnapshot:
+        try:
+            if self._fetcher:
+                output = await asyncio.to_thread(self._fetcher)
+            else:
+                output = await get_backend().adump()
+            parsed = parse_wg_dump(output)
+            snapshot = WireGuardSnapshot(parsed["interface"], parsed["peers"],
+                                         generation=dump_generation(parsed["peers"]))
+        except Exception as e:
+            logger.error(f"WireGuard 스냅샷 조회 실패: {e}")
+            snapshot = WireGuardSnapshot({}, {}, error=str(e) or type(e).__name__, generation="error")
+        with self._lock:
+            self._store(snapshot, generation)
+        return snapshot
+
+    def current(self) -> Optional[WireGuardSnapshot]:
+        """TTL 안의 캐시된 스냅샷 (없거나 만료되었으면 None, dump하지 않음)"""
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.age() < self.ttl:
+            return snapshot
+        return None
+
+    def known_generation(self) -> Optional[str]:
+        """
+        마지막 스냅샷의 generation (TTL이 지났어도 dump하지 않음, 무효화 이후/실패 시 None)
+        조건부 GET이 dump 없이 ETag를 비교하는 데 사용합니다. 이 프로세스 밖의 피어 변경(endpoint 로밍 등)은
+        다음 dump(요청, 헬스체크, reconciler)까지 반영되지 않습니다.
+        """
+        snapshot = self._snapshot
+        if snapshot is None or not snapshot.ok:
+            return None
+        return snapshot.generation
+
+    def invalidate(self):
+        """
+        피어 변경 후 다음 조회가 새 dump를 사용하도록 캐시 무효화
+        진행 중인 조회는 끝까지 실행되지만 결과를 캐시에 쓰지 않으며, 이후 호출자는 새 조회를 시작합니다.
+        """
+        with self._lock:
+            self._snapshot = None
+            self._generation += 1
+            self._inflight = None
+            self._atask = None
+
+    def _fetch(self) -> WireGuardSnapshot:
+        try:
+            output = self._fetcher() if self._fetcher else get_backend().dump()
+            parsed = parse_wg_dump(output)
+            return WireGuardSnapshot(parsed["interface"], parsed["peers"],
+                                     generation=dump_generation(parsed["peers"]))
+        except Exception as e:
+            # 실패도 TTL 동안 캐시하여 장애 시 노드 수만큼 재시도하지 않도록 함
+            logger.error(f"WireGuard 스냅샷 조회 실패: {e}")
+            return WireGuardSnapshot({}, {}, error=str(e), generation="error")
+
+
+# 전역 스냅샷 서비스
+wg_snapshot = WireGuardSnapshotService()
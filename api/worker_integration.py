@@ -5,18 +5,19 @@ VPN 등록과 워커노드 플랫폼 등록을 통합하는 API
 
 from fastapi import APIRouter, Depends, HTTPException, Response, Form
 from fastapi.responses import HTMLResponse, RedirectResponse
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
-from database import SessionLocal
+from database import get_async_db
 from models import Node, QRToken
-from wireguard_manager import WireGuardManager
+from wireguard_manager import async_wg_manager
+from tracing import span
 from worker_vpn_installer import generate_worker_vpn_installer
 from simple_worker_docker_runner import generate_simple_worker_runner, generate_simple_worker_runner_wsl
 # generate_simple_worker_runner_linux는 main.py에서만 사용
 from typing import Optional
 import json
 import logging
-import qrcode
 import io
 import base64
 from datetime import datetime, timedelta, timezone
@@ -26,13 +27,6 @@ import os
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 class WorkerEnvironmentRequest(BaseModel):
     """워커노드 환경변수 설정 요청"""
     node_id: str
@@ -318,7 +312,7 @@ async def worker_setup_page():
 @router.post("/worker/generate-qr")
 async def generate_worker_qr(
     request: WorkerEnvironmentRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """워커노드용 QR 코드 및 설치 링크 생성"""
     try:
@@ -357,14 +351,14 @@ async def generate_worker_qr(
             central_server_url=central_url,
             docker_env_vars=json.dumps(metadata),
             status="pending",  # 아직 VPN 설정 전
-            vpn_ip="0.0.0.0",  # 임시값
-            public_key="pending",
+            vpn_ip=None,  # 설치 시 할당 (unique 컬럼이므로 임시값 대신 NULL)
+            public_key=None,
             private_key="pending",
             config="pending"
         )
         
         # 중복 체크 및 업데이트
-        existing = db.query(Node).filter(Node.node_id == request.node_id).first()
+        existing = await db.get(Node, request.node_id)
         if existing:
             # 기존 노드가 있으면 메타데이터만 업데이트 (pending 키는 건드리지 않음)
             if existing.status != "pending":  # 이미 설정된 노드면 키 유지
@@ -384,7 +378,7 @@ async def generate_worker_qr(
             db.add(new_node)
             logger.info(f"Added new worker node {request.node_id} in pending status")
         
-        db.commit()
+        await db.commit()
         
         # 설치 URL 생성
         # SERVERURL 환경변수 사용 (docker-compose.yml에서 설정)
@@ -396,7 +390,8 @@ async def generate_worker_qr(
         server_url = f"http://{server_host}:8090"
         install_url = f"{server_url}/worker/install/{token}"
         
-        # QR 코드 생성
+        # QR 코드 생성 (qrcode/PIL은 무거우므로 첫 사용 시 로드)
+        import qrcode
         qr = qrcode.QRCode(version=1, box_size=10, border=5)
         qr.add_data(install_url)
         qr.make(fit=True)
@@ -448,11 +443,11 @@ async def generate_worker_qr(
 #     )
 
 @router.get("/worker/install/{token}")
-async def worker_install_page(token: str, db: Session = Depends(get_db)):
+async def worker_install_page(token: str, db: AsyncSession = Depends(get_async_db)):
     """워커노드 자동 설치 페이지"""
     
     # 토큰 확인
-    qr_token = db.query(QRToken).filter(QRToken.token == token).first()
+    qr_token = await db.get(QRToken, token)
     if not qr_token:
         return HTMLResponse(content="<h1>❌ 유효하지 않은 토큰입니다</h1>", status_code=404)
     
@@ -460,7 +455,7 @@ async def worker_install_page(token: str, db: Session = Depends(get_db)):
         return HTMLResponse(content="<h1>⏰ 만료된 토큰입니다</h1>", status_code=400)
     
     # 노드 정보 가져오기
-    node = db.query(Node).filter(Node.node_id == qr_token.node_id).first()
+    node = await db.get(Node, qr_token.node_id)
     if not node:
         return HTMLResponse(content="<h1>❌ 노드 정보를 찾을 수 없습니다</h1>", status_code=404)
     
@@ -967,20 +962,22 @@ async def worker_install_page(token: str, db: Session = Depends(get_db)):
 @router.post("/worker/process-installation/{token}")
 async def process_worker_installation(
     token: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """워커노드 설치 처리 - VPN 등록 및 설정 생성"""
     
     # 토큰 확인
-    qr_token = db.query(QRToken).filter(QRToken.token == token).first()
+    qr_token = await db.get(QRToken, token)
     if not qr_token:
         raise HTTPException(status_code=404, detail="Invalid token")
     
     if datetime.now(timezone.utc) > qr_token.expires_at:
         raise HTTPException(status_code=400, detail="Token expired")
     
-    # 노드 정보 가져오기
-    node = db.query(Node).filter(Node.node_id == qr_token.node_id).first()
+    # 노드 정보 가져오기 (같은 QR을 동시에 처리하지 않도록 행 잠금)
+    node = (await db.scalars(
+        select(Node).where(Node.node_id == qr_token.node_id).with_for_update()
+    )).first()
     if not node:
         raise HTTPException(status_code=404, detail="Node not found")
     
@@ -1002,23 +999,25 @@ async def process_worker_installation(
                 "message": "Already configured"
             }
         
-        # WireGuard 매니저 초기화
-        wg_manager = WireGuardManager()
+        # WireGuard 키 생성 (IP 풀 잠금 밖에서 미리 준비)
+        with span("keygen"):
+            keys = async_wg_manager.generate_keypair()
+        with span("server_identity"):
+            server_public_key = await async_wg_manager.get_server_public_key()
         
-        # VPN IP 할당
-        vpn_ip = wg_manager.allocate_ip("worker")
+        # VPN IP 할당 (풀 잠금은 아래 커밋까지 유지되어 동시 등록 간 충돌 없음)
+        with span("ip_alloc"):
+            vpn_ip = await async_wg_manager.allocate_ip(db, "worker")
         if not vpn_ip:
             raise HTTPException(status_code=500, detail="Failed to allocate VPN IP")
         
-        # WireGuard 키 생성
-        keys = wg_manager.generate_keypair()
-        
         # VPN 설정 생성
-        config = wg_manager.generate_client_config(
-            private_key=keys['private_key'],
-            client_ip=vpn_ip,
-            server_public_key=wg_manager.get_server_public_key()
-        )
+        with span("client_config"):
+            config = await async_wg_manager.generate_client_config(
+                private_key=keys['private_key'],
+                client_ip=vpn_ip,
+                server_public_key=server_public_key
+            )
         
         # 노드 정보 업데이트
         node.vpn_ip = vpn_ip
@@ -1038,29 +1037,32 @@ async def process_worker_installation(
         }
         node.docker_env_vars = json.dumps(docker_env)
         
-        db.commit()
+        with span("db_commit"):
+            await db.commit()
         
         # WireGuard 서버에 피어 추가
         try:
-            wg_manager.add_peer_to_server(
-                public_key=keys['public_key'],
-                vpn_ip=vpn_ip,
-                node_id=qr_token.node_id
-            )
+            with span("add_peer"):
+                await async_wg_manager.add_peer_to_server(
+                    public_key=keys['public_key'],
+                    vpn_ip=vpn_ip,
+                    node_id=qr_token.node_id
+                )
         except Exception as e:
             logger.error(f"Failed to add peer to server: {e}")
             # 서버 추가 실패해도 계속 진행 (나중에 sync 가능)
         
         # 토큰을 사용됨으로 표시
         qr_token.used = True
-        db.commit()
+        await db.commit()
         
         # 설치 스크립트 생성 (VPN + Docker 두 개 파일)
-        vpn_installer = generate_worker_vpn_installer(node)
-        docker_runner = generate_simple_worker_runner_wsl(node)  # WSL2
-        
-        # Linux/Mac용 스크립트도 제공 (선택사항)
-        install_script = generate_install_script(node)
+        with span("installers"):
+            vpn_installer = generate_worker_vpn_installer(node)
+            docker_runner = generate_simple_worker_runner_wsl(node)  # WSL2
+            
+            # Linux/Mac용 스크립트도 제공 (선택사항)
+            install_script = generate_install_script(node)
         
         return {
             "status": "success",
@@ -1073,7 +1075,11 @@ async def process_worker_installation(
             "config": base64.b64encode(config.encode()).decode()
         }
         
+    except HTTPException:
+        await db.rollback()
+        raise
     except Exception as e:
+        await db.rollback()
         logger.error(f"Installation failed: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1184,9 +1190,9 @@ echo "========================================="
     return script
 
 @router.get("/worker/status/{node_id}")
-async def get_worker_status(node_id: str, db: Session = Depends(get_db)):
+async def get_worker_status(node_id: str, db: AsyncSession = Depends(get_async_db)):
     """워커노드 상태 조회"""
-    node = db.query(Node).filter(Node.node_id == node_id).first()
+    node = await db.get(Node, node_id)
     
     if not node:
         raise HTTPException(status_code=404, detail="Node not found")
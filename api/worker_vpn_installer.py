@@ -145,8 +145,8 @@ try {{
     New-NetFirewallRule -DisplayName "Ray Ephemeral Out" -Direction Outbound -Protocol TCP -LocalPort 30000-30049 -Action Allow -ErrorAction Stop
     
     # VPN 서브넷 간 모든 TCP 통신 허용 (워커 노드 간 통신)
-    New-NetFirewallRule -DisplayName "VPN Worker TCP All In" -Direction Inbound -Protocol TCP -RemoteAddress "10.100.1.0/24" -Action Allow -ErrorAction Stop
-    New-NetFirewallRule -DisplayName "VPN Worker TCP All Out" -Direction Outbound -Protocol TCP -RemoteAddress "10.100.1.0/24" -Action Allow -ErrorAction Stop
+    New-NetFirewallRule -DisplayName "VPN Worker TCP All In" -Direction Inbound -Protocol TCP -RemoteAddress "10.100.0.0/16" -Action Allow -ErrorAction Stop
+    New-NetFirewallRule -DisplayName "VPN Worker TCP All Out" -Direction Outbound -Protocol TCP -RemoteAddress "10.100.0.0/16" -Action Allow -ErrorAction Stop
     
     Write-Host "✅ 방화벽 규칙 추가 완료 (중복 없이)" -ForegroundColor Green
     
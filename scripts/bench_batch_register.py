@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+노드 일괄 등록(사전 프로비저닝) 처리량 벤치마크
+/nodes/register/batch 로 --count 개 노드를 --batch-size 단위로 등록하고 nodes/min 을 보고합니다.
+--compare 를 주면 같은 수를 /nodes/register 로 한 건씩 등록한 결과와 비교합니다.
+
+사용법: python3 scripts/bench_batch_register.py --url http://localhost:8090 --token $API_TOKEN --count 5000 --batch-size 500
+"""
+
+import sys
+import time
+import uuid
+import asyncio
+import argparse
+from collections import Counter
+
+import httpx
+
+
+def node_specs(prefix: str, count: int):
+    return [
+        {"node_id": f"{prefix}-{i:05d}", "node_type": "worker", "hostname": f"{prefix}-{i:05d}", "description": "bench-batch"}
+        for i in range(count)
+    ]
+
+
+async def register_batches(client: httpx.AsyncClient, specs, batch_size: int):
+    ips, errors, latencies = [], [], []
+    for offset in range(0, len(specs), batch_size):
+        chunk = specs[offset:offset + batch_size]
+        started = time.perf_counter()
+        response = await client.post("/nodes/register/batch", json={"nodes": chunk})
+        latencies.append(time.perf_counter() - started)
+        if response.status_code == 200:
+            ips.extend(node["vpn_ip"] for node in response.json()["nodes"])
+        else:
+            errors.append(f"{response.status_code} {response.text[:200]}")
+    return ips, errors, latencies
+
+
+async def register_single(client: httpx.AsyncClient, specs, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(spec):
+        async with semaphore:
+            response = await client.post("/nodes/register", json=spec)
+            if response.status_code == 200:
+                return response.json()["vpn_ip"], None
+            return None, f"{response.status_code} {response.text[:200]}"
+
+    results = await asyncio.gather(*(one(spec) for spec in specs))
+    return [ip for ip, _ in results if ip], [error for _, error in results if error]
+
+
+def report(label: str, count: int, elapsed: float, ips, errors) -> bool:
+    duplicates = {ip: n for ip, n in Counter(ips).items() if n > 1}
+    print(f"\n[{label}] 성공: {len(ips)}/{count}  실패: {len(errors)}  중복 IP: {len(duplicates)}")
+    print(f"[{label}] 소요: {elapsed:.2f}s  처리량: {len(ips) / elapsed * 60:.0f} nodes/min")
+    for error in Counter(errors).most_common(5):
+        print(f"  오류 x{error[1]}: {error[0]}")
+    return not errors and not duplicates
+
+
+async def run(args) -> int:
+    prefix = f"bench-{uuid.uuid4().hex[:6]}"
+    headers = {"Authorization": f"Bearer {args.token}"}
+    node_ids = []
+    ok = True
+
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, headers=headers) as client:
+        try:
+            specs = node_specs(f"{prefix}-b", args.count)
+            node_ids += [spec["node_id"] for spec in specs]
+            print(f"일괄 등록 {args.count}개 (배치 {args.batch_size}, {prefix}-*)...")
+            started = time.perf_counter()
+            ips, errors, latencies = await register_batches(client, specs, args.batch_size)
+            ok &= report("batch", args.count, time.perf_counter() - started, ips, errors)
+            latencies.sort()
+            print(f"[batch] 배치 지연 p50 {latencies[len(latencies) // 2] * 1000:.0f}ms  max {latencies[-1] * 1000:.0f}ms")
+
+            if args.compare:
+                specs = node_specs(f"{prefix}-s", args.count)
+                node_ids += [spec["node_id"] for spec in specs]
+                print(f"\n단건 등록 {args.count}개 (동시성 {args.concurrency})...")
+                started = time.perf_counter()
+                ips, errors = await register_single(client, specs, args.concurrency)
+                ok &= report("single", args.count, time.perf_counter() - started, ips, errors)
+        finally:
+            if not args.keep:
+                response = await client.request("DELETE", "/api/nodes/cleanup", json={"node_ids": node_ids})
+                print(f"\n정리: {response.json().get('deleted')}개 노드 삭제")
+
+    return 0 if ok else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8090")
+    parser.add_argument("--token", default="test-token-123")
+    parser.add_argument("--count", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--compare", action="store_true", help="/nodes/register 단건 등록과 비교")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--keep", action="store_true", help="테스트 노드를 삭제하지 않음")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
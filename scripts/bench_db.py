@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+DB 계층 처리량 벤치마크 (동기 Session + 스레드 풀 vs asyncpg AsyncSession)
+목록 조회(GET /nodes)와 등록(POST /nodes/register)이 하는 DB 작업을 동시성 N으로 반복하여
+초당 요청 수를 비교합니다. 등록은 실제 IP 할당기를 거치며, 끝나면 생성한 노드와 IP를 정리합니다.
+
+사용법: DATABASE_URL=postgresql://... python3 scripts/bench_db.py [--requests 500] [--concurrency 50]
+"""
+
+import os
+import sys
+import time
+import uuid
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api"))
+
+from sqlalchemy import delete, select
+
+from database import AsyncSessionLocal, Base, SessionLocal, async_engine, engine
+from ip_allocator import ip_allocator
+from models import Node
+
+
+def make_node(node_id: str, vpn_ip: str) -> Node:
+    return Node(
+        node_id=node_id, node_type="worker", hostname=node_id, public_ip="0.0.0.0",
+        vpn_ip=vpn_ip, public_key=f"bench-{node_id}", private_key="bench",
+        config="bench", status="registered"
+    )
+
+
+# --- 동기 (이전 방식: 요청마다 SessionLocal, FastAPI 스레드 풀에서 실행) ---
+def sync_list(_):
+    with SessionLocal() as db:
+        return len(db.query(Node).all())
+
+
+def sync_register(node_id: str):
+    with SessionLocal() as db:
+        vpn_ip = ip_allocator.allocate(db)
+        db.add(make_node(node_id, vpn_ip))
+        db.commit()
+
+
+# --- 비동기 (현재 방식: 요청마다 AsyncSession) ---
+async def async_list(_):
+    async with AsyncSessionLocal() as db:
+        return len((await db.scalars(select(Node))).all())
+
+
+async def async_register(node_id: str):
+    async with AsyncSessionLocal() as db:
+        vpn_ip = await db.run_sync(ip_allocator.allocate)
+        db.add(make_node(node_id, vpn_ip))
+        await db.commit()
+
+
+async def run_sync_variant(fn, items, concurrency: int) -> float:
+    # FastAPI의 기본 스레드 풀(40)과 같은 방식: 이벤트 루프에서 스레드로 넘김
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        started = time.perf_counter()
+        await asyncio.gather(*(loop.run_in_executor(pool, fn, item) for item in items))
+        return time.perf_counter() - started
+
+
+async def run_async_variant(fn, items, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited(item):
+        async with semaphore:
+            await fn(item)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(limited(item) for item in items))
+    return time.perf_counter() - started
+
+
+def report(name: str, count: int, elapsed: float):
+    print(f"{name:<28} {count / elapsed:>10,.0f} req/s  ({elapsed / count * 1000:,.2f} ms/req)")
+
+
+def cleanup(prefix: str):
+    with SessionLocal() as db:
+        ips = [ip for (ip,) in db.query(Node.vpn_ip).filter(Node.node_id.like(f"{prefix}%")).all()]
+        ip_allocator.release_many(db, ips)
+        db.execute(delete(Node).where(Node.node_id.like(f"{prefix}%")))
+        db.commit()
+
+
+async def run(args):
+    Base.metadata.create_all(bind=engine)
+    prefix = f"bench-{uuid.uuid4().hex[:6]}"
+    print(f"DB: {engine.url.render_as_string(hide_password=True)}  "
+          f"요청 {args.requests}건, 동시성 {args.concurrency}\n")
+
+    try:
+        # 등록 (각 변형마다 서로 다른 node_id)
+        ids = [f"{prefix}-s-{i:05d}" for i in range(args.requests)]
+        report("register  sync + threads", args.requests,
+               await run_sync_variant(sync_register, ids, args.concurrency))
+        ids = [f"{prefix}-a-{i:05d}" for i in range(args.requests)]
+        report("register  AsyncSession", args.requests,
+               await run_async_variant(async_register, ids, args.concurrency))
+
+        # 목록 (위에서 등록한 노드 포함)
+        items = range(args.requests)
+        report("list      sync + threads", args.requests,
+               await run_sync_variant(sync_list, items, args.concurrency))
+        report("list      AsyncSession", args.requests,
+               await run_async_variant(async_list, items, args.concurrency))
+    finally:
+        if not args.keep:
+            cleanup(prefix)
+        await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--keep", action="store_true", help="벤치마크 노드를 삭제하지 않음")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
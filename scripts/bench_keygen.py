@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+WireGuard 키 생성 벤치마크
+`wg genkey | wg pubkey` 서브프로세스 방식과 프로세스 내 X25519 생성, 키 풀 pop의 초당 키 수를 비교합니다.
+
+사용법: python3 scripts/bench_keygen.py [--count 200]
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api"))
+
+from wireguard_keys import KeypairPool, generate_keypair
+
+
+def subprocess_keypair():
+    private_key = subprocess.check_output(["wg", "genkey"]).decode().strip()
+    public_key = subprocess.check_output(["wg", "pubkey"], input=private_key.encode()).decode().strip()
+    return {"private_key": private_key, "public_key": public_key}
+
+
+def bench(name, fn, count):
+    started = time.perf_counter()
+    for _ in range(count):
+        fn()
+    elapsed = time.perf_counter() - started
+    print(f"{name:<24} {count / elapsed:>12,.0f} keys/s  ({elapsed / count * 1e6:,.1f} us/key)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=200)
+    args = parser.parse_args()
+
+    if shutil.which("wg"):
+        bench("subprocess (wg genkey)", subprocess_keypair, args.count)
+    else:
+        print("subprocess (wg genkey)   skipped: wg not installed")
+
+    bench("in-process X25519", generate_keypair, args.count)
+
+    pool = KeypairPool(size=args.count)
+    pool.warm()
+    while pool.available() < args.count:
+        time.sleep(0.01)
+    bench("pool pop (warm)", pool.pop, args.count)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+워커 동시 등록(조인 스톰) 부하 테스트
+N개의 QR 토큰을 만든 뒤 /worker/process-installation/{token}을 동시에 호출하고,
+모든 등록이 성공했는지와 할당된 VPN IP가 서로 겹치지 않는지 확인합니다.
+
+사용법: python3 scripts/load_test_joins.py --url http://localhost:8090 --count 500 --concurrency 500
+"""
+
+import sys
+import time
+import uuid
+import asyncio
+import argparse
+from collections import Counter
+
+import httpx
+
+
+async def create_token(client: httpx.AsyncClient, node_id: str) -> str:
+    response = await client.post("/worker/generate-qr", json={
+        "node_id": node_id,
+        "description": "load-test"
+    })
+    response.raise_for_status()
+    return response.json()["token"]
+
+
+async def join(client: httpx.AsyncClient, semaphore: asyncio.Semaphore, token: str):
+    async with semaphore:
+        started = time.perf_counter()
+        try:
+            response = await client.post(f"/worker/process-installation/{token}")
+            elapsed = time.perf_counter() - started
+            if response.status_code == 200:
+                return True, response.json().get("vpn_ip"), elapsed, None
+            return False, None, elapsed, f"{response.status_code} {response.text[:200]}"
+        except Exception as e:
+            return False, None, time.perf_counter() - started, str(e)
+
+
+async def run(args) -> int:
+    prefix = f"loadtest-{uuid.uuid4().hex[:6]}"
+    node_ids = [f"{prefix}-{i:04d}" for i in range(args.count)]
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        # 1. 토큰 준비 (측정 대상 아님)
+        print(f"토큰 {args.count}개 생성 중 ({prefix}-*)...")
+        semaphore = asyncio.Semaphore(min(args.concurrency, 50))
+
+        async def prepare(node_id):
+            async with semaphore:
+                return await create_token(client, node_id)
+
+        tokens = await asyncio.gather(*(prepare(node_id) for node_id in node_ids))
+
+        # 2. 동시 등록
+        print(f"동시 등록 {args.count}건 (동시성 {args.concurrency})...")
+        semaphore = asyncio.Semaphore(args.concurrency)
+        started = time.perf_counter()
+        results = await asyncio.gather(*(join(client, semaphore, token) for token in tokens))
+        elapsed = time.perf_counter() - started
+
+        ok = [r for r in results if r[0]]
+        errors = [r[3] for r in results if not r[0]]
+        ips = Counter(r[1] for r in ok)
+        duplicates = {ip: n for ip, n in ips.items() if n > 1}
+        latencies = sorted(r[2] for r in results)
+
+        print(f"\n성공: {len(ok)}/{args.count}  실패: {len(errors)}  중복 IP: {len(duplicates)}")
+        print(f"소요: {elapsed:.2f}s  처리량: {args.count / elapsed:.1f} registrations/s")
+        print(f"지연 p50 {latencies[len(latencies) // 2] * 1000:.0f}ms  "
+              f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.0f}ms  "
+              f"max {latencies[-1] * 1000:.0f}ms")
+        for error in Counter(errors).most_common(5):
+            print(f"  오류 x{error[1]}: {error[0]}")
+        if duplicates:
+            print(f"  중복 IP: {list(duplicates.items())[:10]}")
+
+        # 3. 정리
+        if not args.keep:
+            response = await client.request("DELETE", "/api/nodes/cleanup", json={"node_ids": node_ids})
+            print(f"\n정리: {response.json().get('deleted')}개 노드 삭제")
+
+    return 0 if not errors and not duplicates else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8090")
+    parser.add_argument("--count", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=500)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--keep", action="store_true", help="테스트 노드를 삭제하지 않음")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
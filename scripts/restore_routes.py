@@ -1,15 +1,21 @@
 #!/usr/bin/env python3
 """
 워커 노드 라우트 복구 스크립트
-컨테이너 재시작 시 실행하여 10.100.1.x 대역의 라우트를 복구합니다.
+컨테이너 재시작 시 실행하여 워커 IP 할당 범위(WG_IP_RANGES)의 라우트를 복구합니다.
 """
 
 import subprocess
 import os
+import sys
 import logging
+import ipaddress
 import psycopg2
 from typing import List
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api"))
+
+from ip_allocator import DEFAULT_IP_RANGES, parse_ip_ranges
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -22,15 +28,18 @@ def get_worker_nodes() -> List[str]:
         conn = psycopg2.connect(db_url)
         cur = conn.cursor()
         
-        # 10.100.1.x 대역의 노드 조회
+        # 워커 IP 할당 범위의 노드 조회
+        ranges = parse_ip_ranges(os.getenv("WG_IP_RANGES", DEFAULT_IP_RANGES))
         cur.execute("""
             SELECT vpn_ip FROM nodes 
-            WHERE vpn_ip LIKE '10.100.1.%' 
+            WHERE vpn_ip IS NOT NULL 
             AND status = 'active'
         """)
         
         for row in cur.fetchall():
-            worker_ips.append(row[0])
+            address = int(ipaddress.IPv4Address(row[0]))
+            if any(start <= address <= end for start, end in ranges):
+                worker_ips.append(row[0])
         
         cur.close()
         conn.close()
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# API 모듈은 컨테이너의 /app(api/)에서 최상위 모듈로 import됨
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "api"))
+os.environ.setdefault("WG_BACKEND", "fake")
@@ -0,0 +1,63 @@
+import asyncio
+from unittest import mock
+
+import pytest
+
+import wireguard_backend
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+from wireguard_backend import run_command
+
+
+def open_breaker() -> CircuitBreaker:
+    breaker = CircuitBreaker("test", failure_threshold=1, cooldown=0.0)
+    breaker.record_failure("down")
+    assert breaker.state == OPEN
+    return breaker
+
+
+def test_half_open_allows_single_probe():
+    breaker = open_breaker()
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    breaker.before_call()
+
+
+def test_cancelled_half_open_probe_releases_slot_and_kills_process():
+    breaker = open_breaker()
+    processes = []
+    create = asyncio.create_subprocess_exec
+
+    async def tracking_create(*args, **kwargs):
+        process = await create(*args, **kwargs)
+        processes.append(process)
+        return process
+
+    async def scenario():
+        with mock.patch.object(wireguard_backend.asyncio, "create_subprocess_exec", tracking_create):
+            task = asyncio.create_task(run_command(["sleep", "30"], timeout=60, breaker=breaker))
+            while not processes:
+                await asyncio.sleep(0.01)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+    asyncio.run(scenario())
+
+    assert processes[0].returncode is not None
+    assert breaker.state == HALF_OPEN
+    # 취소된 시험 호출이 자리를 반환했으므로 다음 호출은 통과
+    breaker.check()
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+
+
+def test_timed_out_probe_reopens_breaker():
+    breaker = open_breaker()
+    with pytest.raises(TimeoutError):
+        asyncio.run(run_command(["sleep", "30"], timeout=0.1, breaker=breaker))
+    assert breaker.state == OPEN
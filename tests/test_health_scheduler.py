@@ -0,0 +1,96 @@
+import pytest
+
+import background_health_monitor
+from background_health_monitor import HealthScheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(background_health_monitor.time, "monotonic", clock)
+    return clock
+
+
+def make_scheduler(**kwargs) -> HealthScheduler:
+    options = dict(base_interval=30, critical_interval=10, max_interval=120, budget=4,
+                   jitter=0.0, settle_checks=2, burst_window=1.0)
+    options.update(kwargs)
+    return HealthScheduler(**options)
+
+
+def make_due(scheduler: HealthScheduler, clock: FakeClock):
+    """모든 노드의 다음 검사 시각을 현재로 당김 (기존 힙 항목은 무효화됨)"""
+    for offset, entry in enumerate(sorted(scheduler.nodes.values(), key=lambda e: e.node_id)):
+        scheduler._push(entry, clock.now - 10 + offset * 0.001)
+
+
+def test_take_due_respects_budget(clock):
+    scheduler = make_scheduler()
+    scheduler.sync([f"node-{i}" for i in range(10)])
+    make_due(scheduler, clock)
+
+    first = scheduler.take_due()
+    assert first == ["node-0", "node-1", "node-2", "node-3"]
+    assert scheduler.take_due() == []
+
+    # 0.5초 후 budget(4/s)의 절반만큼 다시 허용, 오래된 마감 순서대로
+    clock.now += 0.5
+    assert scheduler.take_due() == ["node-4", "node-5"]
+    assert scheduler.overdue() == 4
+
+
+def test_taken_node_is_not_returned_until_recorded(clock):
+    scheduler = make_scheduler(budget=100)
+    scheduler.sync(["a"])
+    make_due(scheduler, clock)
+
+    assert scheduler.take_due() == ["a"]
+    clock.now += 1000
+    assert scheduler.take_due() == []
+
+    scheduler.record("a", changed=False)
+    clock.now += 30
+    assert scheduler.take_due() == ["a"]
+
+
+def test_record_backs_off_stable_nodes_and_resets_on_change(clock):
+    scheduler = make_scheduler()
+    scheduler.sync(["a"])
+    entry = scheduler.nodes["a"]
+
+    intervals = []
+    for _ in range(6):
+        scheduler.record("a", changed=False)
+        intervals.append(entry.interval)
+    # settle_checks(2)번까지는 기본 간격, 이후 1.5배씩 늘어나 max_interval에서 멈춤
+    assert intervals == [30, 30, 45, 67.5, 101.25, 120]
+    assert entry.next_due == clock.now + 120
+
+    scheduler.record("a", changed=True)
+    assert entry.interval == 10
+    assert entry.stable_checks == 0
+    assert entry.next_due == clock.now + 10
+
+
+def test_stale_heap_entries_are_skipped(clock):
+    scheduler = make_scheduler(budget=100)
+    scheduler.sync(["a", "b"])
+    make_due(scheduler, clock)
+
+    # a는 제거되고 b는 나중으로 재예약: 이전 힙 항목은 꺼낼 때 버려짐
+    scheduler.sync(["b"])
+    scheduler._push(scheduler.nodes["b"], clock.now + 60)
+    assert scheduler.take_due() == []
+    assert scheduler.next_deadline() == clock.now + 60
+
+    clock.now += 60
+    assert scheduler.take_due() == ["b"]
+    assert scheduler.take_due() == []
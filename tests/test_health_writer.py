@@ -0,0 +1,83 @@
+import asyncio
+from datetime import datetime, timezone
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from database import Base
+from fleet_revision import fleet_revision
+from health_writer import HealthWriteBatch, _update_from_values, flush_health_batch, handshake_advanced
+from models import Node
+
+OLD_HANDSHAKE = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def make_batch():
+    batch = HealthWriteBatch()
+    batch.add("a", "connected", "disconnected")
+    batch.add("b", "connected", "connected", {"latest_handshake": 1_800_000_000, "rx_bytes": 5, "tx_bytes": 6})
+    # 상태도 런타임 통계도 바뀌지 않은 노드는 저장하지 않음
+    batch.add("c", "connected", "connected")
+    return batch
+
+
+def test_batch_keeps_only_changed_rows():
+    batch = make_batch()
+    assert sorted(batch.rows) == ["a", "b"]
+    assert batch.status_changed == {"a"}
+    assert batch.rows["a"]["last_handshake"] is None
+
+
+def test_handshake_advanced():
+    assert handshake_advanced(None, 1)
+    assert not handshake_advanced(OLD_HANDSHAKE, 0)
+    assert not handshake_advanced(OLD_HANDSHAKE, int(OLD_HANDSHAKE.timestamp()))
+    assert handshake_advanced(OLD_HANDSHAKE.replace(tzinfo=None), int(OLD_HANDSHAKE.timestamp()) + 1)
+
+
+def test_postgres_statement_updates_from_values():
+    sql = str(_update_from_values(list(make_batch().rows.values())).compile(dialect=postgresql.dialect()))
+    assert sql.startswith("UPDATE nodes SET status=v.status")
+    assert "FROM (VALUES (" in sql
+    assert ") AS v (node_id, status, status_changed, last_handshake, rx_bytes, tx_bytes)" in sql
+    assert "WHERE nodes.node_id = v.node_id" in sql
+    assert "coalesce(CAST(v.last_handshake AS TIMESTAMP WITH TIME ZONE), nodes.last_handshake)" in sql
+    assert "CASE WHEN v.status_changed THEN now() ELSE nodes.updated_at END" in sql
+
+
+def test_flush_writes_rows_and_marks_only_status_changes():
+    async def main():
+        engine = create_async_engine("sqlite+aiosqlite://")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with AsyncSession(engine, expire_on_commit=False) as db:
+            db.add_all([
+                Node(node_id=node_id, status="connected", last_handshake=OLD_HANDSHAKE, rx_bytes=1, tx_bytes=1)
+                for node_id in ("a", "b", "c")
+            ])
+            await db.commit()
+            before = {node_id: fleet_revision.node_revision(node_id) for node_id in ("a", "b", "c")}
+
+            assert await flush_health_batch(db, make_batch()) == 2
+            rows = (await db.execute(Node.__table__.select())).all()
+            nodes = {row.node_id: row for row in rows}
+        await engine.dispose()
+        return before, nodes
+
+    before, nodes = asyncio.run(main())
+    assert nodes["a"].status == "disconnected"
+    assert nodes["a"].rx_bytes == 1
+    assert nodes["a"].updated_at is not None
+    assert nodes["b"].status == "connected"
+    assert (nodes["b"].rx_bytes, nodes["b"].tx_bytes) == (5, 6)
+    assert nodes["b"].updated_at is None
+    assert nodes["c"].rx_bytes == 1
+
+    # 상태가 바뀐 노드만 ETag 무효화 (일괄 bump 아님)
+    assert fleet_revision.node_revision("a") > before["a"]
+    assert fleet_revision.node_revision("b") == before["b"]
+    assert fleet_revision.node_revision("c") == before["c"]
+
+
+def test_empty_batch_does_not_touch_db():
+    assert asyncio.run(flush_health_batch(None, HealthWriteBatch())) == 0
@@ -0,0 +1,90 @@
+import asyncio
+import struct
+
+from icmp_prober import (ICMP_ECHO_REPLY, ICMP_ECHO_REQUEST, PAYLOAD, IcmpProber, echo_request,
+                         icmp_checksum, parse_ping_output)
+
+
+def test_checksum_matches_rfc1071_example():
+    assert icmp_checksum(bytes.fromhex("0001f203f4f5f6f7")) == 0x220D
+    # 홀수 길이는 0으로 채워 계산
+    assert icmp_checksum(b"\x01") == icmp_checksum(b"\x01\x00")
+
+
+def test_echo_request_is_self_consistent():
+    packet = echo_request(0x1234, 7)
+    icmp_type, code, _, ident, seq = struct.unpack("!BBHHH", packet[:8])
+    assert (icmp_type, code, ident, seq) == (ICMP_ECHO_REQUEST, 0, 0x1234, 7)
+    assert packet[8:] == PAYLOAD
+    # 체크섬 필드를 포함해 다시 계산하면 0
+    assert icmp_checksum(packet) == 0
+
+
+def echo_reply(ident, seq):
+    return struct.pack("!BBHHH", ICMP_ECHO_REPLY, 0, 0, ident, seq) + PAYLOAD
+
+
+def ip_header():
+    # IHL=5 (20바이트) IPv4 헤더
+    return bytes([0x45]) + bytes(19)
+
+
+class FakeSocket:
+    def __init__(self, packets):
+        self.packets = list(packets)
+
+    def recvfrom(self, size):
+        if not self.packets:
+            raise BlockingIOError
+        return self.packets.pop(0)
+
+
+def deliver(prober, packets, keys):
+    """대기 중인 (대상, 시퀀스)에 응답을 전달 -> 응답을 받은 키"""
+    async def main():
+        loop = asyncio.get_running_loop()
+        for key in keys:
+            prober._waiters[key] = loop.create_future()
+        prober._sock = FakeSocket(packets)
+        prober._on_readable()
+        return {key for key, future in prober._waiters.items() if future.done()}
+    return asyncio.run(main())
+
+
+def test_datagram_replies_are_matched_by_address_and_sequence():
+    prober = IcmpProber(mode="socket")
+    done = deliver(prober, [
+        (echo_reply(999, 1), ("10.100.1.2", 0)),
+        (echo_reply(999, 5), ("10.100.1.3", 0)),   # 대기 중이 아닌 시퀀스
+        (b"\x00\x00", ("10.100.1.3", 0)),          # 잘린 패킷
+    ], [("10.100.1.2", 1), ("10.100.1.3", 2)])
+    # ping 소켓은 커널이 식별자를 바꾸므로 식별자를 검사하지 않음
+    assert done == {("10.100.1.2", 1)}
+
+
+def test_raw_replies_skip_ip_header_and_foreign_identifiers():
+    prober = IcmpProber(mode="socket")
+    prober._raw = True
+    request = struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, 0, prober._ident, 2) + PAYLOAD
+    done = deliver(prober, [
+        (ip_header() + echo_reply(prober._ident ^ 1, 1), ("10.100.1.2", 0)),  # 다른 프로세스의 응답
+        (ip_header() + request, ("10.100.1.3", 0)),                            # echo 요청
+        (ip_header() + echo_reply(prober._ident, 3), ("10.100.1.4", 0)),
+    ], [("10.100.1.2", 1), ("10.100.1.3", 2), ("10.100.1.4", 3)])
+    assert done == {("10.100.1.4", 3)}
+
+
+def test_parse_ping_output_iputils_and_busybox():
+    iputils = (
+        "3 packets transmitted, 2 received, 33.3333% packet loss, time 2003ms\n"
+        "rtt min/avg/max/mdev = 0.512/0.734/0.956/0.222 ms\n"
+    )
+    result = parse_ping_output("10.100.1.2", 3, iputils)
+    assert (result["sent"], result["received"], result["loss"]) == (3, 2, 0.333)
+    assert (result["rtt_min_ms"], result["rtt_avg_ms"], result["rtt_max_ms"]) == (0.512, 0.734, 0.956)
+
+    busybox = "2 packets transmitted, 0 packets received, 100% packet loss\n"
+    result = parse_ping_output("10.100.1.2", 2, busybox)
+    assert (result["reachable"], result["loss"], result["rtt_avg_ms"]) == (False, 1.0, None)
+
+    assert parse_ping_output("10.100.1.2", 4, "ping: bad address")["sent"] == 4
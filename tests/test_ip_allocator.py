@@ -0,0 +1,120 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from database import Base
+from ip_allocator import IPAllocator, parse_ip_ranges
+from models import IPPoolState, Node
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+
+
+def add_node(db, node_id, vpn_ip):
+    db.add(Node(node_id=node_id, vpn_ip=vpn_ip, public_key=f"key-{node_id}"))
+    db.flush()
+
+
+def test_parse_ip_ranges_accepts_ranges_and_cidrs():
+    assert parse_ip_ranges("10.100.1.2-10.100.1.10, 10.100.5.0/24,") == [
+        (0x0A640102, 0x0A64010A),
+        (0x0A640501, 0x0A6405FE),
+    ]
+    with pytest.raises(ValueError):
+        parse_ip_ranges("10.100.1.10-10.100.1.2")
+
+
+def test_index_and_address_map_across_ranges():
+    allocator = IPAllocator("10.100.1.2-10.100.1.4,10.100.5.0/30")
+
+    assert allocator.size == 5
+    assert [allocator.ip_at(i) for i in range(5)] == [
+        "10.100.1.2", "10.100.1.3", "10.100.1.4", "10.100.5.1", "10.100.5.2"
+    ]
+    assert allocator.index_of("10.100.5.2/32") == 4
+    assert allocator.index_of("10.100.2.1") is None
+    assert allocator.contains_network("10.100.1.2/31")
+    assert not allocator.contains_network("10.100.5.0/24")
+
+
+def test_allocate_skips_unusable_addresses_and_exhausts(db):
+    allocator = IPAllocator("10.100.1.254-10.100.2.1,10.100.5.0/30")
+
+    ips = [allocator.allocate(db) for _ in range(4)]
+    assert ips == ["10.100.1.254", "10.100.2.1", "10.100.5.1", "10.100.5.2"]
+    assert allocator.allocate(db) is None
+    assert allocator.stats() == {"ranges": allocator.spec, "capacity": 4, "used": 4, "free": 0}
+
+
+def test_release_makes_address_reusable(db):
+    allocator = IPAllocator("10.100.1.2-10.100.1.30")
+    ips = [allocator.allocate(db) for _ in range(3)]
+
+    assert allocator.release(db, ips[1])
+    assert not allocator.release(db, ips[1])
+    assert not allocator.release(db, "10.200.0.1")
+    assert not allocator.release(db, None)
+    assert allocator.allocate(db) == ips[1]
+    assert allocator.used() == 3
+
+
+def test_allocate_wraps_around_from_cursor(db):
+    allocator = IPAllocator("10.100.1.2-10.100.1.30")
+    allocator.ensure_loaded(db)
+    # 마지막 바이트(인덱스 24~28)부터 검색 시작
+    allocator._cursor = 3
+
+    ips = [allocator.allocate(db) for _ in range(6)]
+    assert ips == ["10.100.1.26", "10.100.1.27", "10.100.1.28", "10.100.1.29", "10.100.1.30", "10.100.1.2"]
+
+
+def test_rebuild_and_allocate_skip_addresses_used_by_nodes(db):
+    add_node(db, "a", "10.100.1.2")
+    allocator = IPAllocator("10.100.1.2-10.100.1.30")
+
+    # 저장된 비트맵이 없으면 nodes에서 재구성
+    assert allocator.allocate(db) == "10.100.1.3"
+    # 비트맵을 거치지 않고 삽입된 노드는 할당 시 확인 조회로 건너뜀
+    add_node(db, "b", "10.100.1.4")
+    assert allocator.allocate(db) == "10.100.1.5"
+
+
+def test_allocate_many_returns_distinct_addresses(db):
+    add_node(db, "a", "10.100.1.3")
+    allocator = IPAllocator("10.100.1.2-10.100.1.30")
+    allocator.ensure_loaded(db)
+    # 비트맵 로드 후 삽입된 노드는 배치 확인 조회로 제외
+    add_node(db, "b", "10.100.1.4")
+
+    ips = allocator.allocate_many(db, 3)
+    assert ips == ["10.100.1.2", "10.100.1.5", "10.100.1.6"]
+
+
+def test_allocate_many_allocates_nothing_when_pool_is_short(db):
+    allocator = IPAllocator("10.100.1.2-10.100.1.4")
+    assert allocator.allocate(db) == "10.100.1.2"
+
+    assert allocator.allocate_many(db, 3) == []
+    # 메모리 비트맵은 DB 상태로 되돌아감
+    assert allocator.allocate_many(db, 2) == ["10.100.1.3", "10.100.1.4"]
+
+
+def test_version_token_reloads_only_after_other_writers(db):
+    first = IPAllocator("10.100.1.2-10.100.1.30")
+    second = IPAllocator("10.100.1.2-10.100.1.30")
+
+    assert first.allocate(db) == "10.100.1.2"
+    # 다른 프로세스의 할당은 버전이 바뀌므로 다시 로드됨
+    assert second.allocate(db) == "10.100.1.3"
+    assert first.allocate(db) == "10.100.1.4"
+
+    # 버전이 같으면 저장된 비트맵을 다시 읽지 않음
+    state = db.get(IPPoolState, "wg0")
+    state.bitmap = b"\xff" * len(state.bitmap)
+    db.flush()
+    assert first.allocate(db) == "10.100.1.5"
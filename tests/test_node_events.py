@@ -0,0 +1,132 @@
+import asyncio
+import json
+
+import pytest
+
+import node_events
+from fleet_revision import fleet_revision
+from node_events import NodeEventHub, Subscriber
+from wireguard_backend import render_dump
+from wireguard_snapshot import WireGuardSnapshotService
+
+NODES = {
+    "a": {"public_key": "key-a", "vpn_ip": "10.100.1.2", "status": "connected"},
+    "b": {"public_key": "key-b", "vpn_ip": "10.100.1.3", "status": "connected"},
+}
+
+
+class FakeDump:
+    """샘플마다 반환할 dump 출력 (None이면 실패)"""
+
+    def __init__(self):
+        self.peers = {"key-a": {"allowed_ips": ["10.100.1.2/32"], "latest_handshake": 100, "rx_bytes": 1, "tx_bytes": 2}}
+        self.fail = False
+
+    def __call__(self):
+        if self.fail:
+            raise RuntimeError("wg unavailable")
+        return render_dump("(hidden)", "server-key", 51820, self.peers)
+
+
+@pytest.fixture
+def dump(monkeypatch):
+    dump = FakeDump()
+    monkeypatch.setattr(node_events, "wg_snapshot", WireGuardSnapshotService(ttl=0, fetcher=dump))
+    return dump
+
+
+def make_hub(*subscribers):
+    hub = NodeEventHub(interval=0)
+    # 노드 목록은 DB 대신 직접 주입 (리비전이 같으면 다시 읽지 않음)
+    hub._nodes = {node_id: dict(node) for node_id, node in NODES.items()}
+    hub._nodes_revision = fleet_revision.revision
+    hub.subscribers.update(subscribers)
+    return hub
+
+
+def drain(subscriber):
+    events = []
+    while not subscriber.queue.empty():
+        event, data = subscriber.queue.get_nowait().strip().split("\n")
+        events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))["nodes"]))
+    return events
+
+
+def test_first_sample_sends_snapshot_then_only_changed_fields(dump):
+    subscriber = Subscriber()
+    hub = make_hub(subscriber)
+
+    asyncio.run(hub.sample())
+    [(event, nodes)] = drain(subscriber)
+    assert event == "snapshot"
+    assert nodes["a"] == {"status": "connected", "vpn_ip": "10.100.1.2", "connected": True,
+                          "latest_handshake": 100, "rx_bytes": 1, "tx_bytes": 2}
+    assert nodes["b"]["connected"] is False
+
+    dump.peers["key-a"]["rx_bytes"] = 50
+    asyncio.run(hub.sample())
+    assert drain(subscriber) == [("changes", {"a": {"rx_bytes": 50}})]
+
+    # 변경이 없으면 이벤트 없음
+    asyncio.run(hub.sample())
+    assert drain(subscriber) == []
+
+
+def test_new_and_deleted_nodes(dump):
+    subscriber = Subscriber()
+    hub = make_hub(subscriber)
+    asyncio.run(hub.sample())
+    drain(subscriber)
+
+    del hub._nodes["b"]
+    hub._nodes["c"] = {"public_key": None, "vpn_ip": None, "status": "registered"}
+    asyncio.run(hub.sample())
+
+    [(event, nodes)] = drain(subscriber)
+    assert event == "changes"
+    assert nodes["b"] is None
+    assert nodes["c"]["status"] == "registered"
+
+
+def test_node_subscriber_only_gets_its_node(dump):
+    everything, only_b = Subscriber(), Subscriber("b")
+    hub = make_hub(everything, only_b)
+    asyncio.run(hub.sample())
+    assert list(drain(only_b)[0][1]) == ["b"]
+    drain(everything)
+
+    dump.peers["key-a"]["tx_bytes"] = 99
+    asyncio.run(hub.sample())
+    assert drain(only_b) == []
+    assert drain(everything) == [("changes", {"a": {"tx_bytes": 99}})]
+
+
+def test_failed_dump_is_skipped(dump):
+    subscriber = Subscriber()
+    hub = make_hub(subscriber)
+    asyncio.run(hub.sample())
+    drain(subscriber)
+
+    # dump 실패를 연결 끊김으로 보내지 않음
+    dump.fail = True
+    asyncio.run(hub.sample())
+    assert drain(subscriber) == []
+    assert hub.state["a"]["connected"] is True
+
+
+def test_full_queue_falls_back_to_snapshot(dump, monkeypatch):
+    monkeypatch.setattr(node_events, "SUBSCRIBER_QUEUE_SIZE", 1)
+    subscriber = Subscriber()
+    hub = make_hub(subscriber)
+    asyncio.run(hub.sample())
+
+    # 큐가 가득 찬 상태에서 놓친 변경분은 다음 샘플의 전체 상태로 보냄
+    dump.peers["key-a"]["rx_bytes"] = 7
+    asyncio.run(hub.sample())
+    assert subscriber.resync is True
+    drain(subscriber)
+
+    asyncio.run(hub.sample())
+    [(event, nodes)] = drain(subscriber)
+    assert event == "snapshot"
+    assert nodes["a"]["rx_bytes"] == 7
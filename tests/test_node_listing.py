@@ -0,0 +1,69 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from database import Base
+from models import Node
+from node_listing import decode_cursor, encode_cursor, fetch_node_page
+
+NOW = datetime(2026, 1, 1, 12, 0, 0)
+
+
+def run_with_nodes(nodes, query):
+    """메모리 SQLite(aiosqlite)에 노드를 넣고 query(db) 결과 반환"""
+    async def main():
+        engine = create_async_engine("sqlite+aiosqlite://")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with AsyncSession(engine, expire_on_commit=False) as db:
+            db.add_all(nodes)
+            await db.commit()
+            result = await query(db)
+        await engine.dispose()
+        return result
+    return asyncio.run(main())
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor(Node(node_id="worker-1", vpn_ip="10.100.1.2"))
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == ("10.100.1.2", "worker-1")
+    # 대기 노드는 vpn_ip 없이 빈 문자열로 정렬
+    assert decode_cursor(encode_cursor(Node(node_id="pending", vpn_ip=None))) == ("", "pending")
+
+
+@pytest.mark.parametrize("cursor", ["not-base64!", "e30", encode_cursor(Node(node_id="a", vpn_ip="x"))[:-3]])
+def test_decode_cursor_rejects_garbage(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_pages_follow_keyset_order():
+    nodes = [Node(node_id=f"n{i}", vpn_ip=f"10.100.1.{i + 2}") for i in range(5)]
+    nodes.append(Node(node_id="pending", vpn_ip=None))
+
+    async def walk(db):
+        seen, cursor = [], None
+        while True:
+            page, cursor = await fetch_node_page(db, limit=2, cursor=cursor, fields={"node_id"})
+            seen.append([node.node_id for node in page])
+            if cursor is None:
+                return seen
+
+    assert run_with_nodes(nodes, walk) == [["pending", "n0"], ["n1", "n2"], ["n3", "n4"]]
+
+
+def test_updated_since_includes_never_updated_nodes():
+    nodes = [
+        Node(node_id="old", vpn_ip="10.100.1.2", created_at=NOW - timedelta(days=2)),
+        Node(node_id="new", vpn_ip="10.100.1.3", created_at=NOW),
+        Node(node_id="touched", vpn_ip="10.100.1.4", created_at=NOW - timedelta(days=2), updated_at=NOW),
+    ]
+
+    async def query(db):
+        page, cursor = await fetch_node_page(db, updated_since=NOW - timedelta(hours=1))
+        return sorted(node.node_id for node in page), cursor
+
+    assert run_with_nodes(nodes, query) == (["new", "touched"], None)
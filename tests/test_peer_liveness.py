@@ -0,0 +1,65 @@
+import pytest
+
+import peer_liveness
+from peer_liveness import CONNECTED, IDLE, STALE, PeerLiveness, classify_peer
+from wireguard_snapshot import WireGuardSnapshot
+
+NOW = 1_700_000_000.0
+
+
+def peer(age=None, rx=100, tx=200):
+    return {"latest_handshake": int(NOW - age) if age is not None else 0, "rx_bytes": rx, "tx_bytes": tx}
+
+
+@pytest.mark.parametrize("age, expected", [
+    (0, CONNECTED),
+    (peer_liveness.CONNECTED_WITHIN, CONNECTED),
+    (peer_liveness.CONNECTED_WITHIN + 1, IDLE),
+    (peer_liveness.STALE_AFTER, IDLE),
+    (peer_liveness.STALE_AFTER + 1, STALE),
+    (None, STALE),
+])
+def test_handshake_age_classification(age, expected):
+    result = classify_peer(peer(age), None, NOW)
+    assert result["liveness"] == expected
+    assert result["handshake_age"] == (None if age is None else age)
+
+
+def test_missing_peer_is_stale():
+    assert classify_peer(None, (1, 2), NOW)["liveness"] == STALE
+
+
+def test_rx_growth_keeps_idle_peer_connected():
+    age = peer_liveness.CONNECTED_WITHIN + 60
+    assert classify_peer(peer(age, rx=150), (100, 200), NOW)["liveness"] == CONNECTED
+    # tx만 증가한 경우(서버 -> 워커 전송)는 수신 증거가 아님
+    result = classify_peer(peer(age, rx=100, tx=900), (100, 200), NOW)
+    assert result["liveness"] == IDLE
+    assert (result["rx_delta"], result["tx_delta"]) == (0, 700)
+
+
+def test_counter_reset_has_no_delta():
+    result = classify_peer(peer(10, rx=5, tx=5), (100, 200), NOW)
+    assert (result["rx_delta"], result["tx_delta"]) == (None, None)
+
+
+def snapshot(taken_at, peers):
+    snap = WireGuardSnapshot({}, peers)
+    snap.taken_at = taken_at
+    return snap
+
+
+def test_deltas_are_relative_to_previous_snapshot(monkeypatch):
+    monkeypatch.setattr(peer_liveness.time, "time", lambda: NOW)
+    liveness = PeerLiveness()
+    nodes = [("a", "key-a"), ("b", None)]
+
+    first = liveness.classify(snapshot(1.0, {"key-a": peer(30, rx=100)}), nodes)
+    assert first["a"]["rx_delta"] is None
+    assert first["b"]["liveness"] == STALE
+
+    second_snapshot = snapshot(2.0, {"key-a": peer(30, rx=160)})
+    assert liveness.classify(second_snapshot, nodes)["a"]["rx_delta"] == 60
+    # 같은 스냅샷을 다시 판정해도 증가량은 유지
+    assert liveness.classify(second_snapshot, nodes)["a"]["rx_delta"] == 60
+    assert liveness.last_counts == {CONNECTED: 1, IDLE: 0, STALE: 1}
@@ -0,0 +1,104 @@
+import pytest
+
+from wireguard_backend import FakeBackend
+from wireguard_config import PeerEntry, WireGuardConfig, WireGuardConfigStore
+
+CONFIG = """[Interface]
+Address = 10.100.0.1/16
+ListenPort = 51820
+PrivateKey = (fake)
+PostUp = iptables -A FORWARD -i %i -j ACCEPT
+
+[Peer]
+# worker-1
+PublicKey = key-1
+AllowedIPs = 10.100.1.2/32
+PersistentKeepalive = 25
+
+[Peer]
+# worker-2
+# added by hand
+PublicKey = key-2
+AllowedIPs = 10.100.1.3/32, 10.100.1.4/32
+"""
+
+
+def test_parse_indexes_peers_and_keeps_interface_lines():
+    config = WireGuardConfig.parse(CONFIG)
+
+    assert config.interface_value("Address") == "10.100.0.1/16"
+    assert config.interface_value("PostUp") == "iptables -A FORWARD -i %i -j ACCEPT"
+    assert list(config.peers) == ["key-1", "key-2"]
+    assert config.peers["key-1"].node_id == "worker-1"
+    assert config.peers["key-1"].options == {"PersistentKeepalive": "25"}
+    assert config.peers["key-2"].comments == ["# added by hand"]
+    assert config.find_by_ip("10.100.1.4") == "key-2"
+    assert config.find_by_ip("10.100.1.4/32") == "key-2"
+    assert not config.dirty
+
+
+def test_render_round_trip():
+    config = WireGuardConfig.parse(CONFIG)
+    assert config.render() == CONFIG
+    assert WireGuardConfig.parse(config.render()).render() == CONFIG
+
+
+def test_add_remove_and_replace_keep_ip_index_consistent():
+    config = WireGuardConfig.parse(CONFIG)
+
+    config.add_peer(PeerEntry("key-1", ["10.100.1.9/32"], node_id="worker-1"))
+    assert config.find_by_ip("10.100.1.2") is None
+    assert config.find_by_ip("10.100.1.9") == "key-1"
+
+    assert config.remove_peer("key-2")
+    assert not config.remove_peer("key-2")
+    assert config.find_by_ip("10.100.1.3") is None
+
+    config.set_allowed_ips("key-1", ["10.100.1.10/32"])
+    assert config.find_by_ip("10.100.1.9") is None
+    assert config.find_by_ip("10.100.1.10") == "key-1"
+    assert config.dirty
+
+
+def test_edit_writes_once_and_load_returns_copy():
+    backend = FakeBackend(config=CONFIG)
+    store = WireGuardConfigStore(backend)
+
+    snapshot = store.load()
+    snapshot.remove_peer("key-1")
+    assert "key-1" in store.load().peers
+
+    with store.edit() as config:
+        config.add_peer(PeerEntry("key-3", ["10.100.1.5/32"], node_id="worker-3"))
+        config.remove_peer("key-2")
+    assert backend.calls["write_config"] == 1
+    assert list(WireGuardConfig.parse(backend.config).peers) == ["key-1", "key-3"]
+
+    # 변경이 없으면 기록하지 않음
+    with store.edit():
+        pass
+    assert backend.calls["write_config"] == 1
+
+
+def test_failed_edit_is_not_written_or_cached():
+    backend = FakeBackend(config=CONFIG)
+    store = WireGuardConfigStore(backend)
+
+    with pytest.raises(RuntimeError):
+        with store.edit() as config:
+            config.remove_peer("key-1")
+            raise RuntimeError("boom")
+
+    assert backend.calls["write_config"] == 0
+    assert backend.config == CONFIG
+    assert "key-1" in store.load().peers
+
+
+def test_edit_yields_none_when_config_unreadable():
+    backend = FakeBackend(config=CONFIG)
+    backend.read_config = lambda: None
+    store = WireGuardConfigStore(backend)
+
+    assert store.load() is None
+    with store.edit() as config:
+        assert config is None
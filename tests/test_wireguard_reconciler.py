@@ -0,0 +1,116 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+import wireguard_reconciler
+from database import Base
+from models import Node
+from wireguard_backend import FakeBackend, set_backend
+from wireguard_config import wg_config_store
+from wireguard_reconciler import PeerReconciler, desired_peer_query, peer_nodes, peer_reconciler
+from wireguard_snapshot import wg_snapshot
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+
+
+def add_node(db, node_id, vpn_ip, status="connected", public_key=None):
+    db.add(Node(node_id=node_id, vpn_ip=vpn_ip, status=status,
+                public_key=public_key if public_key is not None else f"key-{node_id}"))
+    db.commit()
+
+
+def test_desired_peers_skip_deactivated_and_pending_nodes(db):
+    add_node(db, "a", "10.100.1.2")
+    add_node(db, "b", "10.100.1.3", status="deactivated")
+    add_node(db, "c", None, status="registered", public_key="pending")
+
+    assert peer_reconciler.desired_peers(db) == {
+        "key-a": {"node_id": "a", "allowed_ips": ["10.100.1.2/32"]}
+    }
+    # 시작 시 동기화 / sync-all도 같은 쿼리 사용 (pending 노드는 apply_peers가 건너뜀)
+    assert sorted(node["node_id"] for node in peer_nodes(db.execute(desired_peer_query()).all())) == ["a", "c"]
+
+
+@pytest.fixture
+def backend():
+    fake = FakeBackend()
+    set_backend(fake)
+    wg_config_store.invalidate()
+    wg_snapshot.invalidate()
+    yield fake
+    wg_config_store.invalidate()
+    wg_snapshot.invalidate()
+
+
+def add_peers(backend, count):
+    for i in range(count):
+        backend.set_peer(f"key-{i}", f"10.100.1.{i + 2}/32")
+    backend.write_config(backend.config + "".join(
+        f"\n[Peer]\nPublicKey = key-{i}\nAllowedIPs = 10.100.1.{i + 2}/32\n" for i in range(count)
+    ))
+
+
+def test_timed_pass_holds_removals_when_db_is_empty(db, backend):
+    add_peers(backend, 3)
+    result = PeerReconciler().reconcile(db)
+
+    assert result["held_removals"] == 3
+    assert len(backend.peers) == 3
+    assert backend.calls["remove_peer"] == 0
+
+
+def test_timed_pass_holds_removals_over_threshold(db, backend):
+    add_peers(backend, 3)
+    add_node(db, "0", "10.100.1.2")
+    reconciler = PeerReconciler()
+    reconciler.max_removals = 1
+
+    result = reconciler.reconcile(db)
+    assert result["held_removals"] == 2
+    assert sorted(backend.peers) == ["key-0", "key-1", "key-2"]
+
+
+def test_on_demand_pass_applies_removals(db, backend):
+    add_peers(backend, 3)
+    result = PeerReconciler().reconcile(db, on_demand=True)
+
+    assert result["held_removals"] == 0
+    assert backend.peers == {}
+    assert "key-0" not in backend.config
+
+
+def test_steady_state_skips_config_parse_and_db_query(db, backend, monkeypatch):
+    add_node(db, "a", "10.100.1.2")
+    reconciler = PeerReconciler()
+    assert reconciler.reconcile(db)["changed"] is True
+
+    reads = backend.calls["read_config"]
+    queries = []
+    monkeypatch.setattr(reconciler, "desired_peers", lambda session: queries.append(session))
+
+    result = reconciler.reconcile(db)
+    assert result["changed"] is False
+    assert backend.calls["read_config"] == reads
+    assert queries == []
+
+
+def test_runtime_drift_rereads_db_before_diffing(db, backend):
+    add_node(db, "a", "10.100.1.2")
+    reconciler = PeerReconciler()
+    reconciler.reconcile(db)
+
+    # 다른 프로세스가 등록한 노드: 이 프로세스의 fleet_revision은 바뀌지 않음
+    backend.set_peer("key-b", "10.100.1.3/32")
+    add_node(db, "b", "10.100.1.3")
+    reconciler._desired_cache["revision"] = wireguard_reconciler.fleet_revision.revision
+
+    result = reconciler.reconcile(db)
+    assert result["diff"]["runtime"]["remove"] == []
+    assert "key-b" in backend.peers
+    assert "key-b" in backend.config
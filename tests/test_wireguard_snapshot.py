@@ -0,0 +1,29 @@
+from wireguard_backend import render_dump
+from wireguard_snapshot import WireGuardSnapshotService, dump_generation, parse_wg_dump
+
+
+def peers(**overrides):
+    peer = {"allowed_ips": ["10.100.1.2/32"], "latest_handshake": 1700000000, "rx_bytes": 10, "tx_bytes": 20}
+    peer.update(overrides)
+    return parse_wg_dump(render_dump("(hidden)", "server-key", 51820, {"key-a": peer}))["peers"]
+
+
+def test_generation_ignores_counters_and_handshake_time():
+    base = dump_generation(peers())
+    assert dump_generation(peers(rx_bytes=999, tx_bytes=999, latest_handshake=1700000120)) == base
+    assert dump_generation(peers(latest_handshake=0)) != base
+    assert dump_generation(peers(allowed_ips=["10.100.1.3/32"])) != base
+    assert dump_generation({}) != base
+
+
+def test_known_generation_survives_ttl_but_not_invalidate():
+    output = render_dump("(hidden)", "server-key", 51820, {})
+    service = WireGuardSnapshotService(ttl=0, fetcher=lambda: output)
+    assert service.known_generation() is None
+
+    snapshot = service.get()
+    assert service.current() is None
+    assert service.known_generation() == snapshot.generation
+
+    service.invalidate()
+    assert service.known_generation() is None
@@ -996,11 +996,20 @@ def test_single_node(node_id):
             else:
                 # Fallback to local ping test
                 import subprocess
-                result = subprocess.run(
-                    ["docker", "exec", "wireguard-server", "ping", "-c", "1", "-W", "2", vpn_ip],
-                    capture_output=True,
-                    text=True
-                )
+                try:
+                    result = subprocess.run(
+                        ["docker", "exec", "wireguard-server", "ping", "-c", "1", "-W", "2", vpn_ip],
+                        capture_output=True,
+                        text=True,
+                        timeout=5
+                    )
+                except subprocess.TimeoutExpired:
+                    # wireguard-server가 재시작 중이면 docker exec가 멈출 수 있음
+                    return jsonify({
+                        'reachable': False,
+                        'vpn_ip': vpn_ip,
+                        'ping_output': 'ping timed out (wireguard-server not responding)'
+                    })
                 
                 reachable = result.returncode == 0
                 
@@ -12,6 +12,9 @@ import re
 
 app = Flask(__name__)
 
+# docker exec 제한 시간 (초) - wireguard-server 재시작 중에 요청이 멈추지 않도록
+COMMAND_TIMEOUT = 10
+
 def get_wireguard_status():
     """Get current WireGuard status"""
     try:
@@ -19,7 +22,8 @@ def get_wireguard_status():
         result = subprocess.run(
             ['docker', 'exec', 'wireguard-server', 'wg', 'show', 'wg0', 'dump'],
             capture_output=True,
-            text=True
+            text=True,
+            timeout=COMMAND_TIMEOUT
         )
         
         if result.returncode != 0:
@@ -104,7 +108,8 @@ def remove_peer(public_key):
             ['docker', 'exec', 'wireguard-server', 'wg', 'set', 'wg0', 
              'peer', public_key, 'remove'],
             capture_output=True,
-            text=True
+            text=True,
+            timeout=COMMAND_TIMEOUT
         )
         
         if result.returncode == 0: